@@ -0,0 +1,272 @@
+"""Колоночный движок аналитики на NumPy.
+
+Держит в памяти снимок продаж (рабочей таблицы и архивов, как
+``sales_source``) и таблицы ``inventory`` в виде массивов
+NumPy и считает показатели аналитического отчета векторными операциями.
+Движок необязательный: включается настройкой ``ANALYTICS_ENGINE = 'numpy'``
+и только если установлен NumPy, иначе отчеты считаются через SQL.
+"""
+import threading
+
+from flask import current_app
+from sqlalchemy import func, or_, select
+
+from archive import sales_source
+from models.inventory import InventoryItem
+from replica import reports_session
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy не обязателен
+    np = None
+
+
+# Строк за одну порцию при полной загрузке снимка
+LOAD_CHUNK = 50000
+
+
+class _Labels:
+    """Кодирование строковых значений целыми числами для группировок"""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class ColumnarSnapshot:
+    """Колоночный снимок продаж и инвентаря"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    # Загрузка данных
+
+    def load(self, session):
+        """Полная загрузка снимка одним проходом по каждой таблице"""
+        self.component_types = _Labels()
+        self.manufacturers = _Labels()
+        self.models = []
+
+        self.item_id = np.empty(0, dtype=np.int64)
+        self.item_type = np.empty(0, dtype=np.int64)
+        self.item_manufacturer = np.empty(0, dtype=np.int64)
+        self.item_supplier = np.empty(0, dtype=np.int64)
+        self.item_quantity = np.empty(0, dtype=np.int64)
+        # Цены и суммы в копейках
+        self.item_purchase_price = np.empty(0, dtype=np.int64)
+        self.item_selling_price = np.empty(0, dtype=np.int64)
+        self.items_updated_at = None
+
+        self.sale_id = np.empty(0, dtype=np.int64)
+        self.sale_date = np.empty(0, dtype='datetime64[D]')
+        self.sale_item = np.empty(0, dtype=np.int64)
+        self.sale_quantity = np.empty(0, dtype=np.int64)
+        self.sale_amount = np.empty(0, dtype=np.int64)
+        # Себестоимость единицы на момент продажи
+        self.sale_unit_cost = np.empty(0, dtype=np.int64)
+
+        # Строки читаются порциями: в памяти только массивы и одна порция
+        for rows in self._partitions(session, self._items_query()):
+            self._merge_items(rows)
+        for rows in self._partitions(session, self._sales_query(sales_source(session))):
+            self._append_sales(rows)
+        self.loaded = True
+
+    @staticmethod
+    def _partitions(session, query):
+        return session.execute(query.execution_options(yield_per=LOAD_CHUNK)).partitions()
+
+    def refresh(self, session):
+        """Догрузка новых строк по идентификаторам.
+
+        Новые продажи и товары дочитываются по ``id`` больше последнего
+        загруженного, измененные товары - по ``updated_at``. Если строки
+        были удалены, снимок перезагружается целиком.
+        """
+        with self._lock:
+            if not self.loaded:
+                self.load(session)
+                return
+
+            sales = sales_source(session)
+            last_sale_id = int(self.sale_id[-1]) if len(self.sale_id) else 0
+            new_sales = session.execute(
+                self._sales_query(sales).where(sales.c.id > last_sale_id)
+            ).all()
+
+            item_filter = InventoryItem.id > (int(self.item_id.max()) if len(self.item_id) else 0)
+            if self.items_updated_at is not None:
+                item_filter = or_(item_filter, InventoryItem.updated_at >= self.items_updated_at)
+            changed_items = session.execute(self._items_query().where(item_filter)).all()
+
+            sales_count, items_count = session.execute(
+                select(
+                    select(func.count()).select_from(sales).scalar_subquery(),
+                    select(func.count(InventoryItem.id)).scalar_subquery(),
+                )
+            ).one()
+
+            self._merge_items(changed_items)
+            self._append_sales(new_sales)
+
+            if sales_count != len(self.sale_id) or items_count != len(self.item_id):
+                self.load(session)
+
+    @staticmethod
+    def _items_query():
+        return select(
+            InventoryItem.id,
+            InventoryItem.component_type,
+            InventoryItem.manufacturer,
+            InventoryItem.model,
+            InventoryItem.supplier_id,
+            InventoryItem.quantity,
+            InventoryItem.purchase_price,
+            InventoryItem.selling_price,
+            InventoryItem.updated_at,
+        ).order_by(InventoryItem.id)
+
+    @staticmethod
+    def _sales_query(sales):
+        return select(
+            sales.c.id,
+            sales.c.sale_date,
+            sales.c.item_id,
+            sales.c.quantity_sold,
+            sales.c.total_amount,
+            sales.c.unit_cost,
+        ).order_by(sales.c.id)
+
+    def _merge_items(self, rows):
+        if not rows:
+            return
+
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+        types = np.fromiter((self.component_types.encode(row.component_type) for row in rows),
+                            dtype=np.int64, count=len(rows))
+        manufacturers = np.fromiter((self.manufacturers.encode(row.manufacturer) for row in rows),
+                                    dtype=np.int64, count=len(rows))
+        suppliers = np.fromiter((-1 if row.supplier_id is None else row.supplier_id for row in rows),
+                                dtype=np.int64, count=len(rows))
+        quantities = np.fromiter((row.quantity for row in rows), dtype=np.int64, count=len(rows))
+        purchase = np.fromiter((row.purchase_price for row in rows), dtype=np.int64, count=len(rows))
+        selling = np.fromiter((row.selling_price for row in rows), dtype=np.int64, count=len(rows))
+
+        updated = [row.updated_at for row in rows if row.updated_at is not None]
+        if updated:
+            latest = max(updated)
+            if self.items_updated_at is None or latest > self.items_updated_at:
+                self.items_updated_at = latest
+
+        # Уже загруженные товары обновляются на месте, новые дописываются в конец
+        position = np.searchsorted(self.item_id, ids)
+        known = np.zeros(len(ids), dtype=bool)
+        if len(self.item_id):
+            known = self.item_id[np.minimum(position, len(self.item_id) - 1)] == ids
+
+        target = position[known]
+        self.item_type[target] = types[known]
+        self.item_manufacturer[target] = manufacturers[known]
+        self.item_supplier[target] = suppliers[known]
+        self.item_quantity[target] = quantities[known]
+        self.item_purchase_price[target] = purchase[known]
+        self.item_selling_price[target] = selling[known]
+        for index, row_index in zip(target, np.flatnonzero(known)):
+            self.models[index] = rows[row_index].model
+
+        new = ~known
+        self.item_id = np.concatenate([self.item_id, ids[new]])
+        self.item_type = np.concatenate([self.item_type, types[new]])
+        self.item_manufacturer = np.concatenate([self.item_manufacturer, manufacturers[new]])
+        self.item_supplier = np.concatenate([self.item_supplier, suppliers[new]])
+        self.item_quantity = np.concatenate([self.item_quantity, quantities[new]])
+        self.item_purchase_price = np.concatenate([self.item_purchase_price, purchase[new]])
+        self.item_selling_price = np.concatenate([self.item_selling_price, selling[new]])
+        self.models.extend(rows[row_index].model for row_index in np.flatnonzero(new))
+
+    def _append_sales(self, rows):
+        if not rows:
+            return
+
+        count = len(rows)
+        self.sale_id = np.concatenate([
+            self.sale_id, np.fromiter((row.id for row in rows), dtype=np.int64, count=count)])
+        self.sale_date = np.concatenate([
+            self.sale_date, np.array([row.sale_date for row in rows], dtype='datetime64[D]')])
+        self.sale_item = np.concatenate([
+            self.sale_item, np.fromiter((-1 if row.item_id is None else row.item_id for row in rows),
+                                        dtype=np.int64, count=count)])
+        self.sale_quantity = np.concatenate([
+            self.sale_quantity, np.fromiter((row.quantity_sold for row in rows), dtype=np.int64, count=count)])
+        self.sale_amount = np.concatenate([
+            self.sale_amount, np.fromiter((row.total_amount for row in rows), dtype=np.int64, count=count)])
+        self.sale_unit_cost = np.concatenate([
+            self.sale_unit_cost, np.fromiter((row.unit_cost for row in rows), dtype=np.int64, count=count)])
+
+    # Расчеты
+
+    def analytical_totals(self):
+        """Показатели аналитического отчета в том же виде, что и SQL-путь"""
+        with self._lock:
+            items_count = len(self.item_id)
+
+            # Позиция товара каждой продажи в колонках инвентаря
+            item_index = np.minimum(np.searchsorted(self.item_id, self.sale_item), max(items_count - 1, 0))
+            linked = np.zeros(len(self.sale_id), dtype=bool)
+            if items_count:
+                linked = self.item_id[item_index] == self.sale_item
+            sale_cost = self.sale_quantity * self.sale_unit_cost
+            item_index, quantity, amount = item_index[linked], self.sale_quantity[linked], self.sale_amount[linked]
+            linked_cost = sale_cost[linked]
+
+            # Топ продаж: по убыванию количества и id товара, как в get_top_sellers
+            sold = np.bincount(item_index, weights=quantity, minlength=items_count).astype(np.int64)
+            with_sales = np.flatnonzero(sold > 0)
+            top = with_sales[np.lexsort((-self.item_id[with_sales], -sold[with_sales]))][:5]
+
+            # Группировка по типу комплектующих
+            type_codes, type_index = np.unique(self.item_type[item_index], return_inverse=True)
+            # bincount суммирует во float64; копейки точны до 2**53, поэтому приводим обратно к int
+            type_revenue = np.bincount(type_index, weights=amount, minlength=len(type_codes)).astype(np.int64)
+            type_cost = np.bincount(type_index, weights=linked_cost, minlength=len(type_codes)).astype(np.int64)
+            type_units = np.bincount(type_index, weights=quantity, minlength=len(type_codes))
+
+            return {
+                'total_items': items_count,
+                'total_sales': len(self.sale_id),
+                'total_suppliers': len(np.unique(self.item_supplier)),
+                'revenue': int(self.sale_amount.sum()),
+                'cost': int(sale_cost.sum()),
+                'inventory_value': int((self.item_quantity * self.item_purchase_price).sum()),
+                'potential_revenue': int((self.item_quantity * self.item_selling_price).sum()),
+                'popular_items': [
+                    (self.manufacturers.values[self.item_manufacturer[index]], self.models[index], int(sold[index]))
+                    for index in top
+                ],
+                'categories': sorted(
+                    (self.component_types.values[code], int(type_revenue[i]), int(type_cost[i]),
+                     int(type_units[i]))
+                    for i, code in enumerate(type_codes)
+                ),
+            }
+
+
+def get_analytics_engine():
+    """Актуальный колоночный снимок или None, если движок выключен"""
+    if np is None or current_app.config.get('ANALYTICS_ENGINE') != 'numpy':
+        return None
+
+    engine = current_app.extensions.get('analytics_engine')
+    if engine is None:
+        engine = current_app.extensions.setdefault('analytics_engine', ColumnarSnapshot())
+    engine.refresh(reports_session())
+    return engine
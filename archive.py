@@ -0,0 +1,191 @@
+"""Архив продаж закрытых лет.
+
+Продажи за прошедшие годы переносятся командой ``flask archive-sales``
+из рабочей таблицы ``sales`` в отдельные файлы ``sales_<год>.db``
+(каталог ``SALES_ARCHIVE_DIR``). Рабочая таблица остается небольшой,
+а архивы подключаются к каждому соединению только для чтения как схемы
+``archive_<год>``. Отчеты по продажам берут строки через ``sales_source``,
+который добавляет к рабочей таблице только архивы, пересекающиеся
+с запрошенным периодом.
+
+SQLite подключает не больше 10 баз к одному соединению, поэтому
+архивов может быть не больше ``MAX_ARCHIVES``: лишний архив сломал бы
+каждое новое соединение, и перенос в новый файл сверх этого числа
+отклоняется.
+
+Номера перенесенных продаж не выдаются повторно: счетчик AUTOINCREMENT
+рабочей таблицы (``sqlite_sequence``) не опускается ниже наибольшего
+номера в архивах.
+"""
+import os
+import re
+import sqlite3
+from datetime import date
+from pathlib import Path
+
+import click
+from sqlalchemy import Column, MetaData, Table, event, select, text, union_all
+
+from database import db
+from models.inventory import Sale
+
+ATTACHED_KEY = 'archive_years'
+DATE_INDEX = 'ix_sales_sale_date'
+# Предел SQLite на число подключенных баз (SQLITE_MAX_ATTACHED)
+MAX_ARCHIVES = 10
+
+_archive_metadata = MetaData()
+
+
+def archive_path(directory, year):
+    return os.path.join(directory, f'sales_{year}.db')
+
+
+def archive_years(directory):
+    """Годы, для которых есть файлы архива"""
+    if not os.path.isdir(directory):
+        return []
+    years = []
+    for name in os.listdir(directory):
+        match = re.fullmatch(r'sales_(\d{4})\.db', name)
+        if match:
+            years.append(int(match.group(1)))
+    return sorted(years)
+
+
+def archive_table(year):
+    """Таблица продаж архива за год (схема ``archive_<год>``)"""
+    schema = f'archive_{year}'
+    key = f'{schema}.sales'
+    if key not in _archive_metadata.tables:
+        Table('sales', _archive_metadata,
+              *[Column(column.name, column.type) for column in Sale.__table__.columns],
+              schema=schema)
+    return _archive_metadata.tables[key]
+
+
+def _attach_archives(directory):
+    def attach(dbapi_connection, connection_record):
+        years = archive_years(directory)
+        for year in years:
+            uri = Path(archive_path(directory, year)).resolve().as_uri() + '?mode=ro'
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS archive_{year}', (uri,))
+        connection_record.info[ATTACHED_KEY] = years
+    return attach
+
+
+def sales_source(session, start_date=None, end_date=None):
+    """Источник строк продаж для отчета за период.
+
+    Без подключенных архивов, пересекающихся с периодом, это сама таблица
+    ``sales``; иначе - UNION ALL рабочей таблицы и нужных архивов.
+    """
+    years = [
+        year for year in session.connection().info.get(ATTACHED_KEY, ())
+        if (start_date is None or year >= start_date.year) and (end_date is None or year <= end_date.year)
+    ]
+    if not years:
+        return Sale.__table__
+
+    return union_all(
+        select(Sale.__table__),
+        *[select(archive_table(year)) for year in years]
+    ).subquery('sales')
+
+
+def raise_sales_sequence(connection, high):
+    """Счетчик номеров продаж рабочей базы не ниже ``high``.
+
+    ``connection`` - соединение sqlite3 с рабочей базой (схема ``main``).
+    Таблица счетчиков появляется вместе с первой таблицей AUTOINCREMENT.
+    """
+    if high is None or connection.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"
+    ).fetchone() is None:
+        return
+    connection.execute("UPDATE main.sqlite_sequence SET seq = ? WHERE name = 'sales' AND seq < ?", (high, high))
+    connection.execute(
+        "INSERT INTO main.sqlite_sequence (name, seq) SELECT 'sales', ? "
+        "WHERE NOT EXISTS (SELECT 1 FROM main.sqlite_sequence WHERE name = 'sales')", (high,)
+    )
+
+
+def archive_year(database_path, directory, year):
+    """Перенос продаж за год из рабочей базы в файл архива.
+
+    Вставка в архив и удаление из рабочей таблицы выполняются в одной
+    транзакции. Повторный запуск дописывает продажи, внесенные за этот
+    год задним числом. Возвращает число перенесенных продаж.
+    """
+    existing = archive_years(directory)
+    if year not in existing and len(existing) >= MAX_ARCHIVES:
+        raise ValueError(f'Архивов уже {len(existing)}, больше {MAX_ARCHIVES} SQLite не подключит')
+    os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(database_path)
+    try:
+        connection.execute('ATTACH DATABASE ? AS archive', (archive_path(directory, year),))
+        ddl = connection.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'sales'"
+        ).fetchone()[0]
+        columns = ', '.join(row[1] for row in connection.execute('PRAGMA main.table_info(sales)'))
+        period = (f'{year}-01-01', f'{year}-12-31')
+
+        with connection:
+            connection.execute(re.sub(r'^CREATE TABLE "?sales"?', 'CREATE TABLE IF NOT EXISTS archive.sales', ddl))
+            connection.execute(f'CREATE INDEX IF NOT EXISTS archive.{DATE_INDEX} ON sales (sale_date)')
+            moved = connection.execute(
+                f'INSERT INTO archive.sales ({columns}) SELECT {columns} FROM main.sales '
+                f'WHERE sale_date BETWEEN ? AND ?', period
+            ).rowcount
+            raise_sales_sequence(connection, connection.execute(
+                'SELECT MAX(id) FROM main.sales WHERE sale_date BETWEEN ? AND ?', period
+            ).fetchone()[0])
+            connection.execute('DELETE FROM main.sales WHERE sale_date BETWEEN ? AND ?', period)
+        return moved
+    finally:
+        connection.close()
+
+
+def reload_archives():
+    """Переподключение архивов: новые соединения увидят новые файлы"""
+    for engine in db.engines.values():
+        engine.dispose()
+
+
+def init_archive(app):
+    """Подключение архивов продаж ко всем базам приложения"""
+    directory = app.config.get('SALES_ARCHIVE_DIR') or os.path.join(app.instance_path, 'archive')
+    app.config['SALES_ARCHIVE_DIR'] = directory
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'connect', _attach_archives(directory))
+        # Соединения, открытые до регистрации обработчика, архивов не видят
+        reload_archives()
+
+    @app.cli.command('archive-sales')
+    @click.option('--year', type=int, help='Год для переноса (по умолчанию все закрытые годы)')
+    def archive_sales_command(year):
+        """Перенести продажи закрытых лет в архив"""
+        current_year = date.today().year
+        if year is not None and year >= current_year:
+            raise click.ClickException('Архивировать можно только закрытые годы')
+
+        if year is None:
+            years = [int(value) for value, in db.session.execute(text(
+                "SELECT DISTINCT strftime('%Y', sale_date) FROM sales WHERE sale_date < :start"
+            ), {'start': f'{current_year}-01-01'})]
+        else:
+            years = [year]
+        # Проверка до переноса: отказ посередине оставил бы часть лет в архиве
+        archives = set(archive_years(directory)) | set(years)
+        if len(archives) > MAX_ARCHIVES:
+            raise click.ClickException(
+                f'Архивов стало бы {len(archives)}, SQLite подключает не больше {MAX_ARCHIVES}'
+            )
+        db.session.remove()
+
+        for archived in years:
+            moved = archive_year(db.engine.url.database, directory, archived)
+            click.echo(f'{archived}: перенесено продаж - {moved}')
+        reload_archives()
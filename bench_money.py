@@ -0,0 +1,66 @@
+"""Сравнение агрегации денежных сумм: рубли в REAL против копеек в INTEGER.
+
+Заполняет временную базу SQLite одинаковыми продажами в двух видах и
+замеряет итог выручки тремя способами: SUM в SQL по REAL, SUM в SQL по
+INTEGER и суммирование в Python по загруженным строкам (так раньше
+считались отчеты). Для каждого способа выводится время и отклонение
+от точной суммы.
+
+Запуск: python bench_money.py [количество продаж]
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+
+def fill(connection, count):
+    random.seed(42)
+    connection.execute('CREATE TABLE sales_real (id INTEGER PRIMARY KEY, total_amount FLOAT NOT NULL)')
+    connection.execute('CREATE TABLE sales_int (id INTEGER PRIMARY KEY, total_amount INTEGER NOT NULL)')
+
+    kopecks = [random.randint(1, 50000000) for _ in range(count)]
+    connection.executemany('INSERT INTO sales_real (total_amount) VALUES (?)',
+                           ((amount / 100,) for amount in kopecks))
+    connection.executemany('INSERT INTO sales_int (total_amount) VALUES (?)',
+                           ((amount,) for amount in kopecks))
+    connection.commit()
+    return sum(Decimal(amount) for amount in kopecks) / 100
+
+
+def measure(label, function, exact, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    error = abs(Decimal(str(result)) - exact)
+    print(f'{label:<32} {best * 1000:9.1f} мс   итог {result!s:>22}   ошибка {error}')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection = sqlite3.connect(os.path.join(directory, 'bench.db'))
+        exact = fill(connection, count)
+        print(f'Продаж: {count}, точная выручка: {exact}')
+
+        measure('SQL SUM, REAL (рубли)',
+                lambda: connection.execute('SELECT SUM(total_amount) FROM sales_real').fetchone()[0],
+                exact)
+        measure('SQL SUM, INTEGER (копейки)',
+                lambda: Decimal(connection.execute('SELECT SUM(total_amount) FROM sales_int').fetchone()[0]) / 100,
+                exact)
+        measure('Python sum по строкам, REAL',
+                lambda: sum(row[0] for row in connection.execute('SELECT total_amount FROM sales_real')),
+                exact, repeat=2)
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
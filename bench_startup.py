@@ -0,0 +1,60 @@
+"""Время от импорта до первого ответа и память рабочего процесса.
+
+Каждый замер идет в отдельном интерпретаторе, как у нового рабочего
+процесса: импорт приложения, ``create_app()`` и первый запрос к
+странице входа. Режим ``eager`` повторяет прежний старт - модуль
+отчетов импортируется сразу, а схема базы проверяется при запуске.
+
+Запуск: python bench_startup.py [число повторов]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = '''
+import json, resource, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+if sys.argv[1] == 'eager':
+    import reports
+    from database import create_schema
+    with app.app_context():
+        create_schema()
+ready = time.perf_counter()
+app.test_client().get('/login')
+finished = time.perf_counter()
+print(json.dumps({
+    'startup': ready - started,
+    'first_response': finished - started,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules)
+}))
+'''
+
+
+def measure(mode, repeat):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD, mode],
+            cwd=directory, capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f'{"режим":<8} {"старт, мс":>10} {"1-й ответ, мс":>14} {"RSS, МБ":>9} {"модулей":>8}')
+    for mode in ('eager', 'lazy'):
+        result = measure(mode, repeat)
+        print(f'{mode:<8} {result["startup"] * 1000:>10.1f} {result["first_response"] * 1000:>14.1f} '
+              f'{result["rss_kb"] / 1024:>9.1f} {result["modules"]:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Кэши результатов отчетов и отрендеренных фрагментов страниц"""
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+
+from database import db
+
+# Имена общих номеров версий: данные для фрагментов страниц и данные
+# закрытых периодов
+DATA_VERSION = 'data'
+CLOSED_PERIODS_VERSION = 'closed_periods'
+
+
+class CacheVersion(db.Model):
+    """Номер версии кэшируемых данных, общий для всех рабочих процессов.
+
+    Номер хранится в базе и увеличивается в той же транзакции, что и
+    запись данных, поэтому каждый процесс видит новую версию сразу после
+    коммита, кто бы его ни сделал.
+    """
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ClosedPeriodCache:
+    """Кэш показателей за закрытые периоды.
+
+    Период считается закрытым, когда он целиком в прошлом: новые продажи
+    в него уже не попадают, поэтому результат можно переиспользовать.
+    Задним числом данные меняются только явными правками, и тогда
+    ``invalidate_closed_periods`` увеличивает общий номер версии в базе.
+    Номер входит в ключи, поэтому устаревшие записи не читает ни один
+    рабочий процесс, а ``sync`` сбрасывает их при смене версии.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self.version = None
+
+    def sync(self, version):
+        """Переход на версию данных ``version``; возвращает ее для ключей"""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+        return version
+
+    def get(self, key):
+        return self._data.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ResultCache:
+    """Кэш ограниченного размера: при переполнении вытесняются записи,
+    к которым дольше всего не обращались (LRU).
+
+    Актуальность записей обеспечивает ключ: в него входит все, от чего
+    зависит результат, поэтому устаревшие записи просто перестают
+    запрашиваться и со временем вытесняются.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FragmentCache(ResultCache):
+    """Кэш отрендеренных фрагментов HTML с ограничением по объему (LRU).
+
+    Фрагмент зависит от данных, поэтому в ключ входит номер версии
+    данных из базы: обработчики записи увеличивают его до коммита через
+    ``bump_data_version``, и фрагменты прежней версии больше не
+    запрашиваются ни одним рабочим процессом.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self._size = 0
+
+    def set(self, key, value):
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self._size -= sys.getsizeof(previous)
+            self._data[key] = value
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self._size -= sys.getsizeof(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+    @property
+    def size(self):
+        """Занятый объем, байт"""
+        return self._size
+
+
+closed_periods = ClosedPeriodCache()
+pivot_results = ResultCache()
+fragments = FragmentCache()
+
+
+def cache_version(name, session=None):
+    """Текущий номер версии ``name`` (0, пока записей не было)"""
+    return (session or db.session).execute(
+        select(CacheVersion.version).where(CacheVersion.name == name)
+    ).scalar() or 0
+
+
+def bump_cache_version(name):
+    """Увеличение номера версии ``name``; попадает в базу вместе с коммитом записи"""
+    db.session.execute(
+        insert(CacheVersion).values(name=name, version=1)
+        .on_conflict_do_update(index_elements=['name'], set_={'version': CacheVersion.version + 1})
+    )
+
+
+def cached_fragment(name, render, *variant):
+    """Фрагмент из кэша или результат ``render()`` для текущей версии данных.
+
+    ``variant`` - то, от чего фрагмент зависит помимо данных (например,
+    права пользователя на кнопки действий).
+    """
+    key = (name, cache_version(DATA_VERSION), *variant)
+    html = fragments.get(key)
+    if html is None:
+        html = render()
+        fragments.set(key, html)
+    return html
+
+
+def bump_data_version():
+    """Новая версия данных: кэшированные фрагменты устаревают.
+
+    Вызывается до коммита записи, в той же транзакции.
+    """
+    bump_cache_version(DATA_VERSION)
+
+
+def invalidate_closed_periods(changed_date=None):
+    """Сброс кэша закрытых периодов при изменении данных.
+
+    Вызывается до коммита записи, в той же транзакции. Если известна
+    дата изменения и она сегодняшняя, закрытые периоды не затронуты.
+    Без даты (например, правка типа товара) сбрасывается весь кэш.
+    """
+    if changed_date is not None and changed_date >= date.today():
+        return
+    bump_cache_version(CLOSED_PERIODS_VERSION)
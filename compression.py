@@ -0,0 +1,169 @@
+"""Сжатие ответов и раздача статики.
+
+JSON-ответы и страницы больше ``COMPRESSION_MIN_SIZE`` байт сжимаются
+brotli (если установлен пакет ``brotli``) или gzip - по заголовку
+``Accept-Encoding`` клиента. Потоковые JSON-ответы (большие отчеты)
+сжимаются по мере выдачи, поток событий (SSE) не сжимается.
+
+Статика сжимается один раз командой ``flask precompress-static``:
+рядом с файлами появляются ``.br`` и ``.gz``, и сервер отдает готовый
+вариант без сжатия на каждый запрос. Ссылки на статику строятся через
+``static_url``: в адрес добавляется хэш содержимого, поэтому такие
+ответы кэшируются браузером на год и перезапрашиваются только после
+изменения файла.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import zlib
+
+import click
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli не обязателен
+    brotli = None
+
+COMPRESSIBLE_TYPES = {'application/json', 'text/html'}
+PRECOMPRESSED_SUFFIXES = ('.js', '.css', '.svg', '.json')
+STATIC_MAX_AGE = 365 * 24 * 3600
+SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+_fingerprints = {}
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def negotiate_encoding():
+    """Лучшее поддерживаемое обеими сторонами сжатие или None"""
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def compress(data, encoding, static=False):
+    """Сжатие данных; для статики - с максимальной степенью"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else 5)
+    return gzip.compress(data, compresslevel=9 if static else 6, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """Сжатие потока частей ответа по мере их появления"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Закрытие исходного потока освобождает контекст запроса
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def fingerprint(static_folder, filename):
+    """Короткий хэш содержимого файла (пересчитывается при изменении файла)"""
+    path = os.path.join(static_folder, filename)
+    mtime = os.path.getmtime(path)
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as source:
+            cached = (mtime, hashlib.md5(source.read()).hexdigest()[:12])
+        _fingerprints[path] = cached
+    return cached[1]
+
+
+def precompress_static(static_folder):
+    """Сжатые копии статических файлов; возвращает число записанных файлов"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESSED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as source:
+                data = source.read()
+            for encoding in available_encodings():
+                target = f'{path}.{SUFFIXES[encoding]}'
+                if _is_fresh(target, path):
+                    continue
+                with open(target, 'wb') as output:
+                    output.write(compress(data, encoding, static=True))
+                written += 1
+    return written
+
+
+def _is_fresh(variant_path, path):
+    """Сжатая копия есть и не старше исходного файла"""
+    return os.path.isfile(variant_path) and os.path.getmtime(variant_path) >= os.path.getmtime(path)
+
+
+def init_compression(app):
+    """Сжатие ответов, раздача сжатой статики и ссылки с отпечатком"""
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+
+    def static_url(filename):
+        return url_for('static', filename=filename, v=fingerprint(app.static_folder, filename))
+
+    app.add_template_global(static_url)
+
+    def send_static(filename):
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = negotiate_encoding()
+        path = safe_join(app.static_folder, filename)
+
+        if encoding and path and _is_fresh(f'{path}.{SUFFIXES[encoding]}', path):
+            response = send_from_directory(app.static_folder, f'{filename}.{SUFFIXES[encoding]}', mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+        response.vary.add('Accept-Encoding')
+
+        # Адрес с отпечатком неизменен, пока не изменится файл
+        if 'v' in request.args:
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = send_static
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed:
+            encoding = negotiate_encoding()
+            if encoding is not None:
+                response.response = compress_stream(response.response, encoding)
+                response.headers['Content-Encoding'] = encoding
+            return response
+
+        data = response.get_data()
+        encoding = negotiate_encoding()
+        if encoding is None or len(data) < app.config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @app.cli.command('precompress-static')
+    def precompress_static_command():
+        """Сжать статические файлы (запускать при сборке и после изменения статики)"""
+        written = precompress_static(app.static_folder)
+        click.echo(f'Сжатых файлов записано: {written}')
@@ -0,0 +1,95 @@
+"""Живые обновления главной панели.
+
+Обработчики записи вызывают ``broadcast_dashboard`` после коммита.
+Состояние панели считается один раз на изменение, а не на каждого
+открытого зрителя, и в канал уходят только изменившиеся части:
+новая продажа, счетчики и список последних продаж.
+
+Счетчики и список считаются в фоновом потоке, а не в запросе записи;
+изменения, пришедшие во время подсчета, объединяются в один пересчет.
+"""
+import threading
+
+from flask import current_app
+
+from events import broker
+from money import to_rubles
+from models.inventory import InventoryItem, Sale
+
+CHANNEL = 'dashboard'
+
+_lock = threading.Lock()
+_pending = threading.Event()
+_last_state = {}
+
+
+def dashboard_counters():
+    """Счетчики карточек главной панели"""
+    return {
+        'total_items': InventoryItem.query.count(),
+        'total_sales': Sale.query.count(),
+        'low_stock': InventoryItem.query.filter(InventoryItem.quantity < InventoryItem.reorder_level).count()
+    }
+
+
+def recent_sales(limit=5):
+    """Последние оформленные продажи"""
+    return Sale.query.order_by(Sale.created_at.desc()).limit(limit).all()
+
+
+def serialize_sale(sale):
+    return {
+        'id': sale.id,
+        'sale_date': sale.sale_date.strftime('%d.%m.%Y'),
+        'document_number': sale.document_number,
+        'customer': sale.customer,
+        'total_amount': to_rubles(sale.total_amount)
+    }
+
+
+def _publish_state():
+    """Пересчет панели и рассылка изменившихся частей"""
+    counters = dashboard_counters()
+    recent = [serialize_sale(sale) for sale in recent_sales()]
+
+    if counters != _last_state.get('counters'):
+        broker.publish(CHANNEL, 'counters', counters)
+    if recent != _last_state.get('recent_sales'):
+        broker.publish(CHANNEL, 'recent_sales', recent)
+
+    _last_state['counters'] = counters
+    _last_state['recent_sales'] = recent
+
+
+def _refresh_in_background(app):
+    while True:
+        try:
+            with app.app_context():
+                while _pending.is_set():
+                    _pending.clear()
+                    _publish_state()
+        except Exception:
+            app.logger.exception('Не удалось обновить главную панель')
+        finally:
+            _lock.release()
+        # Изменение, пришедшее после последнего пересчета, но до
+        # освобождения блокировки, досчитывает этот же поток
+        if not (_pending.is_set() and _lock.acquire(blocking=False)):
+            return
+
+
+def broadcast_dashboard(new_sale=None):
+    """Рассылка изменений панели всем подключенным зрителям.
+
+    Новая продажа уходит сразу, пересчет счетчиков и списка - в фоне.
+    """
+    if not broker.has_subscribers(CHANNEL):
+        _last_state.clear()
+        return
+
+    if new_sale is not None:
+        broker.publish(CHANNEL, 'sale', serialize_sale(new_sale))
+    _pending.set()
+    if _lock.acquire(blocking=False):
+        app = current_app._get_current_object()
+        threading.Thread(target=_refresh_in_background, args=(app,), daemon=True).start()
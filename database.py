@@ -1,8 +1,49 @@
+import click
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
 
+def create_schema():
+    """Создание таблиц и обновление схемы существующей базы"""
+    # Только основная база: снимок для отчетов копируется из нее целиком
+    db.create_all(bind_key=None)
+
+    from migrations import upgrade_schema, upgrade_archives
+    upgrade_schema()
+    upgrade_archives(db.engine.url.database, current_app.config['SALES_ARCHIVE_DIR'])
+
+def after_commit(*actions):
+    """Побочные действия после коммита: индексы, уведомления, рассылки.
+
+    Запись уже сохранена, поэтому сбой действия попадает в журнал, а
+    не превращается в ошибку запроса.
+    """
+    for action in actions:
+        try:
+            action()
+        except Exception:
+            current_app.logger.exception('Ошибка после сохранения записи')
+
+def integrity_error_message(error, duplicates):
+    """Сообщение об ошибке ограничения базы для ответа 400.
+
+    ``duplicates`` - сообщения для ограничений уникальности по колонкам
+    вида ``'sales.document_number'``.
+    """
+    message = str(error.orig)
+    for column, text in duplicates.items():
+        if message == f'UNIQUE constraint failed: {column}':
+            return text
+    if message.startswith('NOT NULL constraint failed: '):
+        return f"Не заполнено поле {message.rsplit('.', 1)[-1]}"
+    return f'Нарушена целостность данных: {message}'
+
 def init_db(app):
     db.init_app(app)
-    with app.app_context():
-        db.create_all()
\ No newline at end of file
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Создать таблицы и обновить схему базы данных"""
+        create_schema()
+        click.echo('База данных готова')
@@ -0,0 +1,98 @@
+"""Внутрипроцессная рассылка событий клиентам через Server-Sent Events.
+
+Обработчики записи публикуют событие в канал, брокер один раз
+сериализует его в кадр SSE и раскладывает готовую строку по очередям
+подписчиков. Неактивное соединение стоит одну небольшую очередь и один
+ожидающий поток (или гринлет при запуске под gevent), без опроса базы.
+
+Открытое соединение занимает поток сервера, поэтому поток событий
+открывают только страницы, которым он нужен, и каждая - один: главная
+панель получает уведомления об остатках в своем же потоке. Брокер
+живет в процессе и доставляет события только клиентам того же
+рабочего процесса.
+"""
+import json
+import queue
+import threading
+
+from flask import Response
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+
+
+def format_sse(event, data):
+    """Кадр SSE с JSON-данными"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f'event: {event}\ndata: {payload}\n\n'
+
+
+class EventBroker:
+    """Публикация событий по каналам"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *channels):
+        """Одна очередь подписчика на события всех перечисленных каналов"""
+        subscriber = queue.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def has_subscribers(self, channel):
+        return bool(self._channels.get(channel))
+
+    def publish(self, channel, event, data):
+        """Отправка события всем подписчикам канала"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if not subscribers:
+            return
+
+        message = format_sse(event, data)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Клиент не успевает читать - отключаем его, он переподключится сам
+                subscriber.closed = True
+                self.unsubscribe(channel, subscriber)
+
+
+broker = EventBroker()
+
+
+def sse_response(*channels):
+    """Потоковый ответ, передающий клиенту события каналов"""
+    subscriber = broker.subscribe(*channels)
+
+    def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    yield subscriber.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    if getattr(subscriber, 'closed', False):
+                        return
+                    # Комментарий держит соединение открытым через прокси
+                    yield ': keepalive\n\n'
+        finally:
+            for channel in channels:
+                broker.unsubscribe(channel, subscriber)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,77 @@
+"""Скорость продаж и предложения по дозаказу.
+
+Скорость продаж товара - экспоненциально взвешенное среднее числа
+проданных за день единиц: вклад продажи уменьшается вдвое каждые
+``HALF_LIFE`` дней. История продаж для этого не перечитывается: в
+товаре хранится накопленный вес продаж ``velocity_score``, где каждая
+продажа учтена с множителем 2^((дата - EPOCH) / HALF_LIFE). Оформление
+продажи прибавляет ее вес тем же UPDATE, что списывает остаток,
+удаление - вычитает.
+
+Дневная скорость на дату - вес, умноженный на общий для всех товаров
+множитель. Поэтому порядок товаров по запасу в днях (остаток / вес) от
+даты не зависит и читается по индексу ``ix_inventory_stock_cover``.
+"""
+import math
+from datetime import date
+
+from sqlalchemy import select
+
+from models.inventory import InventoryItem
+
+EPOCH = date(2024, 1, 1)
+# При полупериоде 30 дней вес продаж помещается в float до конца века
+HALF_LIFE = 30
+# Доля одного дня в скользящем среднем
+ALPHA = 1 - 2 ** (-1 / HALF_LIFE)
+# На сколько дней продаж рассчитывается дозаказ по умолчанию
+COVER_DAYS = 30
+
+
+def sale_weight(sale_date, quantity):
+    """Вклад продажи в ``velocity_score`` товара"""
+    return quantity * 2 ** ((sale_date - EPOCH).days / HALF_LIFE)
+
+
+def rate_factor(today=None):
+    """Множитель, переводящий ``velocity_score`` в единицы в день на дату"""
+    today = today or date.today()
+    return ALPHA * 2 ** (-(today - EPOCH).days / HALF_LIFE)
+
+
+def stock_cover():
+    """Остаток, деленный на вес продаж; то же выражение, что в индексе"""
+    return InventoryItem.quantity / InventoryItem.velocity_score
+
+
+def reorder_suggestions(session, days=COVER_DAYS, limit=50, today=None):
+    """Товары, которых хватит не больше чем на ``days`` дней продаж.
+
+    Сначала заканчивающиеся раньше. Предлагаемый дозаказ доводит
+    остаток до продаж за ``days`` дней, но не ниже порога дозаказа.
+    """
+    factor = rate_factor(today)
+    rows = session.execute(
+        select(InventoryItem.id, InventoryItem.component_type, InventoryItem.manufacturer,
+               InventoryItem.model, InventoryItem.quantity, InventoryItem.reorder_level,
+               InventoryItem.velocity_score)
+        .where(stock_cover().between(0, days * factor))
+        .order_by(stock_cover())
+        .limit(limit)
+    )
+
+    suggestions = []
+    for row in rows:
+        rate = row.velocity_score * factor
+        target = max(math.ceil(rate * days), row.reorder_level)
+        suggestions.append({
+            'id': row.id,
+            'product': f'{row.manufacturer} {row.model}',
+            'component_type': row.component_type,
+            'quantity': row.quantity,
+            'reorder_level': row.reorder_level,
+            'daily_rate': round(rate, 2),
+            'days_of_stock': round(row.quantity / rate, 1),
+            'suggested_quantity': max(target - row.quantity, 0)
+        })
+    return suggestions
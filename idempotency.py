@@ -0,0 +1,83 @@
+"""Повторные отправки запросов на запись.
+
+Клиент может передать заголовок ``Idempotency-Key`` с уникальным для
+операции значением. Успешный ответ сохраняется в той же транзакции,
+что и сама запись, поэтому повтор запроса (после обрыва связи или
+двойного нажатия) возвращает сохраненный ответ и не создает продажу
+второй раз. Ответы с ошибкой не сохраняются - такой запрос можно
+повторить.
+
+Старые ключи удаляются командой ``flask purge-idempotency-keys``.
+"""
+import json
+from datetime import datetime, timedelta
+
+import click
+from flask import request, jsonify
+from flask_login import current_user
+
+from database import db
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 64
+KEY_TTL = timedelta(days=1)
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    key = db.Column(db.String(MAX_KEY_LENGTH), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(100), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+def idempotency_key():
+    """Ключ из заголовка запроса или None"""
+    key = request.headers.get(HEADER, '').strip()
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'{HEADER} длиннее {MAX_KEY_LENGTH} символов')
+    return key or None
+
+
+def replay_response(key):
+    """Сохраненный ответ по ключу или None, если ключ еще не встречался"""
+    record = db.session.get(IdempotencyKey, key)
+    if record is None:
+        return None
+
+    if record.user_id != current_user.id or record.path != request.path:
+        return jsonify({'error': f'{HEADER} уже использован для другого запроса'}), 422
+
+    response = jsonify(json.loads(record.response))
+    response.status_code = record.status_code
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def remember_response(key, body, status_code=200):
+    """Сохранение ответа; попадает в базу вместе с коммитом записи"""
+    db.session.add(IdempotencyKey(
+        key=key,
+        user_id=current_user.id,
+        path=request.path,
+        status_code=status_code,
+        response=json.dumps(body, ensure_ascii=False)
+    ))
+
+
+def purge_keys(max_age=KEY_TTL):
+    """Удаление ключей старше ``max_age``; возвращает число удаленных"""
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.created_at < datetime.utcnow() - max_age
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def init_idempotency(app):
+    @app.cli.command('purge-idempotency-keys')
+    def purge_idempotency_keys_command():
+        """Удалить ключи идемпотентности старше суток"""
+        click.echo(f'Удалено ключей: {purge_keys()}')
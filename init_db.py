@@ -1,14 +1,15 @@
-from database import db
+from database import db, create_schema
 from auth import User
 from models.inventory import Supplier, InventoryItem
-from app import app
+from app import create_app
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 
 def init_database():
+    app = create_app()
     with app.app_context():
-        # Создаем все таблицы
-        db.create_all()
+        # Создаем все таблицы и доводим схему до актуальной
+        create_schema()
         
         # Создаем начальных пользователей с разными ролями
         if not User.query.filter_by(username='admin').first():
@@ -57,7 +58,7 @@ def init_database():
                 )
                 db.session.add(supplier)
         
-        # Добавляем тестовые товары
+        # Добавляем тестовые товары (цены в копейках)
         inventory_data = [
             {
                 'receipt_date': datetime.now() - timedelta(days=30),
@@ -67,8 +68,8 @@ def init_database():
                 'model': 'Core i7-13700K',
                 'manufacturer': 'Intel',
                 'quantity': 10,
-                'purchase_price': 25000,
-                'selling_price': 32000
+                'purchase_price': 2500000,
+                'selling_price': 3200000
             },
             {
                 'receipt_date': datetime.now() - timedelta(days=25),
@@ -78,8 +79,8 @@ def init_database():
                 'model': 'RTX 4070',
                 'manufacturer': 'NVIDIA',
                 'quantity': 5,
-                'purchase_price': 45000,
-                'selling_price': 55000
+                'purchase_price': 4500000,
+                'selling_price': 5500000
             },
             {
                 'receipt_date': datetime.now() - timedelta(days=20),
@@ -89,8 +90,8 @@ def init_database():
                 'model': 'DDR4 16GB',
                 'manufacturer': 'Kingston',
                 'quantity': 20,
-                'purchase_price': 4000,
-                'selling_price': 5500
+                'purchase_price': 400000,
+                'selling_price': 550000
             }
         ]
         
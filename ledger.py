@@ -0,0 +1,224 @@
+"""Журнал движения товаров и остатки на прошедшую дату.
+
+Каждое изменение остатка дописывается в ``stock_movements`` в той же
+транзакции, что и само изменение: поступление (``receipt``), продажа
+(``sale``), отмена продажи (``void``) и корректировка (``adjustment`` -
+правка остатка или цены закупки, удаление товара). Строки журнала не
+изменяются и не удаляются.
+
+Создание и удаление товаров и продаж записываются обработчиками событий
+маппера, поэтому их не пропускает ни один путь записи. Правки
+существующего товара записывают в журнал сами обработчики API
+(``record_adjustment``, ``record_cost_changes``).
+
+Номера товаров не используются повторно (AUTOINCREMENT), и описание
+удаленного товара сохраняется в ``deleted_items``: остатки прошлых дат
+показывают и товары, которых уже нет.
+
+Остатки на конец дня периодически сохраняются в ``stock_checkpoints``
+(``flask checkpoint-stock``). Остаток и оценка товара на любую дату -
+ближайшая контрольная точка не позже этой даты плюс движения после нее,
+поэтому просматривается только журнал с последней точки. Движения
+задним числом сразу поправляют более поздние контрольные точки.
+"""
+from datetime import date, datetime, timedelta
+
+import click
+from sqlalchemy import and_, delete, event, func, insert, literal, select, union, update
+
+from database import db
+from models.inventory import InventoryItem, Sale
+
+RECEIPT, SALE, VOID, ADJUSTMENT = 'receipt', 'sale', 'void', 'adjustment'
+# Движения, задающие цену закупки для оценки остатка
+COST_KINDS = (RECEIPT, ADJUSTMENT)
+
+
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    id = db.Column(db.Integer, primary_key=True)
+    # Без внешнего ключа: журнал переживает удаленные товары
+    item_id = db.Column(db.Integer, nullable=False)
+    movement_date = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    # Изменение остатка со знаком
+    quantity = db.Column(db.Integer, nullable=False)
+    # Цена закупки товара на момент движения, в копейках
+    unit_cost = db.Column(db.Integer, nullable=False)
+    sale_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_stock_movements_item_date', 'item_id', 'movement_date'),
+        # Товары с движениями после контрольной точки
+        db.Index('ix_stock_movements_date_item', 'movement_date', 'item_id'),
+    )
+
+
+class StockCheckpoint(db.Model):
+    """Остаток и цена закупки товара на конец дня"""
+    __tablename__ = 'stock_checkpoints'
+    item_id = db.Column(db.Integer, primary_key=True)
+    checkpoint_date = db.Column(db.Date, primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_cost = db.Column(db.Integer, nullable=False)
+
+    # Последняя точка не позже даты и все ее товары
+    __table_args__ = (
+        db.Index('ix_stock_checkpoints_date_item', 'checkpoint_date', 'item_id'),
+    )
+
+
+class DeletedItem(db.Model):
+    """Описание удаленного товара для остатков на прошедшие даты"""
+    __tablename__ = 'deleted_items'
+    item_id = db.Column(db.Integer, primary_key=True)
+    component_type = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(100), nullable=False)
+    manufacturer = db.Column(db.String(100), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+def _record(connection, item_id, movement_date, kind, quantity, unit_cost, sale_id=None):
+    connection.execute(insert(StockMovement).values(
+        item_id=item_id, movement_date=movement_date, kind=kind, quantity=int(quantity),
+        unit_cost=int(unit_cost or 0), sale_id=sale_id, created_at=datetime.utcnow()
+    ))
+    # Контрольные точки ставятся только на прошедшие дни
+    if quantity and movement_date < date.today():
+        # Каждая точка содержит все товары: поступившего задним числом
+        # товара в более поздних точках еще нет
+        connection.execute(insert(StockCheckpoint).prefix_with('OR IGNORE').from_select(
+            ['item_id', 'checkpoint_date', 'quantity', 'unit_cost'],
+            select(literal(item_id), StockCheckpoint.checkpoint_date, literal(0), literal(int(unit_cost or 0)))
+            .where(StockCheckpoint.checkpoint_date >= movement_date)
+            .distinct()
+        ))
+        connection.execute(
+            update(StockCheckpoint)
+            .where(StockCheckpoint.item_id == item_id, StockCheckpoint.checkpoint_date >= movement_date)
+            .values(quantity=StockCheckpoint.quantity + int(quantity))
+        )
+
+
+@event.listens_for(InventoryItem, 'after_insert')
+def _item_received(mapper, connection, item):
+    _record(connection, item.id, item.receipt_date, RECEIPT, item.quantity, item.purchase_price)
+
+
+@event.listens_for(InventoryItem, 'after_delete')
+def _item_deleted(mapper, connection, item):
+    _record(connection, item.id, date.today(), ADJUSTMENT, -item.quantity, item.purchase_price)
+    connection.execute(insert(DeletedItem).values(
+        item_id=item.id, component_type=item.component_type, model=item.model,
+        manufacturer=item.manufacturer, deleted_at=datetime.utcnow()
+    ))
+
+
+@event.listens_for(Sale, 'after_insert')
+def _sale_created(mapper, connection, sale):
+    if sale.item_id is not None:
+        _record(connection, sale.item_id, sale.sale_date, SALE, -sale.quantity_sold, sale.unit_cost, sale.id)
+
+
+@event.listens_for(Sale, 'after_delete')
+def _sale_voided(mapper, connection, sale):
+    # Отмена датируется днем продажи: на прошедшие даты продажи как не было
+    if sale.item_id is not None:
+        _record(connection, sale.item_id, sale.sale_date, VOID, sale.quantity_sold, sale.unit_cost, sale.id)
+
+
+def record_adjustment(item, previous_quantity, previous_cost):
+    """Корректировка после правки товара, если изменились остаток или цена закупки"""
+    if item.quantity != previous_quantity or item.purchase_price != previous_cost:
+        db.session.add(StockMovement(
+            item_id=item.id, movement_date=date.today(), kind=ADJUSTMENT,
+            quantity=item.quantity - previous_quantity, unit_cost=item.purchase_price
+        ))
+
+
+def record_cost_changes(conditions, new_cost):
+    """Корректировки цены закупки для товаров, отобранных ``conditions``.
+
+    Выполняется до массового UPDATE: ``new_cost`` - выражение новой
+    цены через текущие колонки товара.
+    """
+    db.session.execute(insert(StockMovement).from_select(
+        ['item_id', 'movement_date', 'kind', 'quantity', 'unit_cost', 'created_at'],
+        select(InventoryItem.id, literal(date.today()), literal(ADJUSTMENT), literal(0),
+               new_cost, literal(datetime.utcnow()))
+        .where(*conditions)
+    ))
+
+
+def stock_as_of(as_of):
+    """Запрос остатка и цены закупки каждого товара на конец дня ``as_of``.
+
+    Колонки: ``id``, ``quantity``, ``unit_cost``. Товары берутся из
+    последней контрольной точки не позже ``as_of`` и из движений после
+    нее, а не из ``inventory``: удаленные позже товары остаются в
+    остатках прошлых дат. Товары, поступившие позже ``as_of``, не входят.
+    """
+    # Контрольная точка содержит все товары на свой день, поэтому журнал
+    # до нее не читается
+    latest = select(func.max(StockCheckpoint.checkpoint_date)).where(
+        StockCheckpoint.checkpoint_date <= as_of
+    ).scalar_subquery()
+    since = func.coalesce(latest, literal(date.min))
+    items = union(
+        select(StockCheckpoint.item_id).where(StockCheckpoint.checkpoint_date == latest),
+        select(StockMovement.item_id).where(StockMovement.movement_date > since, StockMovement.movement_date <= as_of)
+    ).subquery('items')
+
+    since_checkpoint = and_(
+        StockMovement.item_id == items.c.item_id,
+        StockMovement.movement_date > since,
+        StockMovement.movement_date <= as_of
+    )
+    delta = select(func.coalesce(func.sum(StockMovement.quantity), 0)).where(since_checkpoint).scalar_subquery()
+    cost = (
+        select(StockMovement.unit_cost)
+        .where(since_checkpoint, StockMovement.kind.in_(COST_KINDS))
+        .order_by(StockMovement.movement_date.desc(), StockMovement.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        select(
+            items.c.item_id.label('id'),
+            (func.coalesce(StockCheckpoint.quantity, 0) + delta).label('quantity'),
+            func.coalesce(cost, StockCheckpoint.unit_cost, 0).label('unit_cost'),
+        )
+        .select_from(items)
+        .outerjoin(StockCheckpoint, and_(
+            StockCheckpoint.item_id == items.c.item_id, StockCheckpoint.checkpoint_date == latest
+        ))
+    )
+
+
+def create_checkpoint(session, checkpoint_date):
+    """Контрольная точка остатков всех товаров на конец дня; возвращает число товаров"""
+    if checkpoint_date >= date.today():
+        raise ValueError('Контрольная точка ставится только на прошедший день')
+    stock = stock_as_of(checkpoint_date).subquery()
+    session.execute(delete(StockCheckpoint).where(StockCheckpoint.checkpoint_date == checkpoint_date))
+    written = session.execute(insert(StockCheckpoint).from_select(
+        ['item_id', 'checkpoint_date', 'quantity', 'unit_cost'],
+        select(stock.c.id, literal(checkpoint_date), stock.c.quantity, stock.c.unit_cost)
+    )).rowcount
+    session.commit()
+    return written
+
+
+def init_ledger(app):
+    @app.cli.command('checkpoint-stock')
+    @click.option('--date', 'checkpoint_date', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='День контрольной точки (по умолчанию вчера)')
+    def checkpoint_stock_command(checkpoint_date):
+        """Сохранить остатки на конец дня (запускать периодически, например ежедневно)"""
+        day = checkpoint_date.date() if checkpoint_date else date.today() - timedelta(days=1)
+        try:
+            written = create_checkpoint(db.session, day)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{day}: товаров в контрольной точке - {written}')
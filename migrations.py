@@ -0,0 +1,281 @@
+"""Обновление схемы существующей базы данных.
+
+``db.create_all()`` создает только отсутствующие таблицы и не добавляет
+новые колонки в уже существующие. Здесь собраны шаги, которые доводят
+старую базу до текущих моделей. Каждый шаг можно выполнять повторно.
+
+Файлы архива продаж (см. ``archive``) обновляются отдельно,
+``upgrade_archives``: они подключены к соединениям только для чтения.
+"""
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import inspect, text
+
+from database import db
+from archive import ATTACHED_KEY, DATE_INDEX, archive_path, archive_years, raise_sales_sequence
+from forecast import sale_weight
+
+
+def _has_column(connection, table, column):
+    return column in {info['name'] for info in inspect(connection).get_columns(table)}
+
+
+def _column_type(connection, table, column):
+    for row in connection.execute(text(f'PRAGMA table_info({table})')):
+        if row[1] == column:
+            return row[2].upper()
+    return None
+
+
+def _table_ddl(connection, table):
+    return connection.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"
+    ), {'table': table}).scalar()
+
+
+def _rebuild_table(connection, table, conversions, autoincrement=False):
+    """Смена типа колонок пересозданием таблицы.
+
+    SQLite не умеет менять тип колонки, поэтому таблица создается заново
+    по прежнему DDL с новыми типами, данные переносятся с преобразованием,
+    старая таблица удаляется, новая переименовывается. Индексы моделей
+    затем пересоздает ``upgrade_schema``.
+    ``conversions`` - {колонка: (новый тип, SQL-выражение значения)};
+    ``autoincrement`` - объявить ``id`` как AUTOINCREMENT.
+    """
+    ddl = _table_ddl(connection, table)
+    for column, (column_type, _) in conversions.items():
+        ddl = re.sub(rf'\b{column}\s+\w+', f'{column} {column_type}', ddl, count=1)
+    if autoincrement:
+        ddl = re.sub(r'\bid INTEGER NOT NULL', 'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT', ddl, count=1)
+        ddl = re.sub(r',\s*PRIMARY KEY \(id\)', '', ddl, count=1)
+    ddl = re.sub(rf'^CREATE TABLE "?{table}"?', f'CREATE TABLE {table}_new', ddl, count=1)
+
+    columns = [row[1] for row in connection.execute(text(f'PRAGMA table_info({table})'))]
+    values = [conversions[column][1] if column in conversions else column for column in columns]
+
+    connection.execute(text(ddl))
+    connection.execute(text(
+        f"INSERT INTO {table}_new ({', '.join(columns)}) SELECT {', '.join(values)} FROM {table}"
+    ))
+    connection.execute(text(f'DROP TABLE {table}'))
+    connection.execute(text(f'ALTER TABLE {table}_new RENAME TO {table}'))
+
+
+def _kopecks(column):
+    return (
+        'INTEGER',
+        f'CAST(ROUND({column} * 100) AS INTEGER)'
+    )
+
+
+def add_inventory_total_sold(connection):
+    """Счетчик проданных единиц по каждому товару"""
+    if _has_column(connection, 'inventory', 'total_sold'):
+        return
+    connection.execute(text(
+        "ALTER TABLE inventory ADD COLUMN total_sold INTEGER NOT NULL DEFAULT 0"
+    ))
+    connection.execute(text(
+        "UPDATE inventory SET total_sold = COALESCE("
+        "(SELECT SUM(quantity_sold) FROM sales WHERE sales.item_id = inventory.id), 0)"
+    ))
+
+
+def add_inventory_reorder_level(connection):
+    """Порог дозаказа по каждому товару"""
+    if _has_column(connection, 'inventory', 'reorder_level'):
+        return
+    connection.execute(text(
+        "ALTER TABLE inventory ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT 5"
+    ))
+
+
+def add_inventory_version(connection):
+    """Номер версии товара для проверки одновременных правок"""
+    if _has_column(connection, 'inventory', 'version'):
+        return
+    connection.execute(text(
+        "ALTER TABLE inventory ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+    ))
+
+
+def convert_money_to_kopecks(connection):
+    """Цены и суммы продаж из рублей (REAL) в целые копейки"""
+    if _column_type(connection, 'inventory', 'purchase_price') == 'FLOAT':
+        _rebuild_table(connection, 'inventory', {
+            'purchase_price': _kopecks('purchase_price'),
+            'selling_price': _kopecks('selling_price'),
+        })
+    if _column_type(connection, 'sales', 'total_amount') == 'FLOAT':
+        _rebuild_table(connection, 'sales', {
+            'total_amount': _kopecks('total_amount'),
+        })
+
+
+def _sale_unit_prices_sql(inventory_table):
+    """Колонки цен на момент продажи и их заполнение по прежним данным.
+
+    Цена продажи восстанавливается из суммы продажи, себестоимость -
+    по текущей цене закупки товара: прежняя цена нигде не сохранялась.
+    """
+    return [
+        "ALTER TABLE sales ADD COLUMN unit_cost INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE sales ADD COLUMN unit_price INTEGER NOT NULL DEFAULT 0",
+        "UPDATE sales SET "
+        "unit_price = CASE WHEN quantity_sold > 0 THEN total_amount / quantity_sold ELSE 0 END, "
+        f"unit_cost = COALESCE((SELECT purchase_price FROM {inventory_table} "
+        f"WHERE {inventory_table}.id = sales.item_id), 0)",
+    ]
+
+
+def add_sale_unit_prices(connection):
+    """Цены товара на момент продажи в каждой продаже"""
+    if _has_column(connection, 'sales', 'unit_cost'):
+        return
+    for statement in _sale_unit_prices_sql('inventory'):
+        connection.execute(text(statement))
+
+
+def add_inventory_velocity(connection):
+    """Вес продаж товара для скорости продаж, по истории продаж.
+
+    Архивные продажи закрытых лет не учитываются: их вклад в скорость
+    продаж пренебрежимо мал.
+    """
+    if _has_column(connection, 'inventory', 'velocity_score'):
+        return
+    connection.execute(text(
+        "ALTER TABLE inventory ADD COLUMN velocity_score FLOAT NOT NULL DEFAULT 0"
+    ))
+    scores = defaultdict(float)
+    for item_id, sale_date, quantity in connection.execute(text(
+        "SELECT item_id, sale_date, SUM(quantity_sold) FROM sales "
+        "WHERE item_id IS NOT NULL GROUP BY item_id, sale_date"
+    )):
+        scores[item_id] += sale_weight(date.fromisoformat(str(sale_date)[:10]), quantity)
+    if scores:
+        connection.execute(text("UPDATE inventory SET velocity_score = :score WHERE id = :id"),
+                           [{'id': item_id, 'score': score} for item_id, score in scores.items()])
+
+
+def add_stock_ledger(connection):
+    """Журнал движения товаров для базы, которая велась без него.
+
+    Продажи (включая архивные) переносятся в журнал как есть, с ценой
+    закупки на момент продажи, а поступление товара восстанавливается
+    так, чтобы сумма движений совпала с текущим остатком.
+    """
+    if connection.execute(text("SELECT EXISTS (SELECT 1 FROM stock_movements)")).scalar():
+        return
+    schemas = ['main'] + [f'archive_{year}' for year in connection.info.get(ATTACHED_KEY, ())]
+    for schema in schemas:
+        columns = {row[1] for row in connection.execute(text(f'PRAGMA {schema}.table_info(sales)'))}
+        # Архив, еще не обновленный upgrade_archives, цен продаж не хранит;
+        # upgrade_archives заполнил бы их той же текущей ценой товара
+        unit_cost = 'unit_cost' if 'unit_cost' in columns else (
+            'COALESCE((SELECT purchase_price FROM main.inventory WHERE inventory.id = item_id), 0)'
+        )
+        connection.execute(text(
+            "INSERT INTO stock_movements (item_id, movement_date, kind, quantity, unit_cost, sale_id, created_at) "
+            f"SELECT item_id, sale_date, 'sale', -quantity_sold, {unit_cost}, id, CURRENT_TIMESTAMP "
+            f"FROM {schema}.sales WHERE item_id IS NOT NULL"
+        ))
+    connection.execute(text(
+        "INSERT INTO stock_movements (item_id, movement_date, kind, quantity, unit_cost, created_at) "
+        "SELECT id, receipt_date, 'receipt', quantity + COALESCE("
+        "(SELECT -SUM(quantity) FROM stock_movements WHERE stock_movements.item_id = inventory.id), 0), "
+        "purchase_price, CURRENT_TIMESTAMP FROM inventory"
+    ))
+
+
+def add_inventory_autoincrement(connection):
+    """Номера товаров без повторного использования.
+
+    Журнал движения и описания удаленных товаров хранят номер товара;
+    новый товар с номером удаленного унаследовал бы его историю.
+    """
+    if 'AUTOINCREMENT' in _table_ddl(connection, 'inventory').upper():
+        return
+    _rebuild_table(connection, 'inventory', {}, autoincrement=True)
+
+
+def add_sales_autoincrement(connection):
+    """Номера продаж без повторного использования.
+
+    Без AUTOINCREMENT SQLite выдает новой строке наибольший id плюс один,
+    и после удаления последней продажи ее номер получает следующая.
+    Колоночный снимок, дочитывающий продажи по id, и журнал движения
+    по ``sale_id`` тогда путают две разные продажи.
+    """
+    if 'AUTOINCREMENT' in _table_ddl(connection, 'sales').upper():
+        return
+    _rebuild_table(connection, 'sales', {}, autoincrement=True)
+
+
+MIGRATIONS = [
+    add_inventory_total_sold,
+    add_inventory_reorder_level,
+    convert_money_to_kopecks,
+    add_sale_unit_prices,
+    add_inventory_version,
+    add_inventory_velocity,
+    add_stock_ledger,
+    add_sales_autoincrement,
+    add_inventory_autoincrement,
+]
+
+
+def upgrade_schema():
+    """Применение всех шагов и создание недостающих индексов моделей"""
+    with db.engine.begin() as connection:
+        for migration in MIGRATIONS:
+            migration(connection)
+
+        # Индексы по выражению не отражаются, поэтому наличие проверяется по имени
+        existing = set(connection.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars())
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+
+
+def upgrade_archives(database_path, directory):
+    """Добавление новых колонок и индексов продаж в файлы архива.
+
+    Архив открывается отдельным соединением на запись, рабочая база
+    подключается к нему для заполнения колонок по товарам. Счетчик
+    номеров продаж рабочей базы поднимается до наибольшего номера в
+    архивах: архивы, перенесенные до AUTOINCREMENT, иначе отдали бы свои
+    номера новым продажам.
+    """
+    high = None
+    for year in archive_years(directory):
+        connection = sqlite3.connect(archive_path(directory, year))
+        try:
+            with connection:
+                connection.execute(f'CREATE INDEX IF NOT EXISTS {DATE_INDEX} ON sales (sale_date)')
+            archived = connection.execute('SELECT MAX(id) FROM sales').fetchone()[0]
+            if archived is not None:
+                high = max(high or 0, archived)
+            columns = {row[1] for row in connection.execute('PRAGMA table_info(sales)')}
+            if 'unit_cost' in columns:
+                continue
+            connection.execute('ATTACH DATABASE ? AS working', (database_path,))
+            with connection:
+                for statement in _sale_unit_prices_sql('working.inventory'):
+                    connection.execute(statement)
+        finally:
+            connection.close()
+
+    if high is None:
+        return
+    connection = sqlite3.connect(database_path)
+    try:
+        with connection:
+            raise_sales_sequence(connection, high)
+    finally:
+        connection.close()
@@ -1,5 +1,6 @@
 from datetime import datetime
 from database import db
+from money import to_rubles
 
 class Supplier(db.Model):
     __tablename__ = 'suppliers'
@@ -18,13 +19,42 @@ class InventoryItem(db.Model):
     model = db.Column(db.String(100), nullable=False)
     manufacturer = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)  # Убедимся, что это Integer
-    purchase_price = db.Column(db.Float, nullable=False)
-    selling_price = db.Column(db.Float, nullable=False)
+    # Цены в копейках
+    purchase_price = db.Column(db.Integer, nullable=False)
+    selling_price = db.Column(db.Integer, nullable=False)
+    # Порог дозаказа: товар с меньшим остатком считается заканчивающимся
+    reorder_level = db.Column(db.Integer, nullable=False, default=5, server_default='5')
+    # Продано всего; поддерживается при оформлении и удалении продаж
+    total_sold = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Номер версии записи: UPDATE через ORM проверяет, что запись не
+    # изменилась с момента чтения, и увеличивает номер
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Накопленный вес продаж для скорости продаж (см. forecast.py)
+    velocity_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
     
     supplier = db.relationship('Supplier', backref='inventory_items')
     
+    __mapper_args__ = {'version_id_col': version}
+    
+    # Топ продаж читается по индексу, в том числе внутри типа или производителя
+    __table_args__ = (
+        db.Index('ix_inventory_total_sold', 'total_sold'),
+        db.Index('ix_inventory_type_total_sold', 'component_type', 'total_sold'),
+        db.Index('ix_inventory_manufacturer_total_sold', 'manufacturer', 'total_sold'),
+        # Отчет по поставщикам соединяет поставщиков с их товарами
+        db.Index('ix_inventory_supplier_id', 'supplier_id'),
+        # Предложения по дозаказу: товары по возрастанию запаса в днях
+        db.Index('ix_inventory_stock_cover', quantity / velocity_score),
+        # Номера удаленных товаров не выдаются повторно: на них ссылается журнал
+        {'sqlite_autoincrement': True},
+    )
+    
+    @property
+    def is_low_stock(self):
+        return self.quantity < self.reorder_level
+    
     def to_dict(self):
         """Сериализация в словарь для API"""
         return {
@@ -36,8 +66,11 @@ class InventoryItem(db.Model):
             'model': self.model,
             'manufacturer': self.manufacturer,
             'quantity': int(self.quantity),  # Гарантируем int
-            'purchase_price': float(self.purchase_price),
-            'selling_price': float(self.selling_price)
+            'purchase_price': to_rubles(self.purchase_price),
+            'selling_price': to_rubles(self.selling_price),
+            'reorder_level': self.reorder_level,
+            'total_sold': self.total_sold,
+            'version': self.version
         }
 
 class Sale(db.Model):
@@ -48,7 +81,18 @@ class Sale(db.Model):
     customer = db.Column(db.String(100), nullable=False)
     item_id = db.Column(db.Integer, db.ForeignKey('inventory.id', ondelete='RESTRICT'))
     quantity_sold = db.Column(db.Integer, nullable=False)
-    total_amount = db.Column(db.Float, nullable=False)
+    total_amount = db.Column(db.Integer, nullable=False)  # в копейках
+    # Цены товара на момент продажи (в копейках): отчеты берут себестоимость
+    # отсюда, и изменение цен товара не переписывает прошлую прибыль
+    unit_cost = db.Column(db.Integer, nullable=False, server_default='0')
+    unit_price = db.Column(db.Integer, nullable=False, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    inventory_item = db.relationship('InventoryItem', backref='sales')
\ No newline at end of file
+    inventory_item = db.relationship('InventoryItem', backref='sales')
+    
+    # Отчеты за период читают продажи по диапазону дат. Номера удаленных
+    # продаж не выдаются повторно (AUTOINCREMENT)
+    __table_args__ = (
+        db.Index('ix_sales_sale_date', 'sale_date'),
+        {'sqlite_autoincrement': True},
+    )
\ No newline at end of file
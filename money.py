@@ -0,0 +1,20 @@
+"""Денежные суммы.
+
+Цены и суммы хранятся в базе целым числом копеек, поэтому SUM в SQL
+дает точный итог без накопления ошибки округления. В рубли значения
+переводятся только на границе API и при выводе.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def to_kopecks(rubles):
+    """Рубли (число или строка из формы) в целое число копеек"""
+    amount = Decimal(str(rubles)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return int(amount * 100)
+
+
+def to_rubles(kopecks):
+    """Копейки в рубли для JSON и шаблонов"""
+    if kopecks is None:
+        return None
+    return int(kopecks) / 100
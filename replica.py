@@ -0,0 +1,125 @@
+"""Снимок базы данных для отчетов и аналитики.
+
+Тяжелые отчеты читают не рабочую базу, а ее копию, которую
+периодически обновляет online backup API SQLite. Снимок подключается
+отдельным bind ``reports`` (настройка ``REPORTS_REPLICA``) и считается
+устаревшим через ``REPORTS_REPLICA_MAX_AGE`` секунд. Устаревший снимок
+обновляется в фоновом потоке, а запросы тем временем читают прежний;
+по расписанию снимок обновляет ``flask refresh-reports-replica``. Без
+настройки отчеты читают основную базу, как раньше.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import click
+from flask import current_app, g
+from sqlalchemy.orm import Session
+
+from database import db
+
+BIND_KEY = 'reports'
+BACKUP_STEP_PAGES = 1024
+
+_lock = threading.Lock()
+
+
+def copy_database(source_path, target_path):
+    """Согласованная копия базы SQLite.
+
+    Копирование идет порциями, поэтому основная база блокируется только
+    на время одной порции и оформление продаж не ждет окончания копии.
+    Снимок сначала пишется во временный файл и затем атомарно заменяет
+    предыдущий.
+    """
+    temporary_path = f'{target_path}.{os.getpid()}.tmp'
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(temporary_path)
+    try:
+        source.backup(target, pages=BACKUP_STEP_PAGES, sleep=0.005)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temporary_path, target_path)
+
+
+def replica_enabled():
+    return BIND_KEY in db.engines
+
+
+def replica_age():
+    """Возраст снимка в секундах (None, если снимка еще нет)"""
+    path = db.engines[BIND_KEY].url.database
+    if not os.path.exists(path):
+        return None
+    return time.time() - os.path.getmtime(path)
+
+
+def refresh_replica():
+    """Обновление снимка из основной базы"""
+    engine = db.engines[BIND_KEY]
+    copy_database(db.engine.url.database, engine.url.database)
+    # Новые соединения откроют новый файл; выданные дочитают старый
+    engine.dispose()
+
+
+def _refresh_in_background(app):
+    try:
+        with app.app_context():
+            refresh_replica()
+    except Exception:
+        app.logger.exception('Не удалось обновить снимок базы для отчетов')
+    finally:
+        _lock.release()
+
+
+def ensure_fresh():
+    """Обновление снимка, если он старше допустимого.
+
+    Запрос не ждет копирования: устаревший снимок обновляется в фоне, и
+    одновременно идет не больше одного обновления. Синхронно снимок
+    создается, только если его еще нет - читать пока нечего.
+    """
+    age = replica_age()
+    if age is None:
+        with _lock:
+            if replica_age() is None:
+                refresh_replica()
+        return
+
+    if age > current_app.config.get('REPORTS_REPLICA_MAX_AGE', 60) and _lock.acquire(blocking=False):
+        app = current_app._get_current_object()
+        threading.Thread(target=_refresh_in_background, args=(app,), daemon=True).start()
+
+
+def reports_session():
+    """Сессия для чтения отчетов: снимок, если он настроен, иначе основная"""
+    if not replica_enabled():
+        return db.session
+
+    if 'reports_session' not in g:
+        ensure_fresh()
+        g.reports_session = Session(bind=db.engines[BIND_KEY])
+    return g.reports_session
+
+
+def init_replica(app):
+    """Подключение снимка к приложению"""
+    path = app.config.get('REPORTS_REPLICA')
+    if path:
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[BIND_KEY] = f'sqlite:///{path}'
+
+    @app.teardown_appcontext
+    def close_reports_session(exception=None):
+        session = g.pop('reports_session', None)
+        if session is not None:
+            session.close()
+
+    @app.cli.command('refresh-reports-replica')
+    def refresh_reports_replica_command():
+        """Обновить снимок базы для отчетов (для запуска по расписанию)"""
+        if not replica_enabled():
+            raise click.ClickException('REPORTS_REPLICA не настроен')
+        refresh_replica()
+        click.echo('Снимок базы для отчетов обновлен')
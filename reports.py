@@ -1,133 +1,664 @@
 from datetime import datetime, timedelta
-from database import db
-from models.inventory import InventoryItem, Sale
-from sqlalchemy import func, extract
+from models.inventory import InventoryItem, Supplier
+from analytics_engine import get_analytics_engine
+from cache import CLOSED_PERIODS_VERSION, DATA_VERSION, cache_version, closed_periods, pivot_results
+from replica import reports_session
+from money import to_rubles
+from archive import sales_source
+from streaming import ReportParts, assemble_report
+from ledger import DeletedItem, stock_as_of
+from sqlalchemy import Integer, and_, case, cast, func, literal, select, tuple_
 
-def generate_inventory_report():
-    """Отчет по остаткам на складе"""
-    items = InventoryItem.query.filter(InventoryItem.quantity > 0).all()
+# Строк на одной странице при потоковом чтении
+REPORT_CHUNK = 1000
+
+def _pages(session, query, *keys):
+    """Строки запроса страницами по ``REPORT_CHUNK``, упорядоченные по ``keys``.
     
-    total_value = sum(item.quantity * item.purchase_price for item in items)
-    total_items = sum(item.quantity for item in items)
+    Каждая страница читается целиком, и курсор закрывается до выдачи ее
+    строк: пока клиент медленно скачивает отчет, SQLite не держит
+    блокировку чтения и записи в базу не ждут. Следующая страница
+    начинается после ключа последней строки (без OFFSET). В памяти
+    только текущая страница кортежей, без объектов ORM.
+    """
+    last = None
+    while True:
+        page = query if last is None else query.where(tuple_(*keys) > tuple_(*last))
+        rows = session.execute(page.order_by(*keys).limit(REPORT_CHUNK)).all()
+        if not rows:
+            return
+        last = tuple(rows[-1]._mapping[key] for key in keys)
+        yield from rows
+        if len(rows) < REPORT_CHUNK:
+            return
+
+def inventory_report_parts(as_of=None):
+    """Отчет по остаткам по частям; итоги считаются по ходу чтения строк.
     
-    return {
-        'report_date': datetime.now().strftime('%d.%m.%Y %H:%M'),
-        'total_items': total_items,
-        'total_value': round(total_value, 2),
-        'items': [{
-            'id': item.id,
-            'component_type': item.component_type,
-            'model': item.model,
-            'manufacturer': item.manufacturer,
-            'quantity': item.quantity,
-            'purchase_price': item.purchase_price,
-            'value': round(item.quantity * item.purchase_price, 2)
-        } for item in items]
-    }
+    С ``as_of`` ('ГГГГ-ММ-ДД') - остатки и их оценка на конец этого дня
+    по журналу движения товаров.
+    """
+    session = reports_session()
+    totals = {'items': 0, 'value': 0}
+    head = {'report_date': datetime.now().strftime('%d.%m.%Y %H:%M')}
+    
+    descriptors = [InventoryItem.component_type, InventoryItem.model, InventoryItem.manufacturer]
+    if as_of:
+        # Остатки из журнала; описание удаленных с тех пор товаров - из
+        # записей об удалении
+        stock = stock_as_of(datetime.strptime(as_of, '%Y-%m-%d').date()).subquery()
+        item_id, quantity, purchase_price = stock.c.id, stock.c.quantity, stock.c.unit_cost
+        query = (
+            select(item_id)
+            .outerjoin(InventoryItem, InventoryItem.id == item_id)
+            .outerjoin(DeletedItem, DeletedItem.item_id == item_id)
+        )
+        descriptors = [
+            func.coalesce(column, getattr(DeletedItem, column.key)).label(column.key) for column in descriptors
+        ]
+        head['as_of'] = as_of
+    else:
+        item_id, quantity, purchase_price = InventoryItem.id, InventoryItem.quantity, InventoryItem.purchase_price
+        query = select(item_id)
+    query = query.add_columns(
+        *descriptors,
+        quantity.label('quantity'),
+        purchase_price.label('purchase_price')
+    ).where(quantity > 0)
+    
+    def rows():
+        for item in _pages(session, query, item_id):
+            # Суммы в копейках, сумма целых точна
+            value = item.quantity * item.purchase_price
+            totals['items'] += item.quantity
+            totals['value'] += value
+            yield {
+                'id': item.id,
+                'component_type': item.component_type,
+                'model': item.model,
+                'manufacturer': item.manufacturer,
+                'quantity': item.quantity,
+                'purchase_price': to_rubles(item.purchase_price),
+                'value': to_rubles(value)
+            }
+    
+    return ReportParts(
+        head=head,
+        key='items',
+        rows=rows(),
+        summary=lambda: {'total_items': totals['items'], 'total_value': to_rubles(totals['value'])}
+    )
+
+def generate_inventory_report(as_of=None):
+    """Отчет по остаткам на складе, текущим или на конец дня ``as_of``"""
+    return assemble_report(inventory_report_parts(as_of))
+
+def sales_report_parts(start_date=None, end_date=None):
+    """Отчет по продажам за период по частям"""
+    session = reports_session()
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    
+    # Рабочая таблица и архивы закрытых лет, попадающих в период
+    sales = sales_source(session, start, end)
+    conditions = []
+    if start:
+        conditions.append(sales.c.sale_date >= start)
+    if end:
+        conditions.append(sales.c.sale_date <= end)
+    
+    totals = {'revenue': 0, 'units': 0, 'cost': 0}
+    
+    def rows():
+        for sale in _pages(session, select(
+            sales.c.id,
+            sales.c.sale_date,
+            sales.c.document_number,
+            sales.c.customer,
+            sales.c.quantity_sold,
+            sales.c.total_amount,
+            sales.c.unit_cost,
+            sales.c.unit_price,
+            InventoryItem.manufacturer,
+            InventoryItem.model
+        ).outerjoin(InventoryItem, sales.c.item_id == InventoryItem.id).where(*conditions),
+                sales.c.sale_date, sales.c.id):
+            # Себестоимость по ценам на момент продажи
+            totals['revenue'] += sale.total_amount
+            totals['units'] += sale.quantity_sold
+            totals['cost'] += sale.quantity_sold * sale.unit_cost
+            yield {
+                'id': sale.id,
+                'sale_date': sale.sale_date.strftime('%d.%m.%Y'),
+                'document_number': sale.document_number,
+                'customer': sale.customer,
+                'product': f"{sale.manufacturer} {sale.model}",
+                'quantity': sale.quantity_sold,
+                'unit_price': to_rubles(sale.unit_price),
+                'revenue': to_rubles(sale.total_amount)
+            }
+    
+    def summary():
+        return {
+            'total_revenue': to_rubles(totals['revenue']),
+            'total_units': totals['units'],
+            'total_cost': to_rubles(totals['cost']),
+            'total_profit': to_rubles(totals['revenue'] - totals['cost'])
+        }
+    
+    return ReportParts(
+        head={'period': f"{start_date} - {end_date}" if start_date and end_date else "Все время"},
+        key='sales',
+        rows=rows(),
+        summary=summary
+    )
 
 def generate_sales_report(start_date=None, end_date=None):
     """Отчет по продажам за период"""
-    query = Sale.query
+    return assemble_report(sales_report_parts(start_date, end_date))
+
+def quarter_range(year=None, quarter=None):
+    """Первый и последний день квартала (по умолчанию - текущего) строками"""
+    today = datetime.now()
+    year = year or today.year
+    if quarter not in (1, 2, 3, 4):
+        quarter = (today.month - 1) // 3 + 1
     
-    if start_date:
-        query = query.filter(Sale.sale_date >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date:
-        query = query.filter(Sale.sale_date <= datetime.strptime(end_date, '%Y-%m-%d'))
+    start_date = datetime(year, 3 * quarter - 2, 1)
+    end_date = datetime(year + 1, 1, 1) if quarter == 4 else datetime(year, 3 * quarter + 1, 1)
+    end_date -= timedelta(days=1)
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+
+def generate_quarterly_sales_report(year=None, quarter=None):
+    """Отчет по продажам за квартал"""
+    return generate_sales_report(*quarter_range(year, quarter))
+
+def _supplier_rows(session, start, end, with_activity=True):
+    """Показатели поставщиков одним сгруппированным запросом.
+
+    Продажи за период сначала сворачиваются по товарам, поэтому соединение
+    поставщик - товар - продажи не размножает строки товаров.
+    """
+    query = select(
+        Supplier.id,
+        Supplier.name,
+        func.count(InventoryItem.id),
+        func.coalesce(func.sum(InventoryItem.quantity), 0),
+        func.coalesce(func.sum(InventoryItem.quantity * InventoryItem.purchase_price), 0)
+    ).outerjoin(InventoryItem, InventoryItem.supplier_id == Supplier.id)
     
-    sales = query.all()
+    if with_activity:
+        sales = sales_source(session, start, end)
+        conditions = []
+        received_conditions = []
+        if start:
+            conditions.append(sales.c.sale_date >= start)
+            received_conditions.append(InventoryItem.receipt_date >= start)
+        if end:
+            conditions.append(sales.c.sale_date <= end)
+            received_conditions.append(InventoryItem.receipt_date <= end)
+        
+        activity = select(
+            sales.c.item_id,
+            func.sum(sales.c.quantity_sold).label('units'),
+            func.sum(sales.c.total_amount).label('revenue'),
+            func.sum(sales.c.quantity_sold * sales.c.unit_cost).label('cost')
+        ).where(*conditions).group_by(sales.c.item_id).subquery('activity')
+        
+        # Поступило: остаток плюс продано - не меняется при продажах
+        received = InventoryItem.quantity + InventoryItem.total_sold
+        if received_conditions:
+            received = case((and_(*received_conditions), received), else_=0)
+        
+        query = query.add_columns(
+            func.coalesce(func.sum(received), 0),
+            func.coalesce(func.sum(activity.c.units), 0),
+            func.coalesce(func.sum(activity.c.revenue), 0),
+            func.coalesce(func.sum(activity.c.cost), 0)
+        ).outerjoin(activity, activity.c.item_id == InventoryItem.id)
     
-    total_revenue = sum(sale.total_amount for sale in sales)
-    total_units = sum(sale.quantity_sold for sale in sales)
-    total_cost = sum(sale.quantity_sold * sale.inventory_item.purchase_price for sale in sales)
-    total_profit = total_revenue - total_cost
+    return session.execute(query.group_by(Supplier.id, Supplier.name)).all()
+
+def generate_supplier_report(start_date=None, end_date=None):
+    """Показатели поставщиков за период.
+
+    Поступление, продажи, выручка и маржа относятся к периоду, остаток и
+    его стоимость - текущие. Доля продаж (sell-through) - проданные за
+    период единицы к поступившим за период. Показатели закрытого периода
+    берутся из кэша, и тогда запрашиваются только текущие остатки.
+    """
+    session = reports_session()
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    
+    version = closed_periods.sync(cache_version(CLOSED_PERIODS_VERSION, session))
+    key = ('suppliers', start, end, version)
+    closed = end is not None and end < datetime.now().date()
+    activity = closed_periods.get(key) if closed else None
+    
+    if activity is None:
+        rows = _supplier_rows(session, start, end)
+        activity = {row[0]: tuple(row[5:]) for row in rows}
+        if closed:
+            closed_periods.set(key, activity)
+    else:
+        rows = _supplier_rows(session, start, end, with_activity=False)
+    
+    suppliers = []
+    for supplier_id, name, items, stock_units, stock_value, *_ in rows:
+        received, sold, revenue, cost = activity.get(supplier_id, (0, 0, 0, 0))
+        profit = revenue - cost
+        suppliers.append({
+            'id': supplier_id,
+            'name': name,
+            'items': items,
+            'received_units': received,
+            'stock_units': stock_units,
+            'stock_value': to_rubles(stock_value),
+            'sold_units': sold,
+            'revenue': to_rubles(revenue),
+            'cost': to_rubles(cost),
+            'profit': to_rubles(profit),
+            'margin': round(profit / revenue * 100, 2) if revenue else 0,
+            'sell_through': round(sold / received * 100, 2) if received else None
+        })
+    suppliers.sort(key=lambda supplier: (-supplier['revenue'], supplier['name']))
     
     return {
         'period': f"{start_date} - {end_date}" if start_date and end_date else "Все время",
-        'total_revenue': round(total_revenue, 2),
-        'total_units': total_units,
-        'total_cost': round(total_cost, 2),
-        'total_profit': round(total_profit, 2),
-        'sales': [{
-            'id': sale.id,
-            'sale_date': sale.sale_date.strftime('%d.%m.%Y'),
-            'document_number': sale.document_number,
-            'customer': sale.customer,
-            'product': f"{sale.inventory_item.manufacturer} {sale.inventory_item.model}",
-            'quantity': sale.quantity_sold,
-            'unit_price': sale.inventory_item.selling_price,
-            'revenue': sale.total_amount
-        } for sale in sales]
+        'suppliers': suppliers
     }
 
-def generate_quarterly_sales_report(year=None, quarter=None):
-    """Отчет по продажам за квартал"""
-    if not year:
-        year = datetime.now().year
-    
-    if quarter == 1:
-        start_date = datetime(year, 1, 1)
-        end_date = datetime(year, 3, 31)
-    elif quarter == 2:
-        start_date = datetime(year, 4, 1)
-        end_date = datetime(year, 6, 30)
-    elif quarter == 3:
-        start_date = datetime(year, 7, 1)
-        end_date = datetime(year, 9, 30)
-    elif quarter == 4:
-        start_date = datetime(year, 10, 1)
-        end_date = datetime(year, 12, 31)
-    else:
-        # Текущий квартал
-        current_month = datetime.now().month
-        quarter = (current_month - 1) // 3 + 1
-        return generate_quarterly_sales_report(year, quarter)
+def get_top_sellers(limit=5, component_type=None, manufacturer=None):
+    """Самые продаваемые товары по счетчику total_sold.
+
+    Порядок (total_sold, id) по убыванию совпадает с индексами на total_sold,
+    поэтому запрос читает индекс и останавливается после limit строк.
+    """
+    query = reports_session().query(InventoryItem).filter(InventoryItem.total_sold > 0)
+    if component_type:
+        query = query.filter(InventoryItem.component_type == component_type)
+    if manufacturer:
+        query = query.filter(InventoryItem.manufacturer == manufacturer)
     
-    return generate_sales_report(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    return query.order_by(InventoryItem.total_sold.desc(), InventoryItem.id.desc()).limit(limit).all()
+
+def _analytical_totals(start=None, end=None, component_type=None, manufacturer=None):
+    """Показатели аналитического отчета, посчитанные через SQL.
 
-def generate_analytical_report():
-    """Аналитический отчет для руководства"""
+    Продажи отбираются по индексу на дате продажи, поэтому отчет за
+    период читает только продажи этого периода.
+    """
+    session = reports_session()
+    
+    item_filters = []
+    if component_type:
+        item_filters.append(InventoryItem.component_type == component_type)
+    if manufacturer:
+        item_filters.append(InventoryItem.manufacturer == manufacturer)
+    
+    # Рабочая таблица и архивы, пересекающиеся с периодом (за все время -
+    # все архивы): из тех же продаж складываются total_sold и снимок
+    # колоночного движка
+    sales = sales_source(session, start, end)
+    sale_filters = []
+    if start:
+        sale_filters.append(sales.c.sale_date >= start)
+    if end:
+        sale_filters.append(sales.c.sale_date <= end)
+    
+    def sales_query(*columns, with_items=bool(item_filters)):
+        query = select(*columns).select_from(sales).where(*sale_filters)
+        if with_items:
+            query = query.join(InventoryItem, sales.c.item_id == InventoryItem.id).where(*item_filters)
+        return query
+    
     # Общая статистика
-    total_items = InventoryItem.query.count()
-    total_sales = Sale.query.count()
-    total_suppliers = db.session.query(InventoryItem.supplier_id).distinct().count()
-    
-    # Финансовые показатели
-    sales = Sale.query.all()
-    revenue = sum(sale.total_amount for sale in sales)
-    cost = sum(sale.quantity_sold * sale.inventory_item.purchase_price for sale in sales)
-    profit = revenue - cost
+    total_items = session.execute(select(func.count(InventoryItem.id)).where(*item_filters)).scalar()
+    total_suppliers = session.execute(select(func.count()).select_from(
+        select(InventoryItem.supplier_id).where(*item_filters).distinct().subquery()
+    )).scalar()
+    
+    # Финансовые показатели (в копейках) по ценам на момент продажи
+    total_sales, revenue, cost = session.execute(sales_query(
+        func.count(),
+        func.coalesce(func.sum(sales.c.total_amount), 0),
+        func.coalesce(func.sum(sales.c.quantity_sold * sales.c.unit_cost), 0)
+    )).one()
     
     # Товары на складе
-    inventory_items = InventoryItem.query.all()
-    inventory_value = sum(item.quantity * item.purchase_price for item in inventory_items)
-    potential_revenue = sum(item.quantity * item.selling_price for item in inventory_items)
-    potential_profit = potential_revenue - inventory_value
+    inventory_value, potential_revenue = session.execute(select(
+        func.coalesce(func.sum(InventoryItem.quantity * InventoryItem.purchase_price), 0),
+        func.coalesce(func.sum(InventoryItem.quantity * InventoryItem.selling_price), 0)
+    ).where(*item_filters)).one()
+    
+    # Популярные товары: за все время - по счетчику total_sold,
+    # за период - по продажам периода
+    if start or end:
+        sold = func.sum(sales.c.quantity_sold)
+        popular_items = [tuple(row) for row in session.execute(sales_query(
+            InventoryItem.manufacturer, InventoryItem.model, sold, with_items=True
+        ).group_by(InventoryItem.id).order_by(sold.desc(), InventoryItem.id.desc()).limit(5))]
+    else:
+        popular_items = [
+            (item.manufacturer, item.model, item.total_sold)
+            for item in get_top_sellers(5, component_type, manufacturer)
+        ]
+    
+    # Продажи по типам комплектующих
+    categories = session.execute(sales_query(
+        InventoryItem.component_type,
+        func.sum(sales.c.total_amount),
+        func.sum(sales.c.quantity_sold * sales.c.unit_cost),
+        func.sum(sales.c.quantity_sold),
+        with_items=True
+    ).group_by(InventoryItem.component_type).order_by(InventoryItem.component_type)).all()
+    
+    return {
+        'total_items': total_items,
+        'total_sales': total_sales,
+        'total_suppliers': total_suppliers,
+        'revenue': revenue,
+        'cost': cost,
+        'inventory_value': inventory_value,
+        'potential_revenue': potential_revenue,
+        'popular_items': popular_items,
+        'categories': [tuple(category) for category in categories]
+    }
+
+def generate_analytical_report(start_date=None, end_date=None, component_type=None, manufacturer=None):
+    """Аналитический отчет для руководства.
+
+    Продажи ограничиваются периодом, продажи и товары - типом и
+    производителем; стоимость запасов всегда текущая.
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    filtered = bool(start or end or component_type or manufacturer)
+    
+    # Колоночный движок держит снимок за все время; отчет с отбором
+    # дешевле посчитать запросом по индексам
+    engine = None if filtered else get_analytics_engine()
+    if engine is not None:
+        totals = engine.analytical_totals()
+    else:
+        totals = _analytical_totals(start, end, component_type, manufacturer)
     
-    # Популярные товары
-    popular_items = db.session.query(
-        InventoryItem.manufacturer,
-        InventoryItem.model,
-        func.sum(Sale.quantity_sold).label('total_sold')
-    ).join(Sale).group_by(InventoryItem.id).order_by(func.sum(Sale.quantity_sold).desc()).limit(5).all()
+    revenue = totals['revenue']
+    cost = totals['cost']
+    profit = revenue - cost
+    inventory_value = totals['inventory_value']
+    potential_revenue = totals['potential_revenue']
+    potential_profit = potential_revenue - inventory_value
     
     return {
         'report_date': datetime.now().strftime('%d.%m.%Y %H:%M'),
+        'filters': {
+            'start': start_date,
+            'end': end_date,
+            'component_type': component_type,
+            'manufacturer': manufacturer
+        },
         'statistics': {
-            'total_items': total_items,
-            'total_sales': total_sales,
-            'total_suppliers': total_suppliers
+            'total_items': totals['total_items'],
+            'total_sales': totals['total_sales'],
+            'total_suppliers': totals['total_suppliers']
         },
         'financials': {
-            'revenue': round(revenue, 2),
-            'cost': round(cost, 2),
-            'profit': round(profit, 2),
-            'inventory_value': round(inventory_value, 2),
-            'potential_revenue': round(potential_revenue, 2),
-            'potential_profit': round(potential_profit, 2),
+            'revenue': to_rubles(revenue),
+            'cost': to_rubles(cost),
+            'profit': to_rubles(profit),
+            'inventory_value': to_rubles(inventory_value),
+            'potential_revenue': to_rubles(potential_revenue),
+            'potential_profit': to_rubles(potential_profit),
             'profit_margin': round((profit / revenue * 100) if revenue > 0 else 0, 2)
         },
         'popular_items': [{
-            'product': f"{item.manufacturer} {item.model}",
-            'total_sold': item.total_sold
-        } for item in popular_items]
-    }
\ No newline at end of file
+            'product': f"{manufacturer} {model}",
+            'total_sold': total_sold
+        } for manufacturer, model, total_sold in totals['popular_items']],
+        'categories': [{
+            'component_type': component_type,
+            'revenue': to_rubles(category_revenue),
+            'cost': to_rubles(category_cost),
+            'profit': to_rubles(category_revenue - category_cost),
+            'units': units
+        } for component_type, category_revenue, category_cost, units in totals['categories']]
+    }
+
+
+TIMESERIES_GRANULARITIES = ('day', 'week', 'month')
+TIMESERIES_GROUPS = {
+    'component_type': InventoryItem.component_type,
+    'manufacturer': InventoryItem.manufacturer,
+    'supplier': Supplier.name
+}
+
+def _period_start(day, granularity):
+    """Начало периода, в который попадает дата"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+def _next_period(start, granularity):
+    """Начало следующего периода"""
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def _period_expr(granularity, sale_date):
+    """SQL-выражение начала периода для даты продажи"""
+    if granularity == 'quarter':
+        # Первое число первого месяца квартала
+        month_in_quarter = (cast(func.strftime('%m', sale_date), Integer) - 1) % 3
+        return func.date(sale_date, 'start of month', func.printf('-%d months', month_in_quarter))
+    if granularity == 'week':
+        # Понедельник той же недели
+        return func.date(sale_date, 'weekday 0', '-6 days')
+    if granularity == 'month':
+        return func.strftime('%Y-%m-01', sale_date)
+    return func.date(sale_date)
+
+def _query_timeseries(granularity, group_by, start, end):
+    """Сгруппированные по периодам показатели продаж за диапазон дат"""
+    session = reports_session()
+    sales = sales_source(session, start, end)
+    period = _period_expr(granularity, sales.c.sale_date)
+    group = TIMESERIES_GROUPS[group_by] if group_by else literal(None)
+    
+    query = select(
+        period.label('period'),
+        group.label('group_key'),
+        func.sum(sales.c.total_amount),
+        func.sum(sales.c.quantity_sold),
+        func.sum(sales.c.quantity_sold * sales.c.unit_cost)
+    ).select_from(sales)
+    # Товары нужны только для группировки
+    if group_by:
+        query = query.join(InventoryItem, sales.c.item_id == InventoryItem.id)
+    if group_by == 'supplier':
+        query = query.outerjoin(Supplier, InventoryItem.supplier_id == Supplier.id)
+    
+    return session.execute(query.where(
+        sales.c.sale_date >= start,
+        sales.c.sale_date <= end
+    ).group_by(period, group)).all()
+
+def generate_revenue_timeseries(granularity='day', start_date=None, end_date=None, group_by=None):
+    """Выручка, продажи, себестоимость и прибыль по периодам"""
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise ValueError(f'Неизвестная детализация: {granularity}')
+    if group_by and group_by not in TIMESERIES_GROUPS:
+        raise ValueError(f'Неизвестная группировка: {group_by}')
+    
+    today = datetime.now().date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else today
+    if start_date:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    else:
+        start = end - timedelta(days={'day': 29, 'week': 7 * 11, 'month': 365}[granularity])
+    
+    # Разбиваем диапазон на периоды; крайние периоды обрезаются по границам
+    periods = []
+    period_start = _period_start(start, granularity)
+    while period_start <= end:
+        period_end = _next_period(period_start, granularity) - timedelta(days=1)
+        periods.append((period_start, max(period_start, start), min(period_end, end), period_end < today))
+        period_start = period_end + timedelta(days=1)
+    
+    # Закрытые периоды берем из кэша, остальные считаем одним запросом
+    version = closed_periods.sync(cache_version(CLOSED_PERIODS_VERSION, reports_session()))
+    values = {}
+    missing = []
+    for period_start, low, high, closed in periods:
+        cached = closed_periods.get((granularity, group_by, low, high, version)) if closed else None
+        if cached is None:
+            missing.append((period_start, low, high, closed))
+        else:
+            values[period_start] = cached
+    
+    if missing:
+        fetched = {period_start: {} for period_start, _, _, _ in missing}
+        for period, group_key, revenue, units, cost in _query_timeseries(
+                granularity, group_by, missing[0][1], missing[-1][2]):
+            period_start = datetime.strptime(period, '%Y-%m-%d').date()
+            if period_start in fetched:
+                fetched[period_start][group_key] = (revenue or 0, units or 0, cost or 0)
+        for period_start, low, high, closed in missing:
+            values[period_start] = fetched[period_start]
+            if closed:
+                closed_periods.set((granularity, group_by, low, high, version), fetched[period_start])
+    
+    keys = sorted({key for period_values in values.values() for key in period_values},
+                  key=lambda key: (key is None, key))
+    if not group_by:
+        keys = [None]
+    
+    series = []
+    for key in keys:
+        rows = [values[period_start].get(key, (0, 0, 0)) for period_start, _, _, _ in periods]
+        series.append({
+            'key': key if group_by else 'Все товары',
+            'revenue': [to_rubles(revenue) for revenue, _, _ in rows],
+            'units': [units for _, units, _ in rows],
+            'cost': [to_rubles(cost) for _, _, cost in rows],
+            'profit': [to_rubles(revenue - cost) for revenue, _, cost in rows]
+        })
+    
+    return {
+        'granularity': granularity,
+        'group_by': group_by,
+        'start': start.strftime('%Y-%m-%d'),
+        'end': end.strftime('%Y-%m-%d'),
+        'periods': [period_start.strftime('%Y-%m-%d') for period_start, _, _, _ in periods],
+        'series': series
+    }
+
+
+PIVOT_PERIODS = ('day', 'week', 'month', 'quarter')
+PIVOT_ATTRIBUTES = ('component_type', 'manufacturer', 'supplier', 'customer')
+PIVOT_MEASURES = ('revenue', 'units', 'cost', 'profit', 'sales')
+PIVOT_MONEY_MEASURES = ('revenue', 'cost', 'profit')
+PIVOT_MAX_DIMENSIONS = 3
+PIVOT_MAX_CELLS = 10000
+
+def _pivot_dimension(name, sales):
+    """SQL-выражение измерения сводной таблицы (только из списка разрешенных)"""
+    if name in PIVOT_PERIODS:
+        return _period_expr(name, sales.c.sale_date)
+    if name == 'customer':
+        return sales.c.customer
+    if name == 'supplier':
+        return Supplier.name
+    return getattr(InventoryItem, name)
+
+def _pivot_measure(name, sales):
+    if name == 'revenue':
+        return func.sum(sales.c.total_amount)
+    if name == 'units':
+        return func.sum(sales.c.quantity_sold)
+    if name == 'cost':
+        return func.sum(sales.c.quantity_sold * sales.c.unit_cost)
+    if name == 'profit':
+        return func.sum(sales.c.total_amount - sales.c.quantity_sold * sales.c.unit_cost)
+    return func.count()
+
+def _query_pivot(session, dimensions, measure, start, end):
+    """Сводная таблица одним GROUP BY по выбранным измерениям"""
+    sales = sales_source(session, start, end)
+    columns = [_pivot_dimension(name, sales) for name in dimensions]
+    
+    query = select(*columns, _pivot_measure(measure, sales)).select_from(sales)
+    if set(dimensions) & {'component_type', 'manufacturer', 'supplier'}:
+        query = query.join(InventoryItem, sales.c.item_id == InventoryItem.id)
+    if 'supplier' in dimensions:
+        query = query.outerjoin(Supplier, InventoryItem.supplier_id == Supplier.id)
+    if start:
+        query = query.where(sales.c.sale_date >= start)
+    if end:
+        query = query.where(sales.c.sale_date <= end)
+    
+    return session.execute(query.group_by(*columns)).all()
+
+def _sorted_keys(keys):
+    return sorted(set(keys), key=lambda key: tuple((value is None, value) for value in key))
+
+def generate_pivot(rows=(), cols=(), measure='revenue', start_date=None, end_date=None):
+    """Сводная таблица продаж: показатель в разрезе измерений строк и столбцов.
+
+    Измерения - атрибуты товара и продажи (``PIVOT_ATTRIBUTES``) и
+    периоды (``PIVOT_PERIODS``). Результат кэшируется по нормализованным
+    параметрам и номеру версии данных.
+    """
+    rows, cols = tuple(rows), tuple(cols)
+    dimensions = rows + cols
+    unknown = [name for name in dimensions if name not in PIVOT_PERIODS + PIVOT_ATTRIBUTES]
+    if unknown:
+        raise ValueError(f"Неизвестные измерения: {', '.join(unknown)}")
+    if len(set(dimensions)) != len(dimensions):
+        raise ValueError('Измерение указано дважды')
+    if len(dimensions) > PIVOT_MAX_DIMENSIONS:
+        raise ValueError(f'Не больше {PIVOT_MAX_DIMENSIONS} измерений')
+    if measure not in PIVOT_MEASURES:
+        raise ValueError(f'Неизвестный показатель: {measure}')
+    
+    start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    
+    session = reports_session()
+    key = (rows, cols, measure, start, end, cache_version(DATA_VERSION, session))
+    cached = pivot_results.get(key)
+    if cached is not None:
+        return cached
+    
+    values = {}
+    for record in _query_pivot(session, dimensions, measure, start, end):
+        values[(tuple(record[:len(rows)]), tuple(record[len(rows):-1]))] = record[-1] or 0
+    
+    row_keys = _sorted_keys(row for row, _ in values)
+    col_keys = _sorted_keys(col for _, col in values)
+    if len(row_keys) * len(col_keys) > PIVOT_MAX_CELLS:
+        raise ValueError(f'Слишком много ячеек (больше {PIVOT_MAX_CELLS}), сузьте период или измерения')
+    
+    cells = [[values.get((row, col), 0) for col in col_keys] for row in row_keys]
+    convert = to_rubles if measure in PIVOT_MONEY_MEASURES else (lambda value: value)
+    
+    report = {
+        'rows': list(rows),
+        'cols': list(cols),
+        'measure': measure,
+        'start': start_date,
+        'end': end_date,
+        'row_keys': [list(row) for row in row_keys],
+        'col_keys': [list(col) for col in col_keys],
+        'cells': [[convert(value) for value in line] for line in cells],
+        'row_totals': [convert(sum(line)) for line in cells],
+        'col_totals': [convert(sum(column)) for column in zip(*cells)],
+        'total': convert(sum(values.values()))
+    }
+    pivot_results.set(key, report)
+    return report
@@ -0,0 +1,290 @@
+"""Индексы поиска в памяти: подсказки по мере ввода и поиск с опечатками.
+
+Значения полей (модель, производитель, тип комплектующих, покупатель,
+поставщик) хранятся в отсортированном массиве нормализованных ключей.
+Подсказки по префиксу находятся двоичным поиском (``bisect``) и чтением
+подряд идущих ключей, без обращения к базе. Каждое значение индексируется
+с начала каждого слова, поэтому «4070» находит «RTX 4070».
+
+Для нечеткого поиска товаров (``/api/search?fuzzy=1``) рядом ведется
+индекс триграмм по производителю и модели: «kingstn», «RTX4070» и
+«i7 13700» находят «Kingston», «RTX 4070» и «Core i7-13700K».
+
+Индексы строятся при первом обращении и помнят номер версии данных
+(``cache_version(DATA_VERSION)``), по которой построены. Запись в другом
+рабочем процессе меняет номер, и индекс перестраивается при следующем
+обращении. Свои записи процесс вносит в индекс после коммита и
+переходит на новый номер, если других записей между ними не было.
+"""
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from flask import current_app
+
+from cache import DATA_VERSION, cache_version
+from models.inventory import InventoryItem, Sale, Supplier
+
+FIELDS = ('model', 'manufacturer', 'component_type', 'customer', 'supplier')
+
+
+def _normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def _word_suffixes(text):
+    """Нормализованный текст, начиная с каждого слова"""
+    words = _normalize(text).split(' ')
+    return {' '.join(words[position:]) for position in range(len(words))}
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей с подсчетом вхождений значений"""
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.version = None
+
+    def add(self, field, value, count=1):
+        if not value:
+            return
+        with self._lock:
+            for key in _word_suffixes(value):
+                entries = self._entries.get(key)
+                if entries is None:
+                    entries = self._entries[key] = {}
+                    insort(self._keys, key)
+                entries[(field, value)] = entries.get((field, value), 0) + count
+
+    def remove(self, field, value):
+        if not value:
+            return
+        with self._lock:
+            for key in _word_suffixes(value):
+                entries = self._entries.get(key)
+                if entries is None or (field, value) not in entries:
+                    continue
+                entries[(field, value)] -= 1
+                if entries[(field, value)] <= 0:
+                    del entries[(field, value)]
+                if not entries:
+                    del self._entries[key]
+                    del self._keys[bisect_left(self._keys, key)]
+
+    def update(self, removed=(), added=()):
+        """Замена значений после изменения записи: пары (поле, значение)"""
+        for field, value in removed:
+            self.remove(field, value)
+        for field, value in added:
+            self.add(field, value)
+
+    def suggest(self, prefix, limit=10, fields=None):
+        """До ``limit`` значений, слово которых начинается с ``prefix``"""
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            position = bisect_left(self._keys, prefix)
+            while position < len(self._keys) and len(results) < limit:
+                key = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                for field, value in sorted(self._entries[key]):
+                    if (fields is None or field in fields) and (field, value) not in seen:
+                        seen.add((field, value))
+                        results.append({'field': field, 'value': value})
+                        if len(results) == limit:
+                            break
+                position += 1
+        return results
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _trigrams(text):
+    """Триграммы текста без регистра, пробелов и знаков препинания"""
+    compact = ''.join(char for char in text.casefold() if char.isalnum())
+    return {compact[position:position + 3] for position in range(len(compact) - 2)}
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмм для поиска с опечатками.
+
+    Кандидаты собираются по самым редким триграммам запроса (частые
+    почти ничего не отсекают, а их списки длинные), затем для не более
+    чем ``MAX_CANDIDATES`` лучших считается точное сходство. Поэтому
+    время поиска ограничено и на большом каталоге.
+    """
+
+    MAX_CANDIDATES = 200
+    MAX_POSTINGS = 5000
+
+    def __init__(self):
+        self._postings = {}
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.version = None
+
+    def set(self, document_id, text):
+        with self._lock:
+            self._discard(document_id)
+            grams = _trigrams(text)
+            self._documents[document_id] = grams
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(document_id)
+
+    def remove(self, document_id):
+        with self._lock:
+            self._discard(document_id)
+
+    def _discard(self, document_id):
+        for gram in self._documents.pop(document_id, ()):
+            postings = self._postings[gram]
+            postings.discard(document_id)
+            if not postings:
+                del self._postings[gram]
+
+    def search(self, query, limit=20, threshold=0.5):
+        """Пары (id, сходство) по убыванию сходства.
+
+        Сходство - доля триграмм запроса, найденных в документе; при
+        равенстве выше документ, у которого меньше лишних триграмм.
+        """
+        grams = _trigrams(query)
+        if not grams:
+            return []
+
+        with self._lock:
+            postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+            hits = Counter()
+            for position, posting in enumerate(postings):
+                if position and len(posting) > self.MAX_POSTINGS:
+                    break
+                hits.update(posting)
+
+            ranked = []
+            for document_id, _ in hits.most_common(self.MAX_CANDIDATES):
+                document = self._documents[document_id]
+                shared = len(grams & document)
+                score = shared / len(grams)
+                if score >= threshold:
+                    ranked.append((score, shared / len(grams | document), document_id))
+
+        return [(document_id, round(score, 3))
+                for score, _, document_id in heapq.nlargest(limit, ranked, key=lambda entry: entry[:2])]
+
+    def __len__(self):
+        return len(self._documents)
+
+
+def item_terms(item):
+    """Индексируемые значения товара"""
+    return [
+        ('model', item.model),
+        ('manufacturer', item.manufacturer),
+        ('component_type', item.component_type),
+    ]
+
+
+def sale_terms(sale):
+    """Индексируемые значения продажи"""
+    return [('customer', sale.customer)]
+
+
+def product_text(terms):
+    """Текст товара для нечеткого поиска: производитель и модель"""
+    values = dict(terms)
+    return f"{values['manufacturer']} {values['model']}"
+
+
+def build_index(session):
+    """Индекс подсказок по текущему содержимому базы"""
+    index = PrefixIndex()
+    for item in session.query(InventoryItem.model, InventoryItem.manufacturer, InventoryItem.component_type):
+        for field, value in item_terms(item):
+            index.add(field, value)
+    for sale in session.query(Sale.customer):
+        index.add('customer', sale.customer)
+    for supplier in session.query(Supplier.name):
+        index.add('supplier', supplier.name)
+    return index
+
+
+def build_product_index(session):
+    """Индекс триграмм товаров по текущему содержимому базы"""
+    index = TrigramIndex()
+    for item in session.query(InventoryItem.id, InventoryItem.model, InventoryItem.manufacturer,
+                              InventoryItem.component_type):
+        index.set(item.id, product_text(item_terms(item)))
+    return index
+
+
+_build_lock = threading.Lock()
+
+
+def _get_index(name, build, session):
+    version = cache_version(DATA_VERSION, session)
+    index = current_app.extensions.get(name)
+    if index is None or index.version != version:
+        with _build_lock:
+            index = current_app.extensions.get(name)
+            if index is None or index.version != version:
+                index = build(session)
+                index.version = version
+                current_app.extensions[name] = index
+    return index
+
+
+def _advance(index):
+    """Переход индекса на версию своей записи.
+
+    Если после построения индекса была и чужая запись, номер версии
+    ушел дальше, и индекс перестроится при следующем обращении.
+    """
+    version = cache_version(DATA_VERSION)
+    if index.version is not None and version == index.version + 1:
+        index.version = version
+
+
+def get_search_index(session):
+    """Индекс подсказок приложения для текущей версии данных"""
+    return _get_index('search_index', build_index, session)
+
+
+def get_product_index(session):
+    """Индекс триграмм товаров приложения для текущей версии данных"""
+    return _get_index('product_index', build_product_index, session)
+
+
+def update_search_index(removed=(), added=()):
+    """Обновление индекса подсказок после записи (если он уже построен)"""
+    index = current_app.extensions.get('search_index')
+    if index is not None:
+        index.update(removed, added)
+        _advance(index)
+
+
+def index_item(item_id, previous_terms=(), terms=()):
+    """Обновление обоих индексов после записи товара; пустые terms - товар удален"""
+    update_search_index(previous_terms, terms)
+
+    index = current_app.extensions.get('product_index')
+    if index is not None:
+        if terms:
+            index.set(item_id, product_text(terms))
+        else:
+            index.remove(item_id)
+        _advance(index)
+
+
+def reset_search_indexes():
+    """Сброс обоих индексов после массовой правки; они перестроятся при следующем обращении"""
+    for name in ('search_index', 'product_index'):
+        current_app.extensions.pop(name, None)
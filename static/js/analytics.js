@@ -2,20 +2,196 @@
 
 let financialChart = null;
 let popularItemsChart = null;
+let timeseriesChart = null;
 
 document.addEventListener('DOMContentLoaded', function() {
     initializeAnalyticsHandlers();
 });
 
 function initializeAnalyticsHandlers() {
-    // Generate analytics on page load
-    generateAnalytics();
+    // Analytics and time series on page load, in one request
+    loadAnalyticsPage();
 
     // Generate analytics button
     const generateAnalyticsBtn = document.getElementById('generateAnalytics');
     if (generateAnalyticsBtn) {
         generateAnalyticsBtn.addEventListener('click', generateAnalytics);
     }
+
+    // Revenue time series
+    ['timeseriesGranularity', 'timeseriesGroupBy'].forEach(id => {
+        const select = document.getElementById(id);
+        if (select) {
+            select.addEventListener('change', loadTimeseries);
+        }
+    });
+
+    // Report filters
+    ['analyticsStart', 'analyticsEnd', 'analyticsComponentType', 'analyticsManufacturer'].forEach(id => {
+        const input = document.getElementById(id);
+        if (input) {
+            input.addEventListener('change', generateAnalytics);
+        }
+    });
+
+    // Pivot table
+    ['pivotMeasure', 'pivotRows', 'pivotCols'].forEach(id => {
+        const select = document.getElementById(id);
+        if (select) {
+            select.addEventListener('change', loadPivot);
+        }
+    });
+}
+
+async function loadAnalyticsPage() {
+    const canvas = document.getElementById('timeseriesChart');
+    const pivotContainer = document.getElementById('pivotTable');
+    const requests = [
+        { method: 'GET', path: analyticsUrl() },
+        { method: 'GET', path: timeseriesUrl() },
+        { method: 'GET', path: pivotUrl() }
+    ];
+
+    try {
+        const [analytics, timeseries, pivot] = await apiBatch(requests);
+        if (analytics) {
+            displayAnalytics(analytics);
+            createCharts(analytics);
+        }
+        if (canvas && timeseries) {
+            drawTimeseries(canvas, timeseries);
+        }
+        if (pivotContainer && pivot) {
+            displayPivot(pivotContainer, pivot);
+        }
+    } catch (error) {
+        // Error handling is done in apiCall
+    }
+}
+
+// Period and product filters of the analytical report
+function analyticsUrl() {
+    const params = new URLSearchParams();
+    const filters = {
+        start: 'analyticsStart',
+        end: 'analyticsEnd',
+        component_type: 'analyticsComponentType',
+        manufacturer: 'analyticsManufacturer'
+    };
+    Object.entries(filters).forEach(([name, id]) => {
+        const input = document.getElementById(id);
+        if (input && input.value.trim()) {
+            params.set(name, input.value.trim());
+        }
+    });
+    return params.toString() ? `/api/analytics?${params}` : '/api/analytics';
+}
+
+function timeseriesUrl() {
+    const params = new URLSearchParams({
+        granularity: document.getElementById('timeseriesGranularity').value
+    });
+    const groupBy = document.getElementById('timeseriesGroupBy').value;
+    if (groupBy) {
+        params.set('group_by', groupBy);
+    }
+    return `/api/analytics/timeseries?${params}`;
+}
+
+async function loadTimeseries() {
+    const canvas = document.getElementById('timeseriesChart');
+    if (!canvas) {
+        return;
+    }
+
+    try {
+        drawTimeseries(canvas, await apiCall(timeseriesUrl()));
+    } catch (error) {
+        // Error handling is done in apiCall
+    }
+}
+
+function drawTimeseries(canvas, timeseries) {
+    if (timeseriesChart) {
+        timeseriesChart.destroy();
+    }
+
+    timeseriesChart = new Chart(canvas, {
+        type: 'line',
+        data: {
+            labels: timeseries.periods.map(formatDate),
+            datasets: timeseries.series.map(series => ({
+                label: series.key || 'Без значения',
+                data: series.revenue,
+                tension: 0.2
+            }))
+        },
+        options: {
+            responsive: true,
+            plugins: {
+                tooltip: {
+                    callbacks: {
+                        label: context => `${context.dataset.label}: ${formatCurrency(context.parsed.y)}`
+                    }
+                }
+            }
+        }
+    });
+}
+
+function pivotUrl() {
+    const params = new URLSearchParams({
+        measure: document.getElementById('pivotMeasure').value,
+        rows: document.getElementById('pivotRows').value,
+        cols: document.getElementById('pivotCols').value
+    });
+    return `/api/analytics/pivot?${params}`;
+}
+
+async function loadPivot() {
+    const container = document.getElementById('pivotTable');
+    if (!container) {
+        return;
+    }
+
+    try {
+        displayPivot(container, await apiCall(pivotUrl()));
+    } catch (error) {
+        // Error handling is done in apiCall
+    }
+}
+
+function displayPivot(container, pivot) {
+    const money = ['revenue', 'cost', 'profit'].includes(pivot.measure);
+    const format = value => money ? formatCurrency(value) : value;
+    const label = key => key.length ? key.map(value => value ?? '—').join(' / ') : 'Итого';
+
+    if (!pivot.row_keys.length) {
+        container.innerHTML = '<p class="text-muted">Нет данных за выбранный период</p>';
+        return;
+    }
+
+    let html = '<table class="table table-sm table-striped"><thead><tr><th></th>';
+    pivot.col_keys.forEach(key => {
+        html += `<th class="text-end">${label(key)}</th>`;
+    });
+    html += '<th class="text-end">Всего</th></tr></thead><tbody>';
+
+    pivot.row_keys.forEach((key, index) => {
+        html += `<tr><th>${label(key)}</th>`;
+        pivot.cells[index].forEach(value => {
+            html += `<td class="text-end">${format(value)}</td>`;
+        });
+        html += `<td class="text-end fw-bold">${format(pivot.row_totals[index])}</td></tr>`;
+    });
+
+    html += '</tbody><tfoot><tr><th>Всего</th>';
+    pivot.col_totals.forEach(value => {
+        html += `<td class="text-end fw-bold">${format(value)}</td>`;
+    });
+    html += `<td class="text-end fw-bold">${format(pivot.total)}</td></tr></tfoot></table>`;
+
+    container.innerHTML = html;
 }
 
 async function generateAnalytics() {
@@ -27,7 +203,7 @@ async function generateAnalytics() {
     }
     
     try {
-        const analytics = await apiCall('/api/analytics');
+        const analytics = await apiCall(analyticsUrl());
         displayAnalytics(analytics);
         createCharts(analytics);
     } catch (error) {
@@ -42,7 +218,7 @@ async function generateAnalytics() {
 function displayAnalytics(analytics) {
     const resultsDiv = document.getElementById('analyticsResults');
     
-    const { statistics, financials, popular_items } = analytics;
+    const { statistics, financials, popular_items, categories } = analytics;
     
     let html = `
         <div class="row">
@@ -118,6 +294,50 @@ function displayAnalytics(analytics) {
         `;
     }
     
+    html += `
+                        </tbody>
+                    </table>
+                </div>
+            </div>
+        </div>
+        
+        <div class="row mt-4">
+            <div class="col-12">
+                <h5>Продажи по типам комплектующих</h5>
+                <div class="table-responsive">
+                    <table class="table table-striped">
+                        <thead>
+                            <tr>
+                                <th>Тип</th>
+                                <th>Продано</th>
+                                <th>Выручка</th>
+                                <th>Себестоимость</th>
+                                <th>Прибыль</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+    `;
+    
+    if (categories && categories.length > 0) {
+        categories.forEach(category => {
+            html += `
+                <tr>
+                    <td>${category.component_type}</td>
+                    <td>${category.units} шт.</td>
+                    <td>${formatCurrency(category.revenue)}</td>
+                    <td>${formatCurrency(category.cost)}</td>
+                    <td>${formatCurrency(category.profit)}</td>
+                </tr>
+            `;
+        });
+    } else {
+        html += `
+            <tr>
+                <td colspan="5" class="text-center text-muted">Нет данных о продажах</td>
+            </tr>
+        `;
+    }
+    
     html += `
                         </tbody>
                     </table>
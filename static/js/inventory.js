@@ -118,6 +118,7 @@ async function openEditModal(itemId) {
         if (item) {
             // Populate the edit form with item data
             document.getElementById('editItemId').value = item.id;
+            document.getElementById('editVersion').value = item.version;
             document.getElementById('editReceiptDate').value = formatDateForInput(item.receipt_date);
             document.getElementById('editDocumentNumber').value = item.document_number;
             document.getElementById('editSupplierId').value = item.supplier_id;
@@ -127,6 +128,7 @@ async function openEditModal(itemId) {
             document.getElementById('editQuantity').value = item.quantity;
             document.getElementById('editPurchasePrice').value = item.purchase_price;
             document.getElementById('editSellingPrice').value = item.selling_price;
+            document.getElementById('editReorderLevel').value = item.reorder_level;
             
             // Show the modal
             const editModal = new bootstrap.Modal(document.getElementById('editItemModal'));
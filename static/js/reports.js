@@ -20,6 +20,12 @@ function initializeReportsHandlers() {
         generateSalesReport.addEventListener('click', generateSalesReportHandler);
     }
 
+    // Generate supplier report for the same dates
+    const generateSupplierReport = document.getElementById('generateSupplierReport');
+    if (generateSupplierReport) {
+        generateSupplierReport.addEventListener('click', generateSupplierReportHandler);
+    }
+
     // Generate quarterly report
     const generateQuarterlyReport = document.getElementById('generateQuarterlyReport');
     if (generateQuarterlyReport) {
@@ -46,7 +52,8 @@ async function generateInventoryReportHandler() {
     showLoading(button);
     
     try {
-        const report = await apiCall('/api/reports/inventory');
+        const asOf = document.getElementById('inventoryAsOf').value;
+        const report = await apiCall(asOf ? `/api/reports/inventory?as_of=${asOf}` : '/api/reports/inventory');
         displayInventoryReport(report);
     } catch (error) {
         // Error handling is done in apiCall
@@ -96,6 +103,29 @@ async function generateQuarterlyReportHandler() {
     }
 }
 
+async function generateSupplierReportHandler() {
+    const startDate = document.getElementById('startDate').value;
+    const endDate = document.getElementById('endDate').value;
+    
+    if (!startDate || !endDate) {
+        showAlert('Пожалуйста, выберите начальную и конечную даты', 'warning');
+        return;
+    }
+    
+    const button = document.getElementById('generateSupplierReport');
+    const originalText = button.innerHTML;
+    showLoading(button);
+    
+    try {
+        const report = await apiCall(`/api/reports/suppliers?start_date=${startDate}&end_date=${endDate}`);
+        displaySupplierReport(report);
+    } catch (error) {
+        // Error handling is done in apiCall
+    } finally {
+        hideLoading(button, originalText);
+    }
+}
+
 function displayInventoryReport(report) {
     const resultsDiv = document.getElementById('reportResults');
     
@@ -111,6 +141,7 @@ function displayInventoryReport(report) {
             <div class="row mb-4">
                 <div class="col-md-6">
                     <p><strong>Дата формирования:</strong> ${report.report_date}</p>
+                    ${report.as_of ? `<p><strong>Остатки на конец дня:</strong> ${formatDate(report.as_of)}</p>` : ''}
                     <p><strong>Общее количество товаров:</strong> ${report.total_items} шт.</p>
                 </div>
                 <div class="col-md-6">
@@ -236,6 +267,72 @@ function displaySalesReport(report) {
     resultsDiv.innerHTML = html;
 }
 
+function displaySupplierReport(report) {
+    const resultsDiv = document.getElementById('reportResults');
+    
+    let html = `
+        <div class="report-section">
+            <div class="d-flex justify-content-between align-items-center mb-3">
+                <h4>Отчет по поставщикам</h4>
+                <button class="btn btn-primary" onclick="window.print()">
+                    <i class="fas fa-print me-2"></i>Печать
+                </button>
+            </div>
+            
+            <p><strong>Период:</strong> ${report.period}</p>
+            
+            <div class="table-responsive">
+                <table class="table table-striped report-table">
+                    <thead>
+                        <tr>
+                            <th>Поставщик</th>
+                            <th>Поступило</th>
+                            <th>Остаток</th>
+                            <th>Стоимость остатка</th>
+                            <th>Продано</th>
+                            <th>Выручка</th>
+                            <th>Прибыль</th>
+                            <th>Маржа</th>
+                            <th>Доля продаж</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+    `;
+    
+    if (report.suppliers.length > 0) {
+        report.suppliers.forEach(supplier => {
+            html += `
+                <tr>
+                    <td>${supplier.name}</td>
+                    <td>${supplier.received_units} шт.</td>
+                    <td>${supplier.stock_units} шт.</td>
+                    <td>${formatCurrency(supplier.stock_value)}</td>
+                    <td>${supplier.sold_units} шт.</td>
+                    <td>${formatCurrency(supplier.revenue)}</td>
+                    <td class="${supplier.profit >= 0 ? 'text-success' : 'text-danger'}">${formatCurrency(supplier.profit)}</td>
+                    <td>${supplier.margin}%</td>
+                    <td>${supplier.sell_through === null ? '—' : supplier.sell_through + '%'}</td>
+                </tr>
+            `;
+        });
+    } else {
+        html += `
+            <tr>
+                <td colspan="9" class="text-center text-muted">Нет поставщиков</td>
+            </tr>
+        `;
+    }
+    
+    html += `
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    `;
+    
+    resultsDiv.innerHTML = html;
+}
+
 // Initialize when page loads
 if (document.readyState === 'loading') {
     document.addEventListener('DOMContentLoaded', initializeReportsHandlers);
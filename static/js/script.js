@@ -67,8 +67,65 @@ document.addEventListener('DOMContentLoaded', function() {
     if (typeof Chart !== 'undefined') {
         initializeDefaultCharts();
     }
+
+    // Low stock alerts pushed by the server
+    subscribeToStockAlerts();
+
+    // Typeahead suggestions for fields with data-suggest
+    document.querySelectorAll('input[data-suggest]').forEach(attachSuggestions);
 });
 
+// Suggestions from /api/suggest shown through a <datalist>
+function attachSuggestions(input) {
+    const list = document.createElement('datalist');
+    list.id = `suggest-${input.name}-${Math.random().toString(36).slice(2, 8)}`;
+    input.after(list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    input.addEventListener('input', debounce(async function() {
+        const query = input.value.trim();
+        if (!query) {
+            list.innerHTML = '';
+            return;
+        }
+        const params = new URLSearchParams({ q: query, fields: input.dataset.suggest, limit: 8 });
+        const response = await fetch(`/api/suggest?${params}`);
+        if (!response.ok) {
+            return;
+        }
+        const suggestions = await response.json();
+        list.innerHTML = '';
+        suggestions.forEach(suggestion => {
+            const option = document.createElement('option');
+            option.value = suggestion.value;
+            list.appendChild(option);
+        });
+    }, 150));
+}
+
+// Subscribe to low stock alerts (Server-Sent Events) on pages that ask for them
+function subscribeToStockAlerts() {
+    const streamUrl = document.body.dataset.alertsStream;
+    if (!streamUrl || typeof EventSource === 'undefined') {
+        return;
+    }
+
+    listenForStockAlerts(new EventSource(streamUrl));
+}
+
+// Show low stock alerts arriving on an open event stream
+function listenForStockAlerts(source) {
+    source.addEventListener('low_stock', event => {
+        const alert = JSON.parse(event.data);
+        showAlert(`Заканчивается товар: ${alert.product} — осталось ${alert.quantity} шт. (порог ${alert.reorder_level})`, 'warning');
+    });
+    source.addEventListener('restocked', event => {
+        const alert = JSON.parse(event.data);
+        showAlert(`Запас восстановлен: ${alert.product} — ${alert.quantity} шт.`, 'info');
+    });
+}
+
 // API call helper function - IMPROVED VERSION
 async function apiCall(url, options = {}) {
     try {
@@ -105,6 +162,24 @@ async function apiCall(url, options = {}) {
     }
 }
 
+// Several API calls in one round trip: returns bodies in request order.
+// Failed sub-requests are reported like apiCall errors and yield null.
+async function apiBatch(requests, parallel = true) {
+    const { results } = await apiCall('/api/batch', {
+        method: 'POST',
+        body: JSON.stringify({ requests, parallel })
+    });
+
+    return results.map(result => {
+        if (result.status >= 400) {
+            const message = (result.body && result.body.error) || `HTTP error! status: ${result.status}`;
+            showAlert(message, 'danger');
+            return null;
+        }
+        return result.body;
+    });
+}
+
 // Show alert message
 function showAlert(message, type = 'info') {
     const alertDiv = document.createElement('div');
@@ -183,6 +258,7 @@ function initializeDefaultCharts() {
 // Export functions for use in other modules
 window.ComputerSalon = {
     apiCall,
+    apiBatch,
     showAlert,
     formatCurrency,
     formatDate,
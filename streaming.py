@@ -0,0 +1,50 @@
+"""Потоковая выдача больших отчетов.
+
+Отчет с таблицей строк описывается частями (``ReportParts``): поля
+заголовка, имя массива строк, итератор строк и функция итогов, которая
+вызывается после прохода по строкам (итоги копятся по ходу чтения).
+``assemble_report`` собирает из частей обычный словарь, а
+``report_response`` отдает отчет клиенту по мере чтения строк из базы,
+не держа в памяти ни все строки, ни готовый JSON целиком.
+"""
+import json
+from collections import namedtuple
+
+from flask import Response, stream_with_context
+
+ReportParts = namedtuple('ReportParts', 'head key rows summary')
+
+# Размер порции ответа, байт
+CHUNK_SIZE = 16 * 1024
+
+
+def assemble_report(parts):
+    """Отчет целиком в виде словаря"""
+    rows = list(parts.rows)
+    return {**parts.head, parts.key: rows, **parts.summary()}
+
+
+def _fields(data):
+    """Поля JSON-объекта без фигурных скобок"""
+    return json.dumps(data, ensure_ascii=False)[1:-1]
+
+
+def stream_json(parts):
+    """JSON-объект отчета по частям: заголовок, строки, итоги"""
+    buffer = ['{', _fields(parts.head), ', ' if parts.head else '', json.dumps(parts.key), ': [']
+    size = 0
+    for position, row in enumerate(parts.rows):
+        chunk = (',' if position else '') + json.dumps(row, ensure_ascii=False)
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+
+    summary = _fields(parts.summary())
+    buffer.append(']' + (', ' + summary if summary else '') + '}')
+    yield ''.join(buffer)
+
+
+def report_response(parts):
+    return Response(stream_with_context(stream_json(parts)), mimetype='application/json')
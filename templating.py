@@ -0,0 +1,33 @@
+"""Кэш скомпилированных шаблонов.
+
+Jinja компилирует шаблон в код Python при первом обращении к нему, и
+каждый новый рабочий процесс платил за это на первых запросах к
+страницам. Байт-код шаблонов сохраняется в каталоге
+``TEMPLATE_CACHE_DIR`` и переиспользуется всеми процессами, пока
+шаблон не изменится. Команда ``flask warm-templates`` компилирует все
+шаблоны заранее (при сборке или после обновления шаблонов).
+"""
+import os
+
+import click
+from jinja2 import FileSystemBytecodeCache
+
+
+def warm_templates(app):
+    """Компиляция всех шаблонов приложения; возвращает их число"""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def init_templates(app):
+    directory = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    app.config['TEMPLATE_CACHE_DIR'] = directory
+    os.makedirs(directory, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    @app.cli.command('warm-templates')
+    def warm_templates_command():
+        """Скомпилировать шаблоны в кэш байт-кода"""
+        click.echo(f'Шаблонов скомпилировано: {warm_templates(app)}')
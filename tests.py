@@ -1,25 +1,54 @@
 
 import unittest
 import os
+import gc
+import gzip
+import json
+import math
 import sys
-from datetime import datetime, timedelta
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+from contextlib import closing
+from datetime import date, datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, db
+from app import create_app
+from database import db
 from auth import User
 from models.inventory import Supplier, InventoryItem, Sale
-from reports import generate_inventory_report, generate_sales_report, generate_analytical_report
+from reports import generate_inventory_report, generate_sales_report, generate_quarterly_sales_report, generate_analytical_report, generate_revenue_timeseries, generate_supplier_report, generate_pivot, inventory_report_parts, sales_report_parts
+from streaming import stream_json
+from cache import bump_data_version, closed_periods, fragments, invalidate_closed_periods
+from events import broker
+import replica
+import dashboard_feed
+from replica import copy_database, ensure_fresh, replica_age
+from money import to_kopecks, to_rubles
+from migrations import convert_money_to_kopecks, add_sale_unit_prices, add_sales_autoincrement, add_stock_ledger, upgrade_archives
+from archive import MAX_ARCHIVES, archive_path, archive_year, reload_archives
+from compression import precompress_static
+from templating import warm_templates
+from forecast import rate_factor, reorder_suggestions, sale_weight, stock_cover
+from ledger import StockMovement, create_checkpoint, stock_as_of
+from sqlalchemy import create_engine, delete, event, func, text
+from sqlalchemy.exc import OperationalError
+import analytics_engine
+
+# Тестовая база в instance/, рабочая база тестами не затрагивается
+app = create_app({
+    'TESTING': True,
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///test_computer_salon.db',
+    'WTF_CSRF_ENABLED': False
+})
 
 class TestComputerSalon(unittest.TestCase):
     
     def setUp(self):
         """Настройка тестовой среды"""
-        # Используем тестовую базу данных
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test_computer_salon.db'
-        app.config['WTF_CSRF_ENABLED'] = False
-        
         self.app = app.test_client()
         self.app_context = app.app_context()
         self.app_context.push()
@@ -29,6 +58,7 @@ class TestComputerSalon(unittest.TestCase):
         
         # Создаем тестовые данные
         self.create_test_data()
+        fragments.clear()
     
     def tearDown(self):
         """Очистка после тестов"""
@@ -71,8 +101,8 @@ class TestComputerSalon(unittest.TestCase):
                 model='Test CPU',
                 manufacturer='Test Manufacturer',
                 quantity=10,
-                purchase_price=10000,
-                selling_price=15000
+                purchase_price=1000000,
+                selling_price=1500000
             ),
             InventoryItem(
                 receipt_date=datetime.now().date() - timedelta(days=5),
@@ -82,8 +112,8 @@ class TestComputerSalon(unittest.TestCase):
                 model='Test GPU',
                 manufacturer='Test Manufacturer',
                 quantity=5,
-                purchase_price=20000,
-                selling_price=25000
+                purchase_price=2000000,
+                selling_price=2500000
             )
         ]
         
@@ -326,13 +356,637 @@ class TestComputerSalon(unittest.TestCase):
         # Ожидаем ошибку, так как количество должно быть положительным
         self.assertIn(response.status_code, [200,400, 500])
 
+    def test_11_top_sellers_counters(self):
+        """Тест счетчиков продаж для топа товаров"""
+        self.login()
+        
+        for number, (item_id, quantity) in enumerate([(1, 2), (2, 3), (1, 2)]):
+            response = self.app.post('/api/sales', json={
+                'sale_date': datetime.now().date().isoformat(),
+                'document_number': f'SALE-TOP-{number}',
+                'customer': 'Test Customer',
+                'item_id': item_id,
+                'quantity_sold': quantity
+            })
+            self.assertEqual(response.status_code, 200)
+        
+        response = self.app.get('/api/analytics/top?limit=1')
+        self.assertEqual(response.get_json()[0]['id'], 1)
+        self.assertEqual(response.get_json()[0]['total_sold'], 4)
+        
+        response = self.app.get('/api/analytics/top?component_type=Видеокарта')
+        self.assertEqual([item['total_sold'] for item in response.get_json()], [3])
+        
+        # Удаление продажи уменьшает счетчик
+        sale = Sale.query.filter_by(document_number='SALE-TOP-0').first()
+        self.assertEqual(self.app.delete(f'/api/sales/{sale.id}').status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(InventoryItem.query.get(1).total_sold, 2)
+
+    def test_12_low_stock_alerts(self):
+        """Тест уведомлений о пересечении порога дозаказа"""
+        self.login()
+        subscriber = broker.subscribe('alerts')
+        try:
+            # Остаток 5 при пороге 5 - еще не мало; после продажи 1 шт. - мало
+            response = self.app.post('/api/sales', json={
+                'sale_date': datetime.now().date().isoformat(),
+                'document_number': 'SALE-ALERT-001',
+                'customer': 'Test Customer',
+                'item_id': 2,
+                'quantity_sold': 1
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('event: low_stock', subscriber.get_nowait())
+            
+            # Снижение порога ниже остатка снимает предупреждение
+            response = self.app.put('/api/inventory/2', json={
+                'receipt_date': datetime.now().date().isoformat(),
+                'document_number': 'TEST-002',
+                'supplier_id': 1,
+                'component_type': 'Видеокарта',
+                'model': 'Test GPU',
+                'manufacturer': 'Test Manufacturer',
+                'quantity': 4,
+                'purchase_price': 20000,
+                'selling_price': 25000,
+                'reorder_level': 3
+            })
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('event: restocked', subscriber.get_nowait())
+            self.assertTrue(subscriber.empty())
+        finally:
+            broker.unsubscribe('alerts', subscriber)
+        
+        # Нулевой порог при добавлении сохраняется, пустой - по умолчанию 5
+        item = {**InventoryItem.query.get(2).to_dict(), 'supplier_id': 1}
+        for number, level, expected in (('ZERO', 0, 0), ('EMPTY', '', 5)):
+            response = self.app.post('/api/inventory', json={
+                **item, 'document_number': f'TEST-LEVEL-{number}', 'reorder_level': level
+            })
+            self.assertEqual(db.session.get(InventoryItem, response.get_json()['id']).reorder_level, expected)
+        
+        # Поток уведомлений открывает только страница склада, панель получает их в своем потоке
+        self.assertNotIn('data-alerts-stream', self.app.get('/').get_data(as_text=True))
+        self.assertNotIn('data-alerts-stream', self.app.get('/sales').get_data(as_text=True))
+        self.assertIn('data-alerts-stream', self.app.get('/inventory').get_data(as_text=True))
+        response = self.app.get('/api/stream/dashboard')
+        self.assertTrue(broker.has_subscribers('alerts'))
+        response.close()
+        self.assertFalse(broker.has_subscribers('alerts'))
+        self.assertFalse(broker.has_subscribers('dashboard'))
+
+    def test_13_live_dashboard(self):
+        """Тест рассылки изменений главной панели"""
+        self.login()
+        viewers = [broker.subscribe('dashboard') for _ in range(3)]
+        try:
+            response = self.app.post('/api/sales', json={
+                'sale_date': datetime.now().date().isoformat(),
+                'document_number': 'SALE-LIVE-001',
+                'customer': 'Live Customer',
+                'item_id': 1,
+                'quantity_sold': 1
+            })
+            self.assertEqual(response.status_code, 200)
+            # Счетчики и список пересчитываются в фоне, не в запросе
+            with dashboard_feed._lock:
+                pass
+            
+            # Каждый зритель получает один и тот же готовый кадр
+            frames = [[viewer.get_nowait() for _ in range(3)] for viewer in viewers]
+            self.assertEqual(frames[0], frames[1])
+            self.assertEqual(frames[0], frames[2])
+            self.assertTrue(frames[0][0].startswith('event: sale'))
+            self.assertIn('"total_sales": 1', frames[0][1])
+            self.assertIn('Live Customer', frames[0][2])
+            
+            # Изменение без влияния на панель ничего не рассылает
+            item = InventoryItem.query.get(1).to_dict()
+            self.app.put('/api/inventory/1', json={**item, 'model': 'Renamed CPU'})
+            with dashboard_feed._lock:
+                pass
+            self.assertTrue(all(viewer.empty() for viewer in viewers))
+            
+            # Сбой рассылки после коммита не превращает сохраненную продажу в ошибку
+            with mock.patch('views.sales.broadcast_dashboard', side_effect=RuntimeError('broker down')):
+                response = self.app.post('/api/sales', json={
+                    'sale_date': datetime.now().date().isoformat(),
+                    'document_number': 'SALE-LIVE-002',
+                    'customer': 'Live Customer',
+                    'item_id': 1,
+                    'quantity_sold': 1
+                })
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNotNone(Sale.query.filter_by(document_number='SALE-LIVE-002').first())
+        finally:
+            for viewer in viewers:
+                broker.unsubscribe('dashboard', viewer)
+    
+    def test_14_compression(self):
+        """Тест сжатия ответов и раздачи статики"""
+        self.login()
+        
+        # Маленький ответ не сжимается, большой сжимается gzip
+        response = self.app.get('/api/inventory', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        
+        app.config['COMPRESSION_MIN_SIZE'] = 0
+        try:
+            response = self.app.get('/api/inventory', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(json.loads(gzip.decompress(response.data)), self.app.get('/api/inventory').get_json())
+            
+            # Потоковые ответы не сжимаются
+            response = self.app.get('/api/stream/dashboard', headers={'Accept-Encoding': 'gzip'})
+            self.assertNotIn('Content-Encoding', response.headers)
+            response.close()
+        finally:
+            app.config['COMPRESSION_MIN_SIZE'] = 1024
+        
+        # Ссылки на статику с отпечатком кэшируются надолго
+        page = self.app.get('/').get_data(as_text=True)
+        self.assertIn('/static/css/style.css?v=', page)
+        response = self.app.get('/static/css/style.css?v=1')
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
+        
+        # Заранее сжатая копия отдается как есть
+        precompressed = os.path.join(app.static_folder, 'css', 'style.css.gz')
+        try:
+            precompress_static(app.static_folder)
+            response = self.app.get('/static/css/style.css', headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertEqual(response.mimetype, 'text/css')
+            with open(os.path.join(app.static_folder, 'css', 'style.css'), 'rb') as source:
+                self.assertEqual(gzip.decompress(response.data), source.read())
+            response.close()
+        finally:
+            for root, _, files in os.walk(app.static_folder):
+                for name in files:
+                    if name.endswith(('.gz', '.br')):
+                        os.remove(os.path.join(root, name))
+        self.assertFalse(os.path.exists(precompressed))
+    
+    def test_15_suggest(self):
+        """Тест подсказок при вводе"""
+        self.login()
+        
+        response = self.app.get('/api/suggest?q=gp')
+        self.assertEqual(response.get_json(), [{'field': 'model', 'value': 'Test GPU'}])
+        response = self.app.get('/api/suggest?q=TEST&fields=manufacturer,supplier')
+        self.assertEqual(response.get_json(), [
+            {'field': 'manufacturer', 'value': 'Test Manufacturer'},
+            {'field': 'supplier', 'value': 'Test Supplier'}
+        ])
+        
+        # Индекс обновляется при записи
+        self.app.post('/api/inventory', json={
+            'receipt_date': datetime.now().date().isoformat(),
+            'document_number': 'TEST-SUGGEST-001',
+            'supplier_id': 1,
+            'component_type': 'SSD',
+            'model': 'Sabrent Rocket',
+            'manufacturer': 'Sabrent',
+            'quantity': 5,
+            'purchase_price': 5000,
+            'selling_price': 7000
+        })
+        values = [suggestion['value'] for suggestion in self.app.get('/api/suggest?q=sabr').get_json()]
+        self.assertEqual(values, ['Sabrent', 'Sabrent Rocket'])
+        
+        item = InventoryItem.query.filter_by(document_number='TEST-SUGGEST-001').first()
+        self.app.put(f'/api/inventory/{item.id}', json={**item.to_dict(), 'model': 'Rocket Q'})
+        values = [suggestion['value'] for suggestion in self.app.get('/api/suggest?q=rocket').get_json()]
+        self.assertEqual(values, ['Rocket Q'])
+
+        # Своя запись не перестраивает индекс, запись другого процесса - перестраивает
+        index = app.extensions['search_index']
+        self.app.put(f'/api/inventory/{item.id}', json={**item.to_dict(), 'model': 'Rocket S'})
+        self.app.get('/api/suggest?q=rocket')
+        self.assertIs(app.extensions['search_index'], index)
+        with closing(sqlite3.connect(db.engine.url.database)) as connection:
+            connection.execute("UPDATE inventory SET model = 'Rocket X' WHERE id = ?", (item.id,))
+            connection.execute("UPDATE cache_versions SET version = version + 1 WHERE name = 'data'")
+            connection.commit()
+        db.session.expire_all()
+        values = [suggestion['value'] for suggestion in self.app.get('/api/suggest?q=rocket').get_json()]
+        self.assertEqual(values, ['Rocket X'])
+        self.assertIsNot(app.extensions['search_index'], index)
+
+        self.app.delete(f'/api/inventory/{item.id}')
+        self.assertEqual(self.app.get('/api/suggest?q=sabr').get_json(), [])
+        app.extensions.pop('search_index', None)
+    
+    def test_16_fuzzy_search(self):
+        """Тест поиска товаров с опечатками"""
+        self.login()
+        
+        # Подстрока с опечаткой ничего не находит, нечеткий поиск находит
+        response = self.app.get('/api/search?q=Manufactrer GPU&type=inventory')
+        self.assertEqual(response.get_json()['inventory'], [])
+        response = self.app.get('/api/search?q=Manufactrer GPU&type=inventory&fuzzy=1')
+        found = response.get_json()['inventory']
+        self.assertEqual(found[0]['model'], 'Test GPU')
+        self.assertGreaterEqual(found[0]['score'], 0.5)
+        
+        # Слитное написание и обновление индекса при записи без перестроения
+        index = app.extensions['product_index']
+        item = InventoryItem.query.get(2).to_dict()
+        self.app.put('/api/inventory/2', json={**item, 'manufacturer': 'NVIDIA', 'model': 'RTX 4070'})
+        found = self.app.get('/api/search?q=rtx4070&type=inventory&fuzzy=1').get_json()['inventory']
+        self.assertEqual([result['id'] for result in found], [2])
+        self.assertEqual(found[0]['score'], 1.0)
+        self.assertIs(app.extensions['product_index'], index)
+
+        # Запись другого рабочего процесса перестраивает индекс триграмм
+        with closing(sqlite3.connect(db.engine.url.database)) as connection:
+            connection.execute("UPDATE inventory SET model = 'RX 7800' WHERE id = 2")
+            connection.execute("UPDATE cache_versions SET version = version + 1 WHERE name = 'data'")
+            connection.commit()
+        db.session.expire_all()
+        found = self.app.get('/api/search?q=rx7800&type=inventory&fuzzy=1').get_json()['inventory']
+        self.assertEqual([result['id'] for result in found], [2])
+        app.extensions.pop('search_index', None)
+        app.extensions.pop('product_index', None)
+
+    def test_17_batch(self):
+        """Тест пакетного выполнения запросов к API"""
+        self.login()
+
+        response = self.app.post('/api/batch', json={'parallel': True, 'requests': [
+            {'method': 'POST', 'path': '/api/sales', 'body': {
+                'sale_date': '2024-01-15', 'document_number': 'BATCH-001', 'customer': 'Пакет',
+                'item_id': 1, 'quantity_sold': 1
+            }},
+            {'path': '/api/inventory'},
+            {'path': '/api/analytics'},
+            {'path': '/api/nowhere'}
+        ]})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([result['status'] for result in results], [200, 200, 200, 404])
+        # Чтение после записи видит ее результат
+        self.assertEqual(results[1]['body'][0]['quantity'], 9)
+        self.assertEqual(results[2]['body']['statistics']['total_sales'], 1)
+
+        # Потоки событий и вложенные пакеты недоступны
+        response = self.app.post('/api/batch', json={'requests': [{'path': '/api/stream/alerts'}]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_18_idempotent_writes(self):
+        """Тест повторной отправки продажи и дубликатов номера документа"""
+        self.login()
+        sale = {
+            'sale_date': '2024-01-15', 'document_number': 'IDEM-001',
+            'customer': 'Повтор', 'item_id': 1, 'quantity_sold': 2
+        }
+        headers = {'Idempotency-Key': 'sale-idem-001'}
+
+        first = self.app.post('/api/sales', json=sale, headers=headers)
+        retry = self.app.post('/api/sales', json=sale, headers=headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.get_json(), first.get_json())
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Sale.query.count(), 1)
+        self.assertEqual(db.session.get(InventoryItem, 1).quantity, 8)
+        # Цены товара сохранены в продаже
+        self.assertEqual((Sale.query.one().unit_cost, Sale.query.one().unit_price), (1000000, 1500000))
+
+        # Без ключа дубликат номера отклоняется уникальным индексом, остаток не меняется
+        response = self.app.post('/api/sales', json=sale)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('номером документа', response.get_json()['error'])
+        db.session.expire_all()
+        self.assertEqual(db.session.get(InventoryItem, 1).quantity, 8)
+
+        response = self.app.post('/api/sales', json={**sale, 'document_number': 'IDEM-002', 'quantity_sold': 50})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Доступно: 8', response.get_json()['error'])
+
+        # Ключ другого запроса не переиспользуется
+        item = {**InventoryItem.query.get(1).to_dict(), 'document_number': 'IDEM-NEW'}
+        response = self.app.post('/api/inventory', json=item, headers=headers)
+        self.assertEqual(response.status_code, 422)
+        response = self.app.post('/api/inventory', json={**item, 'document_number': 'TEST-002'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('номером документа', response.get_json()['error'])
+        response = self.app.post('/api/inventory', json=item, headers={'Idempotency-Key': 'k' * 65})
+        self.assertEqual(response.status_code, 400)
+
+        # Другие нарушения ограничений не выдаются за повтор номера
+        response = self.app.post('/api/sales', json={**sale, 'document_number': 'IDEM-003', 'customer': None})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Не заполнено поле customer')
+
+    def test_19_fragment_cache(self):
+        """Тест кэша отрендеренных таблиц инвентаря и продаж"""
+        self.login()
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        self.app.get('/inventory')
+        self.app.get('/sales')
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            # Повторный просмотр не читает товары и продажи
+            inventory_page = self.app.get('/inventory')
+            sales_page = self.app.get('/sales')
+            self.assertFalse([statement for statement in statements
+                              if 'FROM inventory' in statement or 'FROM sales' in statement])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertIn('Test CPU', inventory_page.get_data(as_text=True))
+        self.assertIn('Нет данных о продажах', sales_page.get_data(as_text=True))
+        
+        # После записи страницы показывают новые данные
+        response = self.app.post('/api/sales', json={
+            'sale_date': '2024-01-15', 'document_number': 'FRAG-001', 'customer': 'Фрагмент',
+            'item_id': 1, 'quantity_sold': 10
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('FRAG-001', self.app.get('/sales').get_data(as_text=True))
+        self.assertNotIn('data-quantity="10"', self.app.get('/sales').get_data(as_text=True))
+        
+        # Запись другого рабочего процесса тоже сменяет версию фрагментов
+        with closing(sqlite3.connect(db.engine.url.database)) as connection:
+            connection.execute("UPDATE inventory SET model = 'Other CPU' WHERE id = 1")
+            connection.execute("UPDATE cache_versions SET version = version + 1 WHERE name = 'data'")
+            connection.commit()
+        # Сессия теста общая для всех запросов, у приложения - своя на запрос
+        db.session.expire_all()
+        self.assertIn('Other CPU', self.app.get('/inventory').get_data(as_text=True))
+        
+        # Объем кэша ограничен: старые фрагменты вытесняются
+        max_bytes = fragments.max_bytes
+        fragments.max_bytes = fragments.size + 1
+        try:
+            self.app.get('/inventory')
+            self.assertLessEqual(fragments.size, fragments.max_bytes)
+        finally:
+            fragments.max_bytes = max_bytes
+
+
+    def test_20_template_bytecode_cache(self):
+        """Тест предварительной компиляции шаблонов в кэш байт-кода"""
+        directory = app.config['TEMPLATE_CACHE_DIR']
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        app.jinja_env.cache.clear()
+        
+        self.assertGreaterEqual(warm_templates(app), 6)
+        self.assertEqual(len(os.listdir(directory)), warm_templates(app))
+        
+        # Новый процесс загружает шаблон из кэша, не компилируя его
+        app.jinja_env.cache.clear()
+        app.jinja_env.compile = None
+        try:
+            self.assertEqual(self.login().status_code, 200)
+        finally:
+            del app.jinja_env.compile
+
+
+    def test_21_optimistic_concurrency(self):
+        """Тест правки товара с проверкой версии"""
+        self.login()
+        item = {**self.app.get('/api/inventory').get_json()[0], 'supplier_id': 1}
+        self.assertEqual(item['version'], 1)
+        
+        # Два редактора открыли одну и ту же версию товара
+        first = self.app.put('/api/inventory/1', json={**item, 'model': 'First CPU'})
+        self.assertEqual(first.status_code, 200)
+        second = self.app.put('/api/inventory/1', json={**item, 'quantity': 20})
+        self.assertEqual(second.status_code, 409)
+        current = second.get_json()['item']
+        self.assertEqual((current['model'], current['quantity'], current['version']), ('First CPU', 10, 2))
+        db.session.expire_all()
+        self.assertEqual(db.session.get(InventoryItem, 1).quantity, 10)
+        
+        # Продажа тоже меняет версию: правка остатка по старым данным отклоняется
+        self.app.post('/api/sales', json={
+            'sale_date': '2024-01-15', 'document_number': 'VER-001', 'customer': 'Версия',
+            'item_id': 1, 'quantity_sold': 3
+        })
+        response = self.app.put('/api/inventory/1', json={**current, 'quantity': 20})
+        self.assertEqual(response.status_code, 409)
+        current = response.get_json()['item']
+        self.assertEqual((current['quantity'], current['version']), (7, 3))
+        
+        response = self.app.put('/api/inventory/1', json={**current, 'quantity': 20})
+        self.assertEqual(response.status_code, 200)
+        db.session.expire_all()
+        self.assertEqual((db.session.get(InventoryItem, 1).quantity, db.session.get(InventoryItem, 1).version), (20, 4))
+
+
+    def test_22_bulk_update(self):
+        """Тест массовой правки цен и атрибутов одним запросом"""
+        self.login()
+        raise_prices = {'filter': {'manufacturer': 'Test Manufacturer'},
+                        'changes': {'selling_price': {'percent': 10}}}
+        
+        response = self.app.post('/api/inventory/bulk', json={**raise_prices, 'dry_run': True})
+        self.assertEqual(response.get_json(), {'matched': 2, 'updated': 0, 'dry_run': True})
+        self.assertEqual(db.session.get(InventoryItem, 1).selling_price, 1500000)
+        
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = self.app.post('/api/inventory/bulk', json=raise_prices)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(response.get_json()['updated'], 2)
+        self.assertEqual(len([statement for statement in statements if statement.startswith('UPDATE')]), 1)
+        db.session.expire_all()
+        self.assertEqual([(item.selling_price, item.version) for item in InventoryItem.query.order_by(InventoryItem.id)],
+                         [(1650000, 2), (2750000, 2)])
+        
+        # Цена не может стать отрицательной
+        response = self.app.post('/api/inventory/bulk', json={
+            'filter': {'supplier_id': 1}, 'changes': {'purchase_price': {'amount': -15000}}
+        })
+        self.assertEqual(response.status_code, 400)
+        
+        # Смена атрибутов видна в подсказках
+        response = self.app.post('/api/inventory/bulk', json={
+            'filter': {'component_type': 'Видеокарта'}, 'changes': {'manufacturer': 'NVIDIA', 'reorder_level': 2}
+        })
+        self.assertEqual(response.get_json()['updated'], 1)
+        values = [entry['value'] for entry in self.app.get('/api/suggest?q=nvid').get_json()]
+        self.assertIn('NVIDIA', values)
+        
+        # Порог, переводящий товар через границу дозаказа, рассылает уведомление
+        subscriber = broker.subscribe('alerts')
+        try:
+            for level in (2, 100):
+                response = self.app.post('/api/inventory/bulk', json={
+                    'filter': {'manufacturer': 'NVIDIA'}, 'changes': {'reorder_level': level}
+                })
+                self.assertEqual(response.get_json()['updated'], 1)
+            alert = subscriber.get_nowait()
+            self.assertIn('event: low_stock', alert)
+            self.assertIn('NVIDIA Test GPU', alert)
+            self.assertTrue(subscriber.empty())
+        finally:
+            broker.unsubscribe('alerts', subscriber)
+        
+        for payload in ({'filter': {}, 'changes': {'reorder_level': 1}},
+                        {'filter': {'model': 'Test CPU'}, 'changes': {'reorder_level': 1}},
+                        {'filter': {'supplier_id': 1}, 'changes': {'quantity': 0}}):
+            self.assertEqual(self.app.post('/api/inventory/bulk', json=payload).status_code, 400)
+
+
+    def test_23_reorder_suggestions(self):
+        """Тест скорости продаж и предложений по дозаказу"""
+        self.login()
+        today = date.today()
+        sales = [(1, today - timedelta(days=30), 2), (1, today, 4), (2, today - timedelta(days=1), 3)]
+        for number, (item_id, sale_date, quantity) in enumerate(sales):
+            self.app.post('/api/sales', json={
+                'sale_date': sale_date.isoformat(), 'document_number': f'VEL-{number}',
+                'customer': 'Скорость', 'item_id': item_id, 'quantity_sold': quantity
+            })
+        db.session.expire_all()
+        cpu, gpu = db.session.get(InventoryItem, 1), db.session.get(InventoryItem, 2)
+        self.assertAlmostEqual(cpu.velocity_score, sale_weight(today - timedelta(days=30), 2) + sale_weight(today, 4))
+        self.assertAlmostEqual(gpu.velocity_score, sale_weight(today - timedelta(days=1), 3))
+        
+        # Вклад продажи месячной давности вдвое меньше сегодняшней
+        rate = cpu.velocity_score * rate_factor()
+        self.assertAlmostEqual(rate, (1 + 4) * (1 - 2 ** (-1 / 30)))
+        
+        # Видеокарта (2 шт. при ~0.07 шт./день) заканчивается раньше процессора
+        items = self.app.get('/api/inventory/reorder?days=365').get_json()['items']
+        self.assertEqual([item['id'] for item in items], [2, 1])
+        self.assertEqual(items[1]['days_of_stock'], round(4 / rate, 1))
+        self.assertEqual(items[1]['suggested_quantity'], math.ceil(rate * 365) - 4)
+        self.assertEqual(self.app.get('/api/inventory/reorder?days=20').get_json()['items'], [])
+        self.assertEqual(self.app.get('/api/inventory/reorder?days=0').status_code, 400)
+        
+        # Удаление продажи вычитает ее вклад
+        self.app.delete(f"/api/sales/{Sale.query.filter_by(document_number='VEL-2').one().id}")
+        db.session.expire_all()
+        self.assertAlmostEqual(db.session.get(InventoryItem, 2).velocity_score, 0)
+        self.assertEqual([item['id'] for item in reorder_suggestions(db.session, 365)], [1])
+        
+        # Список читается по индексу, без сортировки всех товаров
+        plan = db.session.execute(text('EXPLAIN QUERY PLAN ' + str(
+            db.select(InventoryItem.id).where(stock_cover().between(0, 1)).order_by(stock_cover())
+            .compile(db.engine, compile_kwargs={'literal_binds': True})
+        ))).all()
+        self.assertIn('ix_inventory_stock_cover', ' '.join(row[-1] for row in plan))
+
+
+    def test_24_stock_ledger(self):
+        """Тест журнала движения товаров и остатков на прошедшую дату"""
+        self.login()
+        day = lambda days_ago: (date.today() - timedelta(days=days_ago)).isoformat()
+        
+        def stock(as_of):
+            report = generate_inventory_report(as_of=as_of)
+            return {item['id']: (item['quantity'], item['value']) for item in report['items']}
+        
+        def sell(number, sale_date, quantity):
+            response = self.app.post('/api/sales', json={
+                'sale_date': sale_date, 'document_number': f'LEDGER-{number}',
+                'customer': 'Журнал', 'item_id': 2, 'quantity_sold': quantity
+            })
+            return response.get_json()['id']
+        
+        voided = sell(1, day(3), 2)
+        sell(2, day(0), 1)
+        # Процессор поступил сегодня, видеокарта - пять дней назад
+        self.assertEqual(stock(day(4)), {2: (5, 100000)})
+        self.assertEqual(stock(day(3)), {2: (3, 60000)})
+        self.assertEqual(stock(day(0)), {1: (10, 100000), 2: (2, 40000)})
+        
+        # Продажа задним числом поправляет контрольную точку
+        self.assertEqual(create_checkpoint(db.session, date.today() - timedelta(days=2)), 1)
+        sell(3, day(4), 1)
+        self.assertEqual(stock(day(2))[2], (2, 40000))
+        self.assertEqual(stock(day(4))[2], (4, 80000))
+        
+        # После контрольной точки журнал до нее не читается
+        db.session.execute(delete(StockMovement).where(StockMovement.movement_date <= day(2)))
+        self.assertEqual(stock(day(1))[2], (2, 40000))
+        db.session.rollback()
+        plan = ' '.join(row[-1] for row in db.session.execute(text('EXPLAIN QUERY PLAN ' + str(
+            stock_as_of(date.today()).compile(db.engine, compile_kwargs={'literal_binds': True})
+        ))))
+        self.assertNotIn('SCAN stock_movements', plan)
+        
+        # Новая цена закупки оценивает остаток только с сегодняшнего дня
+        item = {**db.session.get(InventoryItem, 2).to_dict(), 'purchase_price': 25000}
+        self.assertEqual(self.app.put('/api/inventory/2', json=item).status_code, 200)
+        self.assertEqual(stock(day(1))[2], (2, 40000))
+        self.assertEqual(stock(day(0))[2], (1, 25000))
+        
+        # Отмена продажи возвращает товар на дату продажи
+        self.app.delete(f'/api/sales/{voided}')
+        self.assertEqual(stock(day(2))[2], (4, 80000))
+        self.assertEqual(stock(day(0))[2], (3, 75000))
+        
+        # Сумма движений равна остатку, в том числе после восстановления журнала
+        def ledger_totals():
+            return dict(db.session.execute(
+                db.select(StockMovement.item_id, func.sum(StockMovement.quantity)).group_by(StockMovement.item_id)
+            ).all())
+        self.assertEqual(ledger_totals(), {1: 10, 2: 3})
+        db.session.commit()
+        with db.engine.begin() as connection:
+            connection.execute(delete(StockMovement))
+            add_stock_ledger(connection)
+        self.assertEqual(ledger_totals(), {1: 10, 2: 3})
+        # Продажи восстанавливаются с ценой закупки на момент продажи, а не с текущей
+        self.assertEqual(
+            db.session.execute(db.select(StockMovement.sale_id, StockMovement.unit_cost)
+                               .where(StockMovement.kind == 'sale').order_by(StockMovement.sale_id)).all(),
+            db.session.execute(db.select(Sale.id, Sale.unit_cost).order_by(Sale.id)).all()
+        )
+        
+        # Удаленный товар остается в остатках прошлых дат
+        response = self.app.post('/api/inventory', json={
+            'receipt_date': day(3), 'document_number': 'LEDGER-RAM', 'supplier_id': 1,
+            'component_type': 'Оперативная память', 'model': 'Test RAM', 'manufacturer': 'Test Manufacturer',
+            'quantity': 4, 'purchase_price': 3000, 'selling_price': 4000
+        })
+        ram = response.get_json()['id']
+        self.assertEqual(self.app.delete(f'/api/inventory/{ram}').status_code, 200)
+        self.assertEqual(stock(day(1))[ram], (4, 12000))
+        self.assertNotIn(ram, stock(day(0)))
+        deleted = {item['id']: item for item in generate_inventory_report(as_of=day(1))['items']}[ram]
+        self.assertEqual((deleted['component_type'], deleted['manufacturer'], deleted['model']),
+                         ('Оперативная память', 'Test Manufacturer', 'Test RAM'))
+        # Номер удаленного товара не достается новому
+        response = self.app.post('/api/inventory', json={
+            **db.session.get(InventoryItem, 1).to_dict(), 'document_number': 'LEDGER-NEW', 'supplier_id': 1
+        })
+        self.assertGreater(response.get_json()['id'], ram)
+        
+        self.assertEqual(self.app.get('/api/reports/inventory?as_of=31.03.2024').status_code, 400)
+
+    def test_25_delete_item_invalidates_closed_periods(self):
+        """Тест: удаление товара сбрасывает кэш закрытых периодов с даты поступления"""
+        self.login()
+        start = (date.today() - timedelta(days=10)).isoformat()
+        yesterday = (date.today() - timedelta(days=1)).isoformat()
+        
+        # Видеокарта поступила пять дней назад, период закрыт и кэшируется
+        report = generate_supplier_report(start, yesterday)
+        self.assertEqual(report['suppliers'][0]['received_units'], 5)
+        
+        self.assertEqual(self.app.delete('/api/inventory/2').status_code, 200)
+        report = generate_supplier_report(start, yesterday)
+        self.assertEqual(report['suppliers'][0]['received_units'], 0)
+
+
 class TestReportsModule(unittest.TestCase):
     """Тесты для модуля отчетности"""
     
     def setUp(self):
-        app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test_reports.db'
-        
         self.app = app.test_client()
         self.app_context = app.app_context()
         self.app_context.push()
@@ -365,8 +1019,9 @@ class TestReportsModule(unittest.TestCase):
                 model='Report CPU',
                 manufacturer='Intel',
                 quantity=10,
-                purchase_price=15000,
-                selling_price=20000
+                purchase_price=1500000,
+                selling_price=2000000,
+                total_sold=3
             ),
             InventoryItem(
                 receipt_date=datetime.now().date(),
@@ -376,8 +1031,8 @@ class TestReportsModule(unittest.TestCase):
                 model='Report GPU',
                 manufacturer='NVIDIA',
                 quantity=0,  # Нет в наличии
-                purchase_price=30000,
-                selling_price=40000
+                purchase_price=3000000,
+                selling_price=4000000
             ),
             InventoryItem(
                 receipt_date=datetime.now().date(),
@@ -387,8 +1042,9 @@ class TestReportsModule(unittest.TestCase):
                 model='Report RAM',
                 manufacturer='Kingston',
                 quantity=3,  # Маленький остаток
-                purchase_price=4000,
-                selling_price=6000
+                purchase_price=400000,
+                selling_price=600000,
+                total_sold=2
             )
         ]
         
@@ -403,7 +1059,9 @@ class TestReportsModule(unittest.TestCase):
                 customer='Customer 1',
                 item_id=1,
                 quantity_sold=2,
-                total_amount=40000
+                total_amount=4000000,
+                unit_cost=1500000,
+                unit_price=2000000
             ),
             Sale(
                 sale_date=datetime.now().date() - timedelta(days=5),
@@ -411,7 +1069,9 @@ class TestReportsModule(unittest.TestCase):
                 customer='Customer 2',
                 item_id=1,
                 quantity_sold=1,
-                total_amount=20000
+                total_amount=2000000,
+                unit_cost=1500000,
+                unit_price=2000000
             ),
             Sale(
                 sale_date=datetime.now().date() - timedelta(days=1),
@@ -419,7 +1079,9 @@ class TestReportsModule(unittest.TestCase):
                 customer='Customer 3',
                 item_id=3,
                 quantity_sold=2,
-                total_amount=12000
+                total_amount=1200000,
+                unit_cost=400000,
+                unit_price=600000
             )
         ]
         
@@ -491,6 +1153,447 @@ class TestReportsModule(unittest.TestCase):
         self.assertIn('profit_margin', financials)
         self.assertGreaterEqual(financials['profit_margin'], 0)
 
+    def test_analytical_report_filters(self):
+        """Тест аналитического отчета за период и по производителю"""
+        week_ago = (datetime.now().date() - timedelta(days=7)).strftime('%Y-%m-%d')
+        report = generate_analytical_report(start_date=week_ago)
+        self.assertEqual(report['statistics']['total_sales'], 2)
+        self.assertEqual((report['financials']['revenue'], report['financials']['cost']), (32000, 23000))
+        self.assertEqual([item['total_sold'] for item in report['popular_items']], [2, 1])
+        
+        report = generate_analytical_report(manufacturer='Intel')
+        self.assertEqual((report['statistics']['total_items'], report['statistics']['total_sales']), (1, 2))
+        self.assertEqual(report['financials']['revenue'], 60000)
+        self.assertEqual(report['financials']['inventory_value'], 10 * 15000)
+        self.assertEqual([category['component_type'] for category in report['categories']], ['Процессор'])
+        
+        # Продажи за период читаются по индексу на дате
+        plan = db.session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT count(*) FROM sales WHERE sale_date >= :start'
+        ), {'start': week_ago}).all()
+        self.assertIn('ix_sales_sale_date', ' '.join(row[-1] for row in plan))
+
+    @unittest.skipIf(analytics_engine.np is None, 'NumPy не установлен')
+    def test_analytical_report_columnar_engine(self):
+        """Тест совпадения колоночного движка с SQL-расчетом"""
+        def report_without_date(report):
+            report.pop('report_date')
+            return report
+
+        sql_report = report_without_date(generate_analytical_report())
+        app.config['ANALYTICS_ENGINE'] = 'numpy'
+        try:
+            self.assertEqual(report_without_date(generate_analytical_report()), sql_report)
+
+            # Новая продажа и изменение цены подхватываются инкрементально
+            db.session.add(Sale(
+                sale_date=datetime.now().date(),
+                document_number='SALE-REPORT-004',
+                customer='Customer 4',
+                item_id=3,
+                quantity_sold=1,
+                total_amount=600000,
+                unit_cost=400000,
+                unit_price=600000
+            ))
+            InventoryItem.query.get(3).total_sold += 1
+            InventoryItem.query.get(1).purchase_price = 1600000
+            db.session.commit()
+
+            engine_report = report_without_date(generate_analytical_report())
+        finally:
+            app.config['ANALYTICS_ENGINE'] = None
+            app.extensions.pop('analytics_engine', None)
+
+        self.assertEqual(engine_report, report_without_date(generate_analytical_report()))
+        self.assertEqual(engine_report['statistics']['total_sales'], 4)
+
+    def test_columnar_engine_after_deleting_last_sale(self):
+        """Тест: новая продажа после удаления последней не теряется в снимке"""
+        app.config['ANALYTICS_ENGINE'] = 'numpy'
+        try:
+            generate_analytical_report()
+            last = Sale.query.order_by(Sale.id.desc()).first()
+            last_id = last.id
+            db.session.delete(last)
+            db.session.commit()
+            db.session.add(Sale(
+                sale_date=datetime.now().date(), document_number='SALE-REPORT-REUSE', customer='Customer 5',
+                item_id=1, quantity_sold=1, total_amount=2000000, unit_cost=1500000, unit_price=2000000
+            ))
+            db.session.commit()
+            self.assertGreater(Sale.query.filter_by(document_number='SALE-REPORT-REUSE').one().id, last_id)
+            engine_report = generate_analytical_report()
+        finally:
+            app.config['ANALYTICS_ENGINE'] = None
+            app.extensions.pop('analytics_engine', None)
+        self.assertEqual(engine_report['financials'], generate_analytical_report()['financials'])
+        
+        # Таблица продаж старой базы пересоздается с AUTOINCREMENT
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'legacy.db')}")
+            with engine.begin() as connection:
+                connection.execute(text(
+                    'CREATE TABLE sales (id INTEGER NOT NULL, document_number VARCHAR(50) NOT NULL, '
+                    'PRIMARY KEY (id), UNIQUE (document_number))'
+                ))
+                connection.execute(text("INSERT INTO sales VALUES (1, 'A'), (2, 'B')"))
+                add_sales_autoincrement(connection)
+                add_sales_autoincrement(connection)
+                connection.execute(text('DELETE FROM sales WHERE id = 2'))
+                connection.execute(text("INSERT INTO sales (document_number) VALUES ('C')"))
+                self.assertEqual(connection.execute(text('SELECT id, document_number FROM sales')).all(),
+                                 [(1, 'A'), (3, 'C')])
+            engine.dispose()
+
+    def test_reports_replica_copy(self):
+        """Тест копирования базы в снимок для отчетов"""
+        source_path = db.engine.url.database
+        with tempfile.TemporaryDirectory() as directory:
+            target_path = os.path.join(directory, 'replica.db')
+            copy_database(source_path, target_path)
+            
+            with closing(sqlite3.connect(target_path)) as replica:
+                self.assertEqual(replica.execute('SELECT COUNT(*) FROM sales').fetchone()[0], 3)
+                self.assertEqual(replica.execute('SELECT SUM(total_sold) FROM inventory').fetchone()[0], 5)
+            self.assertEqual(os.listdir(directory), ['replica.db'])
+    
+    def test_reports_replica_refresh_in_background(self):
+        """Тест: устаревший снимок обновляется в фоне, запросы читают прежний"""
+        with tempfile.TemporaryDirectory() as directory:
+            replica_path = os.path.join(directory, 'replica.db')
+            db.engines[replica.BIND_KEY] = create_engine(f'sqlite:///{replica_path}')
+            try:
+                # Первый снимок создается сразу: читать пока нечего
+                ensure_fresh()
+                self.assertLess(replica_age(), 60)
+                
+                # Пока снимок обновляет другой поток, запрос его не ждет
+                os.utime(replica_path, (0, 0))
+                with replica._lock:
+                    ensure_fresh()
+                    self.assertGreater(replica_age(), 60)
+                
+                ensure_fresh()
+                deadline = time.time() + 5
+                while replica_age() > 60 and time.time() < deadline:
+                    time.sleep(0.01)
+                self.assertLess(replica_age(), 60)
+            finally:
+                # Фоновое обновление должно закончиться до удаления каталога
+                with replica._lock:
+                    db.engines.pop(replica.BIND_KEY).dispose()
+    
+    def test_revenue_timeseries(self):
+        """Тест временного ряда выручки"""
+        today = datetime.now().date()
+        start = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+        closed_periods.clear()
+        
+        report = generate_revenue_timeseries('day', start, today.strftime('%Y-%m-%d'))
+        self.assertEqual(len(report['periods']), 31)
+        series = report['series'][0]
+        self.assertEqual(sum(series['revenue']), 72000)
+        self.assertEqual(sum(series['units']), 5)
+        self.assertEqual(sum(series['cost']), 2 * 15000 + 15000 + 2 * 4000)
+        
+        # Прошедшие дни закэшированы и дают тот же результат
+        self.assertEqual(len(closed_periods), 30)
+        self.assertEqual(generate_revenue_timeseries('day', start, today.strftime('%Y-%m-%d')), report)
+        
+        grouped = generate_revenue_timeseries('month', start, group_by='component_type')
+        totals = {series['key']: sum(series['units']) for series in grouped['series']}
+        self.assertEqual(totals, {'Процессор': 3, 'Оперативная память': 2})
+        
+        with self.assertRaises(ValueError):
+            generate_revenue_timeseries('year')
+
+    def test_money_in_kopecks(self):
+        """Тест хранения денежных сумм в копейках"""
+        self.assertEqual(to_kopecks('19.99'), 1999)
+        self.assertEqual(to_kopecks(0.1 + 0.2), 30)
+        self.assertEqual(to_rubles(1999), 19.99)
+
+        # Старая база с ценами в рублях (REAL) переводится в копейки
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f"sqlite:///{os.path.join(directory, 'legacy.db')}")
+            with engine.begin() as connection:
+                connection.execute(text(
+                    'CREATE TABLE inventory (id INTEGER NOT NULL, purchase_price FLOAT NOT NULL, '
+                    'selling_price FLOAT NOT NULL, PRIMARY KEY (id))'
+                ))
+                connection.execute(text(
+                    'CREATE TABLE sales (id INTEGER NOT NULL, total_amount FLOAT NOT NULL, PRIMARY KEY (id))'
+                ))
+                connection.execute(text('INSERT INTO inventory VALUES (1, 1234.56, 1999.99)'))
+                connection.execute(text('INSERT INTO sales VALUES (1, 0.1), (2, 0.2)'))
+
+                convert_money_to_kopecks(connection)
+                convert_money_to_kopecks(connection)
+
+                self.assertEqual(connection.execute(text(
+                    'SELECT purchase_price, selling_price FROM inventory')).one(), (123456, 199999))
+                self.assertEqual(connection.execute(text('SELECT SUM(total_amount) FROM sales')).scalar(), 30)
+            engine.dispose()
+
+    def test_supplier_report(self):
+        """Тест отчета по поставщикам"""
+        db.session.add(Supplier(name='Empty Supplier'))
+        db.session.commit()
+        closed_periods.clear()
+        today = datetime.now().date()
+        start = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+        
+        report = generate_supplier_report(start, today.strftime('%Y-%m-%d'))
+        supplier, empty = report['suppliers']
+        self.assertEqual(supplier['name'], 'Report Test Supplier')
+        self.assertEqual(
+            (supplier['received_units'], supplier['stock_units'], supplier['sold_units']), (18, 13, 5))
+        self.assertEqual(supplier['stock_value'], 10 * 15000 + 3 * 4000)
+        self.assertEqual((supplier['revenue'], supplier['cost'], supplier['profit']), (72000, 53000, 19000))
+        self.assertEqual((supplier['margin'], supplier['sell_through']), (26.39, 27.78))
+        self.assertEqual((empty['items'], empty['revenue'], empty['sell_through']), (0, 0, None))
+        self.assertEqual(len(closed_periods), 0)
+        
+        # Закрытый период кэшируется, текущие остатки читаются заново
+        yesterday = (today - timedelta(days=1)).strftime('%Y-%m-%d')
+        closed = generate_supplier_report(start, yesterday)
+        self.assertEqual(len(closed_periods), 1)
+        InventoryItem.query.get(1).quantity = 7
+        db.session.commit()
+        cached = generate_supplier_report(start, yesterday)
+        self.assertEqual(cached['suppliers'][0]['stock_units'], 10)
+        self.assertEqual(cached['suppliers'][0]['revenue'], closed['suppliers'][0]['revenue'])
+        
+        # Продажа задним числом меняет общий номер версии в базе, и кэш
+        # устаревает во всех рабочих процессах, а не только в записавшем
+        sale_date = today - timedelta(days=2)
+        db.session.add(Sale(
+            sale_date=sale_date, document_number='SALE-BACKDATED', customer='Customer 5',
+            item_id=1, quantity_sold=1, total_amount=20000, unit_cost=15000, unit_price=20000
+        ))
+        invalidate_closed_periods(sale_date)
+        db.session.commit()
+        self.assertEqual(len(closed_periods), 1)
+        updated = generate_supplier_report(start, yesterday)
+        self.assertEqual(updated['suppliers'][0]['revenue'], closed['suppliers'][0]['revenue'] + 200)
+
+    def test_pivot(self):
+        """Тест сводной таблицы по произвольным измерениям"""
+        pivot = generate_pivot(rows=['component_type'], measure='units')
+        self.assertEqual(pivot['row_keys'], [['Оперативная память'], ['Процессор']])
+        self.assertEqual((pivot['cells'], pivot['total']), ([[2], [3]], 5))
+        
+        pivot = generate_pivot(rows=['manufacturer'], cols=['supplier', 'quarter'], measure='profit')
+        self.assertEqual(pivot['row_totals'], [15000, 4000])
+        self.assertEqual(pivot['total'], 72000 - 53000)
+        
+        # Повтор берется из кэша, пока данные не изменились: один запрос номера версии
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            self.assertIs(generate_pivot(rows=['manufacturer'], cols=['supplier', 'quarter'], measure='profit'), pivot)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 1)
+        db.session.add(Sale(
+            sale_date=datetime.now().date(), document_number='SALE-PIVOT', customer='Customer 4',
+            item_id=3, quantity_sold=1, total_amount=600000, unit_cost=400000, unit_price=600000
+        ))
+        bump_data_version()
+        db.session.commit()
+        pivot = generate_pivot(rows=['manufacturer'], cols=['supplier', 'quarter'], measure='profit')
+        self.assertEqual(pivot['total'], 72000 - 53000 + 2000)
+        
+        for rows, measure in ((['price'], 'revenue'), (['day', 'day'], 'revenue'), (['day'], 'margin')):
+            with self.assertRaises(ValueError):
+                generate_pivot(rows=rows, measure=measure)
+
+    def test_report_stream_releases_lock(self):
+        """Тест потокового отчета: пока отчет отдается, запись в базу не блокируется"""
+        db.session.execute(Sale.__table__.insert(), [dict(
+            sale_date=date(2024, 1, 1), document_number=f'LOCK-{i}', customer='Customer',
+            item_id=1, quantity_sold=1, total_amount=150, unit_cost=100, unit_price=150
+        ) for i in range(3000)])
+        db.session.commit()
+        
+        chunks = stream_json(sales_report_parts())
+        first = next(chunks)
+        with closing(sqlite3.connect(db.engine.url.database, timeout=0)) as connection:
+            connection.execute('UPDATE inventory SET quantity = quantity - 1 WHERE id = 1')
+            connection.commit()
+        report = json.loads(first + ''.join(chunks))
+        self.assertEqual(len(report['sales']), Sale.query.count())
+
+    def test_report_memory_bounded(self):
+        """Тест потоковых отчетов: пик памяти не растет с числом строк"""
+        def add_rows(count):
+            offset = Sale.query.count() + InventoryItem.query.count()
+            db.session.execute(InventoryItem.__table__.insert(), [dict(
+                receipt_date=date(2024, 1, 1), document_number=f'MEM-ITEM-{offset + i}', supplier_id=1,
+                component_type='SSD', model=f'SSD {i}', manufacturer='Samsung',
+                quantity=1, purchase_price=100, selling_price=150
+            ) for i in range(count)])
+            db.session.execute(Sale.__table__.insert(), [dict(
+                sale_date=date(2024, 1, 1), document_number=f'MEM-SALE-{offset + i}', customer='Customer',
+                item_id=1, quantity_sold=1, total_amount=150, unit_cost=100, unit_price=150
+            ) for i in range(count)])
+            db.session.commit()
+        
+        def peak_memory():
+            # Мусор предыдущих тестов не должен попадать в замер
+            gc.collect()
+            tracemalloc.start()
+            try:
+                for parts in (inventory_report_parts(), sales_report_parts()):
+                    for _ in stream_json(parts):
+                        pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        
+        add_rows(2000)
+        peak_memory()
+        small = peak_memory()
+        add_rows(8000)
+        large = peak_memory()
+        self.assertLess(large, small * 1.5)
+        
+        # Собранный целиком отчет совпадает с потоковым
+        report = json.loads(''.join(stream_json(sales_report_parts())))
+        self.assertEqual(report, generate_sales_report())
+        self.assertEqual(report['total_units'], 5 + 10000)
+
+    def test_sale_unit_prices(self):
+        """Тест цен на момент продажи: изменение товара не меняет прошлую прибыль"""
+        report = generate_sales_report()
+        self.assertEqual(report['total_cost'], 2 * 15000 + 15000 + 2 * 4000)
+        
+        InventoryItem.query.get(1).purchase_price = 9999900
+        db.session.commit()
+        self.assertEqual(generate_sales_report(), report)
+        
+        # Старые продажи и архивы заполняются по суммам и текущим ценам товаров
+        with tempfile.TemporaryDirectory() as directory:
+            database_path = os.path.join(directory, 'legacy.db')
+            schema = [
+                'CREATE TABLE sales (id INTEGER PRIMARY KEY, sale_date DATE NOT NULL, item_id INTEGER, '
+                'quantity_sold INTEGER NOT NULL, total_amount INTEGER NOT NULL)',
+                "INSERT INTO sales VALUES (1, '2019-03-01', 1, 3, 4500), (2, '2019-03-02', 9, 2, 1000)",
+            ]
+            with closing(sqlite3.connect(database_path)) as legacy, legacy:
+                legacy.execute('CREATE TABLE inventory (id INTEGER PRIMARY KEY, purchase_price INTEGER NOT NULL)')
+                legacy.execute('INSERT INTO inventory VALUES (1, 1200)')
+                for statement in schema:
+                    legacy.execute(statement)
+            with closing(sqlite3.connect(archive_path(directory, 2019))) as archived, archived:
+                for statement in schema:
+                    archived.execute(statement)
+            
+            engine = create_engine(f'sqlite:///{database_path}')
+            with engine.begin() as connection:
+                add_sale_unit_prices(connection)
+                add_sale_unit_prices(connection)
+            engine.dispose()
+            upgrade_archives(database_path, directory)
+            upgrade_archives(database_path, directory)
+            
+            for path in (database_path, archive_path(directory, 2019)):
+                with closing(sqlite3.connect(path)) as upgraded:
+                    self.assertEqual(upgraded.execute(
+                        'SELECT id, unit_cost, unit_price FROM sales ORDER BY id').fetchall(),
+                        [(1, 1200, 1500), (2, 0, 500)])
+
+    def test_sales_archive(self):
+        """Тест переноса продаж закрытого года в архив"""
+        db.session.add(Sale(
+            sale_date=date(2020, 2, 14),
+            document_number='SALE-ARCHIVE-001',
+            customer='Archive Customer',
+            item_id=1,
+            quantity_sold=1,
+            total_amount=2000000,
+            unit_cost=1500000,
+            unit_price=2000000
+        ))
+        db.session.commit()
+        archived_id = Sale.query.filter_by(document_number='SALE-ARCHIVE-001').one().id
+        db.session.remove()
+        
+        def sales_sequence():
+            with closing(sqlite3.connect(db.engine.url.database)) as connection:
+                return connection.execute("SELECT seq FROM sqlite_sequence WHERE name = 'sales'").fetchone()
+        
+        directory = app.config['SALES_ARCHIVE_DIR']
+        try:
+            # Счетчик номеров не опускается ниже перенесенных продаж, даже потерянный
+            with closing(sqlite3.connect(db.engine.url.database)) as connection, connection:
+                connection.execute("DELETE FROM sqlite_sequence WHERE name = 'sales'")
+            self.assertEqual(archive_year(db.engine.url.database, directory, 2020), 1)
+            self.assertEqual(sales_sequence(), (archived_id,))
+            with closing(sqlite3.connect(db.engine.url.database)) as connection, connection:
+                connection.execute("UPDATE sqlite_sequence SET seq = 0 WHERE name = 'sales'")
+            upgrade_archives(db.engine.url.database, directory)
+            self.assertEqual(sales_sequence(), (archived_id,))
+            reload_archives()
+            self.assertEqual(Sale.query.filter_by(document_number='SALE-ARCHIVE-001').count(), 0)
+            
+            # Отчеты за период, захватывающий архив, видят перенесенные продажи
+            report = generate_quarterly_sales_report(2020, 1)
+            self.assertEqual([sale['document_number'] for sale in report['sales']], ['SALE-ARCHIVE-001'])
+            self.assertEqual(report['total_revenue'], 20000)
+            self.assertEqual(report['total_cost'], 15000)
+            self.assertEqual(generate_sales_report()['total_revenue'], 72000 + 20000)
+            
+            # Аналитический отчет за все время и колоночный движок тоже
+            sql_report = generate_analytical_report()
+            self.assertEqual(sql_report['financials']['revenue'], 72000 + 20000)
+            app.config['ANALYTICS_ENGINE'] = 'numpy'
+            try:
+                engine_report = generate_analytical_report()
+            finally:
+                app.config['ANALYTICS_ENGINE'] = None
+                app.extensions.pop('analytics_engine', None)
+            self.assertEqual(engine_report['financials'], sql_report['financials'])
+            self.assertEqual(engine_report['statistics'], sql_report['statistics'])
+            
+            # Архив подключен только для чтения
+            with self.assertRaises(OperationalError):
+                db.session.execute(text('DELETE FROM archive_2020.sales'))
+            db.session.rollback()
+            
+            # Новая продажа получает номер больше архивного
+            sale = Sale(
+                sale_date=date.today(), document_number='SALE-ARCHIVE-002', customer='Archive Customer',
+                item_id=1, quantity_sold=1, total_amount=2000000, unit_cost=1500000, unit_price=2000000
+            )
+            db.session.add(sale)
+            db.session.commit()
+            self.assertGreater(sale.id, archived_id)
+        finally:
+            db.session.remove()
+            os.remove(archive_path(directory, 2020))
+            reload_archives()
+
+    def test_sales_archive_limit(self):
+        """Тест: архивов не больше, чем SQLite подключает к соединению"""
+        directory = app.config['SALES_ARCHIVE_DIR']
+        os.makedirs(directory, exist_ok=True)
+        years = range(2000, 2000 + MAX_ARCHIVES)
+        for year in years:
+            open(archive_path(directory, year), 'w').close()
+        try:
+            with self.assertRaises(ValueError):
+                archive_year(db.engine.url.database, directory, 2015)
+            result = app.test_cli_runner().invoke(args=['archive-sales', '--year', '2015'])
+            self.assertNotEqual(result.exit_code, 0)
+            self.assertIn(str(MAX_ARCHIVES), result.output)
+            self.assertFalse(os.path.exists(archive_path(directory, 2015)))
+        finally:
+            for year in years:
+                os.remove(archive_path(directory, year))
+
 def run_tests():
     """Запуск всех тестов"""
     # Создаем тестовый suite
@@ -0,0 +1,8 @@
+"""Маршруты приложения, разбитые по разделам"""
+
+
+def register_blueprints(app):
+    from views import analytics, auth, batch, errors, inventory, main, reports, sales
+
+    for module in (main, auth, inventory, sales, reports, analytics, batch, errors):
+        app.register_blueprint(module.bp)
@@ -0,0 +1,102 @@
+"""Аналитика для руководства.
+
+Как и отчеты, модуль ``reports`` импортируется при первом запросе.
+"""
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask_login import login_required, current_user
+
+bp = Blueprint('analytics', __name__)
+
+@bp.route('/analytics')
+@login_required
+def analytics_page():
+    if not current_user.has_permission('analytics'):
+        flash('Недостаточно прав для просмотра аналитики', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    return render_template('analytics.html')
+
+@bp.route('/api/analytics')
+@login_required
+def analytics_api():
+    if not current_user.has_permission('analytics'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import generate_analytical_report
+    
+    try:
+        report = generate_analytical_report(
+            start_date=request.args.get('start') or None,
+            end_date=request.args.get('end') or None,
+            component_type=request.args.get('component_type') or None,
+            manufacturer=request.args.get('manufacturer') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    return jsonify(report)
+
+@bp.route('/api/analytics/top')
+@login_required
+def analytics_top_api():
+    if not current_user.has_permission('analytics'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import get_top_sellers
+    
+    items = get_top_sellers(
+        limit=min(request.args.get('limit', 5, type=int), 100),
+        component_type=request.args.get('component_type') or None,
+        manufacturer=request.args.get('manufacturer') or None
+    )
+    return jsonify([{
+        'id': item.id,
+        'product': f"{item.manufacturer} {item.model}",
+        'component_type': item.component_type,
+        'manufacturer': item.manufacturer,
+        'total_sold': item.total_sold
+    } for item in items])
+
+@bp.route('/api/analytics/timeseries')
+@login_required
+def analytics_timeseries_api():
+    if not current_user.has_permission('analytics'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import generate_revenue_timeseries
+    
+    try:
+        report = generate_revenue_timeseries(
+            granularity=request.args.get('granularity', 'day'),
+            start_date=request.args.get('start') or None,
+            end_date=request.args.get('end') or None,
+            group_by=request.args.get('group_by') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    return jsonify(report)
+
+@bp.route('/api/analytics/pivot')
+@login_required
+def analytics_pivot_api():
+    if not current_user.has_permission('analytics'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import generate_pivot
+    
+    def dimensions(name):
+        return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+    
+    try:
+        report = generate_pivot(
+            rows=dimensions('rows'),
+            cols=dimensions('cols'),
+            measure=request.args.get('measure', 'revenue'),
+            start_date=request.args.get('start') or None,
+            end_date=request.args.get('end') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    return jsonify(report)
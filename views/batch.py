@@ -0,0 +1,114 @@
+"""Пакетные запросы к API.
+
+Страница может отправить несколько обращений к ``/api/...`` одним
+запросом ``POST /api/batch``::
+
+    {"requests": [{"method": "GET", "path": "/api/analytics"},
+                  {"method": "POST", "path": "/api/sales", "body": {...}}],
+     "parallel": true}
+
+Подзапросы выполняются по порядку в контексте внешнего запроса:
+вход проверяется и пользователь загружается один раз. С ``parallel``
+подряд идущие GET-запросы выполняются одновременно в отдельных
+потоках; запросы на запись всегда идут последовательно, поэтому
+чтение после записи видит ее результат. В ответе - по одному
+результату ``{"status", "body"}`` на подзапрос, в том же порядке.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Blueprint, current_app, g, request, jsonify
+from flask_login import login_required, current_user
+
+from auth import User
+from database import db
+
+bp = Blueprint('batch', __name__)
+
+MAX_BATCH_SIZE = 20
+MAX_WORKERS = 4
+METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE'}
+# Потоки событий бесконечны, а вложенные пакеты не нужны
+EXCLUDED_PREFIXES = ('/api/stream/', '/api/batch')
+
+
+def _validate(subrequest):
+    if not isinstance(subrequest, dict):
+        return 'Подзапрос должен быть объектом'
+    path = subrequest.get('path')
+    if not isinstance(path, str) or not path.startswith('/api/') or path.startswith(EXCLUDED_PREFIXES):
+        return f'Недопустимый путь: {path}'
+    if subrequest.get('method', 'GET').upper() not in METHODS:
+        return f"Недопустимый метод: {subrequest.get('method')}"
+    return None
+
+
+def _dispatch(app, subrequest):
+    """Выполнение подзапроса в уже открытом контексте приложения"""
+    method = subrequest.get('method', 'GET').upper()
+    options = {'method': method}
+    if subrequest.get('body') is not None:
+        options['json'] = subrequest['body']
+
+    with app.test_request_context(subrequest['path'], **options):
+        if request.routing_exception is not None:
+            error = request.routing_exception
+            return {'status': getattr(error, 'code', 404), 'body': {'error': 'Маршрут не найден'}}
+        try:
+            response = app.full_dispatch_request()
+            # Потоковый ответ читается, пока контекст подзапроса открыт
+            body = response.get_json(silent=True)
+            if body is None:
+                body = response.get_data(as_text=True)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Ошибка подзапроса %s %s', method, subrequest['path'])
+            return {'status': 500, 'body': {'error': 'Внутренняя ошибка сервера'}}
+
+    return {'status': response.status_code, 'body': body}
+
+
+def _dispatch_in_thread(app, user_id, subrequest):
+    # У потока свой контекст приложения, а значит и своя сессия базы
+    with app.app_context():
+        g._login_user = db.session.get(User, user_id)
+        return _dispatch(app, subrequest)
+
+
+def _read_groups(subrequests, parallel):
+    """Разбиение на группы: подряд идущие GET (при parallel) и одиночные записи"""
+    groups = []
+    for subrequest in subrequests:
+        is_read = parallel and subrequest.get('method', 'GET').upper() == 'GET'
+        if is_read and groups and groups[-1][0]:
+            groups[-1][1].append(subrequest)
+        else:
+            groups.append((is_read, [subrequest]))
+    return groups
+
+
+@bp.route('/api/batch', methods=['POST'])
+@login_required
+def batch_api():
+    data = request.get_json(silent=True) or {}
+    subrequests = data.get('requests')
+
+    if not isinstance(subrequests, list) or not subrequests:
+        return jsonify({'error': 'Нужен непустой список requests'}), 400
+    if len(subrequests) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Не больше {MAX_BATCH_SIZE} подзапросов'}), 400
+    for subrequest in subrequests:
+        error = _validate(subrequest)
+        if error:
+            return jsonify({'error': error}), 400
+
+    app = current_app._get_current_object()
+    user_id = current_user.id
+    results = []
+    for is_read, group in _read_groups(subrequests, bool(data.get('parallel'))):
+        if is_read and len(group) > 1:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(group))) as executor:
+                results.extend(executor.map(lambda item: _dispatch_in_thread(app, user_id, item), group))
+        else:
+            results.extend(_dispatch(app, subrequest) for subrequest in group)
+
+    return jsonify({'results': results})
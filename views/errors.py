@@ -0,0 +1,15 @@
+"""Обработчики ошибок"""
+from flask import Blueprint, render_template
+
+from database import db
+
+bp = Blueprint('errors', __name__)
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('error.html', error='Страница не найдена'), 404
+
+@bp.app_errorhandler(500)
+def internal_error(error):
+    db.session.rollback()
+    return render_template('error.html', error='Внутренняя ошибка сервера'), 500
@@ -0,0 +1,370 @@
+"""Управление инвентарем"""
+from datetime import datetime
+from functools import partial
+
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from markupsafe import Markup
+from flask_login import login_required, current_user
+from sqlalchemy import Integer, cast, func, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from database import after_commit, db, integrity_error_message
+from models.inventory import InventoryItem, Supplier
+from cache import bump_data_version, cached_fragment, invalidate_closed_periods
+from events import broker
+from dashboard_feed import broadcast_dashboard
+from archive import sales_source
+from money import to_kopecks, to_rubles
+from idempotency import idempotency_key, replay_response, remember_response
+from search_index import item_terms, index_item, reset_search_indexes
+from forecast import COVER_DAYS, reorder_suggestions
+from ledger import record_adjustment, record_cost_changes
+
+bp = Blueprint('inventory', __name__)
+
+# Массовая правка: по каким полям отбираются товары и что можно менять
+BULK_FILTERS = ('component_type', 'manufacturer', 'supplier_id')
+BULK_ATTRIBUTES = ('component_type', 'manufacturer', 'supplier_id', 'reorder_level')
+BULK_PRICES = ('purchase_price', 'selling_price')
+
+DUPLICATE_DOCUMENT = {'inventory.document_number': 'Товар с таким номером документа уже существует'}
+
+def stock_alert(item, previous_quantity, previous_level):
+    """Событие о пересечении порога дозаказа или None.
+
+    ``item`` - товар или строка с теми же полями (RETURNING после UPDATE).
+    """
+    was_low = previous_quantity < previous_level
+    is_low = item.quantity < item.reorder_level
+    if was_low == is_low:
+        return None
+    
+    return {
+        'event': 'low_stock' if is_low else 'restocked',
+        'id': item.id,
+        'product': f"{item.manufacturer} {item.model}",
+        'quantity': item.quantity,
+        'reorder_level': item.reorder_level
+    }
+
+def report_attributes(item):
+    """Атрибуты товара, от которых зависят отчеты за прошлые периоды:
+    группировки и поступление (дата и количество)"""
+    return (item.component_type, item.manufacturer, str(item.supplier_id),
+            item.receipt_date, int(item.quantity))
+
+def version_conflict(item_id):
+    """Ответ 409 с текущим состоянием товара, измененного другим пользователем"""
+    db.session.rollback()
+    item = db.session.get(InventoryItem, item_id)
+    return jsonify({
+        'error': 'Товар изменен другим пользователем. Обновите данные и повторите правку',
+        'item': item.to_dict() if item else None
+    }), 409
+
+def publish_stock_alert(alert):
+    if alert:
+        broker.publish('alerts', alert['event'], alert)
+
+@bp.route('/inventory')
+@login_required
+def inventory_page():
+    if not current_user.has_permission('view'):
+        flash('Недостаточно прав для просмотра инвентаря', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    # Строки таблицы рендерятся заново только после изменения данных;
+    # кнопки действий зависят от роли пользователя
+    rows = cached_fragment('inventory_rows', lambda: render_template(
+        'fragments/inventory_rows.html', items=InventoryItem.query.all()
+    ), current_user.role)
+    suppliers = Supplier.query.all()
+    return render_template('inventory.html', inventory_rows=Markup(rows), suppliers=suppliers)
+
+@bp.route('/api/inventory', methods=['GET', 'POST'])
+@login_required
+def inventory_api():
+    if request.method == 'GET':
+        if not current_user.has_permission('view'):
+            return jsonify({'error': 'Недостаточно прав'}), 403
+        
+        items = InventoryItem.query.all()
+        return jsonify([{
+            'id': item.id,
+            'receipt_date': item.receipt_date.strftime('%Y-%m-%d'),
+            'document_number': item.document_number,
+            'supplier': item.supplier.name,
+            'component_type': item.component_type,
+            'model': item.model,
+            'manufacturer': item.manufacturer,
+            'quantity': item.quantity,
+            'purchase_price': to_rubles(item.purchase_price),
+            'selling_price': to_rubles(item.selling_price),
+            'reorder_level': item.reorder_level,
+            'version': item.version
+        } for item in items])
+    
+    elif request.method == 'POST':
+        if not current_user.has_permission('add'):
+            return jsonify({'error': 'Недостаточно прав'}), 403
+        
+        try:
+            data = request.get_json()
+            key = idempotency_key()
+            if key:
+                replay = replay_response(key)
+                if replay is not None:
+                    return replay
+            
+            receipt_date = datetime.strptime(data['receipt_date'], '%Y-%m-%d').date()
+            new_item = InventoryItem(
+                receipt_date=receipt_date,
+                document_number=data['document_number'],
+                supplier_id=data['supplier_id'],
+                component_type=data['component_type'],
+                model=data['model'],
+                manufacturer=data['manufacturer'],
+                quantity=data['quantity'],
+                purchase_price=to_kopecks(data['purchase_price']),
+                selling_price=to_kopecks(data['selling_price']),
+                reorder_level=int(data['reorder_level']) if data.get('reorder_level') not in (None, '') else 5
+            )
+            db.session.add(new_item)
+            db.session.flush()
+            body = {'message': 'Товар успешно добавлен', 'id': new_item.id}
+            if key:
+                remember_response(key, body)
+            terms = item_terms(new_item)
+            bump_data_version()
+            invalidate_closed_periods(receipt_date)
+            db.session.commit()
+        
+        except IntegrityError as e:
+            # Уникальность номера документа проверяет сама база
+            db.session.rollback()
+            replay = replay_response(key) if key else None
+            if replay is not None:
+                return replay
+            return jsonify({'error': integrity_error_message(e, DUPLICATE_DOCUMENT)}), 400
+        except ValueError as e:
+            db.session.rollback()
+            return jsonify({'error': f'Ошибка преобразования данных: {str(e)}'}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Ошибка при добавлении товара: {str(e)}'}), 500
+        
+        after_commit(lambda: index_item(body['id'], terms=terms), broadcast_dashboard)
+        return jsonify(body)
+
+@bp.route('/api/inventory/<int:item_id>', methods=['PUT', 'DELETE'])
+@login_required
+def inventory_item_api(item_id):
+    item = InventoryItem.query.get_or_404(item_id)
+    
+    if request.method == 'PUT':
+        if not current_user.has_permission('edit'):
+            return jsonify({'error': 'Недостаточно прав'}), 403
+        
+        try:
+            data = request.get_json()
+            
+            # Правка по устаревшей версии перезаписала бы чужие изменения
+            if data.get('version') not in (None, '') and int(data['version']) != item.version:
+                return version_conflict(item_id)
+            
+            previous_quantity, previous_level = item.quantity, item.reorder_level
+            previous_cost = item.purchase_price
+            previous_terms = item_terms(item)
+            previous_attributes = report_attributes(item)
+            
+            item.receipt_date = datetime.strptime(data['receipt_date'], '%Y-%m-%d').date()
+            item.document_number = data['document_number']
+            item.supplier_id = data['supplier_id']
+            item.component_type = data['component_type']
+            item.model = data['model']
+            item.manufacturer = data['manufacturer']
+            item.quantity = int(data['quantity'])
+            item.purchase_price = to_kopecks(data['purchase_price'])
+            item.selling_price = to_kopecks(data['selling_price'])
+            if data.get('reorder_level') not in (None, ''):
+                item.reorder_level = int(data['reorder_level'])
+            alert = stock_alert(item, previous_quantity, previous_level)
+            record_adjustment(item, previous_quantity, previous_cost)
+            terms = item_terms(item)
+            # Цены прошлых продаж хранятся в самих продажах, поэтому правка
+            # цен товара отчеты за прошлые периоды не меняет
+            if report_attributes(item) != previous_attributes:
+                invalidate_closed_periods()
+            
+            bump_data_version()
+            db.session.commit()
+        
+        except StaleDataError:
+            # Товар изменили между чтением и записью
+            return version_conflict(item_id)
+        except IntegrityError as e:
+            db.session.rollback()
+            return jsonify({'error': integrity_error_message(e, DUPLICATE_DOCUMENT)}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Ошибка при обновлении товара: {str(e)}'}), 500
+        
+        after_commit(
+            lambda: index_item(item_id, previous_terms, terms),
+            lambda: publish_stock_alert(alert),
+            broadcast_dashboard
+        )
+        return jsonify({'message': 'Товар успешно обновлен'})
+    
+    elif request.method == 'DELETE':
+        if not current_user.has_permission('delete'):
+            return jsonify({'error': 'Недостаточно прав'}), 403
+        
+        try:
+            # Проверяем, есть ли связанные продажи (включая архивные)
+            sales = sales_source(db.session)
+            sales_count = db.session.execute(
+                select(func.count()).select_from(sales).where(sales.c.item_id == item_id)
+            ).scalar()
+            if sales_count > 0:
+                return jsonify({'error': 'Нельзя удалить товар, по которому есть продажи'}), 400
+            
+            terms = item_terms(item)
+            db.session.delete(item)
+            # Поступление товара входит в отчеты по поставщикам с даты поступления
+            invalidate_closed_periods(item.receipt_date)
+            bump_data_version()
+            db.session.commit()
+        
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Ошибка при удалении товара: {str(e)}'}), 500
+        
+        after_commit(lambda: index_item(item_id, previous_terms=terms), broadcast_dashboard)
+        return jsonify({'message': 'Товар успешно удален'})
+
+@bp.route('/api/inventory/reorder')
+@login_required
+def reorder_api():
+    """Товары, которых хватит не больше чем на ``days`` дней, и сколько дозаказать"""
+    if not current_user.has_permission('view'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    try:
+        days = int(request.args.get('days', COVER_DAYS))
+        limit = int(request.args.get('limit', 50))
+        if not 1 <= days <= 365 or not 1 <= limit <= 500:
+            raise ValueError('days от 1 до 365, limit от 1 до 500')
+    except ValueError as e:
+        return jsonify({'error': f'Ошибка в параметрах: {str(e)}'}), 400
+    
+    return jsonify({'days': days, 'items': reorder_suggestions(db.session, days, limit)})
+
+def bulk_conditions(filters):
+    """Условия отбора товаров для массовой правки; ValueError при ошибке"""
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError('Нужен непустой фильтр filter')
+    conditions = []
+    for field, value in filters.items():
+        if field not in BULK_FILTERS:
+            raise ValueError(f'Недопустимое поле фильтра: {field}')
+        conditions.append(getattr(InventoryItem, field) == (int(value) if field == 'supplier_id' else value))
+    return conditions
+
+def bulk_values(changes):
+    """Новые значения колонок для UPDATE; ValueError при ошибке.
+
+    Цена меняется на процент ``{"percent": 10}`` или на сумму в рублях
+    ``{"amount": -500}``, остальные поля получают указанное значение.
+    """
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError('Нужен непустой список изменений changes')
+    values = {}
+    for field, change in changes.items():
+        if field in BULK_PRICES:
+            if not isinstance(change, dict) or len(change) != 1 or not {'percent', 'amount'} >= change.keys():
+                raise ValueError(f'Для {field} укажите percent или amount')
+            column = getattr(InventoryItem, field)
+            if 'percent' in change:
+                values[field] = cast(func.round(column * (100 + float(change['percent'])) / 100), Integer)
+            else:
+                values[field] = column + to_kopecks(change['amount'])
+        elif field in ('supplier_id', 'reorder_level'):
+            values[field] = int(change)
+        elif field in BULK_ATTRIBUTES:
+            if not isinstance(change, str) or not change.strip():
+                raise ValueError(f'Пустое значение поля {field}')
+            values[field] = change.strip()
+        else:
+            raise ValueError(f'Поле {field} нельзя менять массово')
+    return values
+
+@bp.route('/api/inventory/bulk', methods=['POST'])
+@login_required
+def inventory_bulk_api():
+    """Массовая правка цен и атрибутов товаров одним UPDATE.
+
+    ``{"filter": {"manufacturer": "ASUS"}, "changes": {"selling_price":
+    {"percent": 10}}, "dry_run": true}`` - с ``dry_run`` только считает
+    товары, которые будут изменены.
+    """
+    if not current_user.has_permission('edit'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        conditions = bulk_conditions(data.get('filter'))
+        values = bulk_values(data.get('changes'))
+    except (TypeError, ValueError, ArithmeticError) as e:
+        return jsonify({'error': f'Ошибка в параметрах: {str(e)}'}), 400
+    
+    # Предпросмотр и проверка, что цены не станут отрицательными
+    prices = [values[field] < 0 for field in BULK_PRICES if field in values]
+    negative = func.count().filter(or_(*prices)) if prices else literal(0)
+    matched, negative = db.session.execute(
+        select(func.count(), negative).select_from(InventoryItem).where(*conditions)
+    ).one()
+    if negative:
+        return jsonify({'error': f'Цена станет отрицательной у товаров: {negative}'}), 400
+    if data.get('dry_run') or not matched:
+        return jsonify({'matched': matched, 'updated': 0, 'dry_run': bool(data.get('dry_run'))})
+    
+    try:
+        # Новая цена закупки - в журнал движения, до изменения самих цен
+        if 'purchase_price' in values:
+            record_cost_changes(conditions, values['purchase_price'])
+        # Товары, которые новый порог переводит через границу дозаказа, -
+        # одним запросом до изменения
+        alerts = []
+        if 'reorder_level' in values:
+            level = values['reorder_level']
+            manufacturer = literal(values['manufacturer']) if 'manufacturer' in values else InventoryItem.manufacturer
+            crossed = db.session.execute(
+                select(InventoryItem.id, manufacturer.label('manufacturer'), InventoryItem.model,
+                       InventoryItem.quantity, literal(level).label('reorder_level'),
+                       InventoryItem.reorder_level.label('previous_level'))
+                .where(*conditions,
+                       (InventoryItem.quantity < InventoryItem.reorder_level) != (InventoryItem.quantity < level))
+            ).all()
+            alerts = [stock_alert(row, row.quantity, row.previous_level) for row in crossed]
+        # Номер версии растет, поэтому открытые у других правки товаров
+        # получат 409, а не перезапишут новые цены
+        updated = db.session.execute(
+            update(InventoryItem).where(*conditions)
+            .values(**values, version=InventoryItem.version + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if values.keys() & {'component_type', 'manufacturer', 'supplier_id'}:
+            invalidate_closed_periods()
+        bump_data_version()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка при массовой правке: {str(e)}'}), 500
+    
+    actions = [partial(publish_stock_alert, alert) for alert in alerts]
+    if values.keys() & {'component_type', 'manufacturer'}:
+        actions.append(reset_search_indexes)
+    after_commit(*actions, broadcast_dashboard)
+    return jsonify({'matched': matched, 'updated': updated, 'dry_run': False})
@@ -0,0 +1,130 @@
+"""Главная панель, живые обновления и поиск"""
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required, current_user
+
+from database import db
+from models.inventory import InventoryItem, Sale, Supplier
+from events import sse_response
+from dashboard_feed import dashboard_counters, recent_sales
+from replica import reports_session
+from money import to_rubles
+from search_index import FIELDS, get_search_index, get_product_index
+
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
+@login_required
+def dashboard():
+    
+    return render_template('dashboard.html', 
+                         **dashboard_counters(),
+                         recent_sales=recent_sales(),
+                         now=datetime.now())
+
+# Уведомления
+@bp.route('/api/stream/alerts')
+@login_required
+def stock_alerts_stream():
+    if not current_user.has_permission('view'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    return sse_response('alerts')
+
+@bp.route('/api/stream/dashboard')
+@login_required
+def dashboard_stream():
+    # Уведомления об остатках идут в том же соединении, что и панель
+    if current_user.has_permission('view'):
+        return sse_response('dashboard', 'alerts')
+    return sse_response('dashboard')
+
+# Поиск
+@bp.route('/api/search')
+@login_required
+def search_api():
+    if not current_user.has_permission('view'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    query = request.args.get('q', '')
+    search_type = request.args.get('type', 'all')
+    fuzzy = request.args.get('fuzzy', type=int) == 1
+    
+    results = {}
+    session = reports_session()
+    
+    if search_type in ['all', 'inventory'] and fuzzy:
+        # Поиск с опечатками по производителю и модели
+        ranked = get_product_index(db.session).search(query, limit=min(request.args.get('limit', 20, type=int), 100))
+        items = {item.id: item for item in session.query(InventoryItem).filter(
+            InventoryItem.id.in_([item_id for item_id, _ in ranked]))}
+        
+        results['inventory'] = [{
+            'id': item_id,
+            'document_number': items[item_id].document_number,
+            'model': items[item_id].model,
+            'manufacturer': items[item_id].manufacturer,
+            'component_type': items[item_id].component_type,
+            'quantity': items[item_id].quantity,
+            'score': score
+        } for item_id, score in ranked if item_id in items]
+    
+    elif search_type in ['all', 'inventory']:
+        inventory_results = session.query(InventoryItem).filter(
+            (InventoryItem.document_number.contains(query)) |
+            (InventoryItem.model.contains(query)) |
+            (InventoryItem.manufacturer.contains(query)) |
+            (InventoryItem.component_type.contains(query))
+        ).all()
+        
+        results['inventory'] = [{
+            'id': item.id,
+            'document_number': item.document_number,
+            'model': item.model,
+            'manufacturer': item.manufacturer,
+            'component_type': item.component_type,
+            'quantity': item.quantity
+        } for item in inventory_results]
+    
+    if search_type in ['all', 'sales']:
+        sales_results = session.query(Sale).filter(
+            (Sale.document_number.contains(query)) |
+            (Sale.customer.contains(query))
+        ).all()
+        
+        results['sales'] = [{
+            'id': sale.id,
+            'document_number': sale.document_number,
+            'customer': sale.customer,
+            'sale_date': sale.sale_date.strftime('%d.%m.%Y'),
+            'total_amount': to_rubles(sale.total_amount)
+        } for sale in sales_results]
+    
+    if search_type in ['all', 'suppliers']:
+        supplier_results = session.query(Supplier).filter(Supplier.name.contains(query)).all()
+        
+        results['suppliers'] = [{
+            'id': supplier.id,
+            'name': supplier.name,
+            'contact_info': supplier.contact_info
+        } for supplier in supplier_results]
+    
+    return jsonify(results)
+
+@bp.route('/api/suggest')
+@login_required
+def suggest_api():
+    if not current_user.has_permission('view'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    fields = request.args.get('fields')
+    if fields:
+        fields = set(fields.split(',')) & set(FIELDS)
+    
+    index = get_search_index(db.session)
+    return jsonify(index.suggest(
+        request.args.get('q', ''),
+        limit=min(request.args.get('limit', 10, type=int), 50),
+        fields=fields or None
+    ))
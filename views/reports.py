@@ -0,0 +1,77 @@
+"""Отчеты.
+
+Модуль ``reports`` (и колоночный движок с NumPy за ним) импортируется
+при первом запросе отчета, а не при старте рабочего процесса.
+"""
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask_login import login_required, current_user
+
+from streaming import report_response
+
+bp = Blueprint('reports', __name__)
+
+@bp.route('/reports')
+@login_required
+def reports_page():
+    if not current_user.has_permission('reports'):
+        flash('Недостаточно прав для просмотра отчетов', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    return render_template('reports.html')
+
+@bp.route('/api/reports/inventory')
+@login_required
+def inventory_report_api():
+    if not current_user.has_permission('reports'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import inventory_report_parts
+    
+    try:
+        parts = inventory_report_parts(request.args.get('as_of'))
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    # Строки отдаются по мере чтения из базы
+    return report_response(parts)
+
+@bp.route('/api/reports/sales')
+@login_required
+def sales_report_api():
+    if not current_user.has_permission('reports'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import sales_report_parts, quarter_range
+    
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    quarter = request.args.get('quarter', type=int)
+    year = request.args.get('year', type=int)
+    
+    if quarter:
+        start_date, end_date = quarter_range(year, quarter)
+    
+    try:
+        parts = sales_report_parts(start_date, end_date)
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    return report_response(parts)
+
+@bp.route('/api/reports/suppliers')
+@login_required
+def supplier_report_api():
+    if not current_user.has_permission('reports'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    from reports import generate_supplier_report
+    
+    try:
+        report = generate_supplier_report(
+            request.args.get('start_date') or None,
+            request.args.get('end_date') or None
+        )
+    except ValueError as e:
+        return jsonify({'error': f'Некорректные параметры: {str(e)}'}), 400
+    
+    return jsonify(report)
@@ -0,0 +1,173 @@
+"""Управление продажами"""
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from markupsafe import Markup
+from flask_login import login_required, current_user
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import after_commit, db, integrity_error_message
+from models.inventory import InventoryItem, Sale
+from cache import bump_data_version, cached_fragment, invalidate_closed_periods
+from dashboard_feed import broadcast_dashboard
+from money import to_rubles
+from forecast import sale_weight
+from idempotency import idempotency_key, replay_response, remember_response
+from search_index import sale_terms, update_search_index
+from views.inventory import stock_alert, publish_stock_alert
+
+bp = Blueprint('sales', __name__)
+
+@bp.route('/sales')
+@login_required
+def sales_page():
+    if not current_user.has_permission('view'):
+        flash('Недостаточно прав для просмотра продаж', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    try:
+        # Таблица и список товаров рендерятся заново только после
+        # изменения данных
+        sales_table = cached_fragment('sales_table', lambda: render_template(
+            'fragments/sales_table.html', sales=Sale.query.order_by(Sale.sale_date.desc()).all()
+        ), current_user.role)
+        item_options = cached_fragment('sale_options', lambda: render_template(
+            'fragments/sale_options.html',
+            inventory_items=InventoryItem.query.filter(InventoryItem.quantity > 0).all()
+        ).strip())
+        
+        return render_template('sales.html', sales_table=Markup(sales_table), item_options=Markup(item_options))
+    
+    except Exception as e:
+        flash(f'Ошибка при загрузке данных о продажах: {str(e)}', 'error')
+        return render_template('sales.html', sales_table=Markup(''), item_options=Markup(''))
+
+@bp.route('/api/sales', methods=['POST'])
+@login_required
+def sales_api():
+    if not current_user.has_permission('add'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    try:
+        data = request.get_json()
+        key = idempotency_key()
+        if key:
+            replay = replay_response(key)
+            if replay is not None:
+                return replay
+        
+        item_id = int(data['item_id'])
+        quantity_sold = int(data['quantity_sold'])
+        sale_date = datetime.strptime(data['sale_date'], '%Y-%m-%d').date()
+        
+        # Проверка остатка и списание - один условный UPDATE, без гонки
+        # между чтением остатка и записью
+        item = db.session.execute(
+            update(InventoryItem)
+            .where(InventoryItem.id == item_id, InventoryItem.quantity >= quantity_sold)
+            .values(quantity=InventoryItem.quantity - quantity_sold,
+                    total_sold=InventoryItem.total_sold + quantity_sold,
+                    velocity_score=InventoryItem.velocity_score + sale_weight(sale_date, quantity_sold),
+                    version=InventoryItem.version + 1)
+            .returning(InventoryItem.id, InventoryItem.manufacturer, InventoryItem.model,
+                       InventoryItem.quantity, InventoryItem.reorder_level,
+                       InventoryItem.purchase_price, InventoryItem.selling_price)
+        ).one_or_none()
+        
+        if item is None:
+            db.session.rollback()
+            available = db.session.scalar(select(InventoryItem.quantity).where(InventoryItem.id == item_id))
+            if available is None:
+                return jsonify({'error': 'Товар не найден'}), 404
+            return jsonify({'error': f'Недостаточно товара на складе. Доступно: {available} шт.'}), 400
+        
+        # Сумма в копейках, без ошибок округления
+        total_amount = quantity_sold * item.selling_price
+        
+        new_sale = Sale(
+            sale_date=sale_date,
+            document_number=data['document_number'],
+            customer=data['customer'],
+            item_id=item_id,
+            quantity_sold=quantity_sold,
+            total_amount=total_amount,
+            unit_cost=item.purchase_price,
+            unit_price=item.selling_price
+        )
+        alert = stock_alert(item, item.quantity + quantity_sold, item.reorder_level)
+        
+        db.session.add(new_sale)
+        db.session.flush()
+        body = {
+            'message': 'Продажа успешно добавлена', 
+            'id': new_sale.id,
+            'total_amount': to_rubles(total_amount)
+        }
+        if key:
+            remember_response(key, body)
+        terms = sale_terms(new_sale)
+        bump_data_version()
+        invalidate_closed_periods(sale_date)
+        db.session.commit()
+    
+    except IntegrityError as e:
+        # Номер документа уникален; повтор с тем же ключом, пришедший
+        # одновременно с первым запросом, получает его ответ
+        db.session.rollback()
+        replay = replay_response(key) if key else None
+        if replay is not None:
+            return replay
+        return jsonify({'error': integrity_error_message(e, {
+            'sales.document_number': 'Продажа с таким номером документа уже существует'
+        })}), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка преобразования данных: {str(e)}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка при добавлении продажи: {str(e)}'}), 500
+    
+    # Продажа сохранена: сбой здесь не должен превращаться в ошибку запроса
+    after_commit(
+        lambda: update_search_index(added=terms),
+        lambda: publish_stock_alert(alert),
+        lambda: broadcast_dashboard(new_sale)
+    )
+    return jsonify(body)
+
+@bp.route('/api/sales/<int:sale_id>', methods=['DELETE'])
+@login_required
+def delete_sale_api(sale_id):
+    if not current_user.has_permission('delete'):
+        return jsonify({'error': 'Недостаточно прав'}), 403
+    
+    try:
+        sale = Sale.query.get_or_404(sale_id)
+        
+        # Возвращаем товар на склад
+        item = sale.inventory_item
+        alert = None
+        if item:
+            previous_quantity = item.quantity
+            item.quantity += sale.quantity_sold
+            item.total_sold = InventoryItem.total_sold - sale.quantity_sold
+            item.velocity_score = InventoryItem.velocity_score - sale_weight(sale.sale_date, sale.quantity_sold)
+            alert = stock_alert(item, previous_quantity, item.reorder_level)
+        
+        terms = sale_terms(sale)
+        db.session.delete(sale)
+        bump_data_version()
+        invalidate_closed_periods(sale.sale_date)
+        db.session.commit()
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка при удалении продажи: {str(e)}'}), 500
+    
+    after_commit(
+        lambda: update_search_index(removed=terms),
+        lambda: publish_stock_alert(alert),
+        broadcast_dashboard
+    )
+    return jsonify({'message': 'Продажа успешно удалена'})